@@ -1,11 +1,26 @@
 import os
+import time
+import signal
+import asyncio
 import pkgutil
+import threading
 import importlib
+import functools
+import itertools
 import sys
 import logging.config
 from dotenv import load_dotenv
+try:
+    import readline
+except ImportError:  # readline is not available on Windows
+    readline = None
 
-from app.commands import Command, CommandHandler
+from app.commands import (Command, CommandHandler, CommandNotFoundError, CommandTimeoutError,
+                          CommandCancelledError)
+from app.commands.manifest import LazyCommand, PluginManifest
+from app.commands.metrics import MetricsDumper
+from app.journal import Checkpointer, Journal
+from app.sessions import Compactor, SessionCommand, SessionManager
 
 
 class App:
@@ -14,7 +29,21 @@ class App:
         self.configure_logging()
         load_dotenv()
         self.settings = self.load_environment_variables()
-        self.command_handler = CommandHandler()
+        self.cache_dir = self.settings.get('CACHE_DIR', 'cache')
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.command_handler = CommandHandler(max_workers=int(self.settings.get('COMMAND_WORKERS', 4)),
+                                              result_cache_size=int(self.settings.get('RESULT_CACHE_SIZE', 256)),
+                                              default_timeout=self.load_default_timeout(),
+                                              process_workers=int(self.settings.get('PROCESS_WORKERS', 0)) or None)
+        self.command_handler.intent_model_path = os.path.join(self.cache_dir, 'intent_model.npz')
+        self.result_cache_path = os.path.join(self.cache_dir, 'results.pickle')
+        self.command_handler.result_cache.load(self.result_cache_path)
+        self.metrics_dumper = None
+        self.completion_matches = []
+        self.session_managers = {}  # per-user command class name -> SessionManager
+        self.journal = None
+        self.checkpointer = None
+        self.compactors = []  # Background compaction of per-user sessions, one per session manager
 
     def configure_logging(self):
         logging_conf_path = 'logging.conf'
@@ -29,43 +58,226 @@ class App:
         logging.info("Environment variables loaded.")
         return settings
 
+    def load_default_timeout(self):
+        """Global command deadline in seconds from COMMAND_TIMEOUT; unset or 0 means no deadline."""
+        timeout = float(self.settings.get('COMMAND_TIMEOUT', 0))
+        return timeout if timeout > 0 else None
+
     def load_plugins(self):
         plugins_package = 'app.plugins'
         plugins_path = plugins_package.replace('.', '/')
         if not os.path.exists(plugins_path):
             logging.warning(f"Plugins directory '{plugins_path}' not found.")
             return
+        manifest = PluginManifest(plugins_package, os.path.join(self.cache_dir, 'plugin_manifest.json'))
         for _, plugin_name, is_pkg in pkgutil.iter_modules([plugins_path]):
             if is_pkg:
+                module_name = f'{plugins_package}.{plugin_name}'
+                mtime = manifest.source_mtime(plugin_name)
+                cached_commands = manifest.lookup(plugin_name, mtime)
+                if cached_commands is not None:
+                    # The plugin hasn't changed since it was last imported, so defer the import
+                    # until one of its commands is actually executed.
+                    self.register_lazy_commands(module_name, cached_commands)
+                    continue
                 try:
-                    plugin_module = importlib.import_module(f'{plugins_package}.{plugin_name}')
-                    self.register_plugin_commands(plugin_module)
+                    plugin_module = importlib.import_module(module_name)
+                    registered = self.register_plugin_commands(plugin_module)
+                    manifest.update(plugin_name, mtime, registered)
                 except ImportError as e:
                     logging.error(f"Error importing plugin {plugin_name}: {e}")
+        try:
+            manifest.save()
+        except OSError as e:
+            logging.warning(f"Could not save plugin manifest: {e}")
+
+    def create_command(self, item_name, item):
+        """Instantiate a command class found in a plugin module."""
+        if getattr(item, 'per_user', False):
+            # USER_ID is the user a local REPL acts as; the server sets the user per request.
+            return SessionCommand(item, self.get_session_manager(item), default_user=self.settings.get('USER_ID'))
+        return item()
+
+    def get_session_manager(self, command_class):
+        """Return the manager holding every user's instance of a per-user command class."""
+        manager = self.session_managers.get(command_class.__name__)
+        if manager is None:
+            budget = int(float(self.settings.get('SESSION_MEMORY_MB', 256)) * 2 ** 20)
+            journal = self.get_journal()
+            manager = SessionManager(lambda user_id: command_class(user_id=user_id),
+                                     os.path.join(self.cache_dir, 'sessions', command_class.__name__), budget,
+                                     prepare=lambda session: setattr(session, 'journal', journal))
+            self.session_managers[command_class.__name__] = manager
+            # No checkpoint may run mid-replay: it would save the sessions without the records not yet
+            # replayed and then delete those records from the log.
+            with journal.checkpoint_lock:
+                self.replay_journal(command_class.__name__, manager)
+            self.start_checkpointer()
+            interval = float(self.settings.get('COMPACT_INTERVAL', 600))
+            if interval > 0 and hasattr(command_class, 'compact'):  # e.g. moving old workout sessions to disk
+                self.compactors.append(Compactor(manager, interval).start())
+        return manager
+
+    def get_journal(self):
+        """Open the journal of per-user changes; start_checkpointer() checkpoints it once it has been replayed."""
+        if self.journal is None:
+            self.journal = Journal(os.path.join(self.cache_dir, 'journal'),
+                                   commit_delay=float(self.settings.get('JOURNAL_COMMIT_DELAY', 0)),
+                                   write_behind=self.settings.get('JOURNAL_WRITE_BEHIND', '0') == '1',
+                                   flush_size=int(self.settings.get('JOURNAL_FLUSH_SIZE', 1000)),
+                                   max_pending=int(self.settings.get('JOURNAL_MAX_PENDING', 100_000)))
+        return self.journal
+
+    def start_checkpointer(self):
+        """Start the thread that checkpoints the journal in the background, unless it runs already."""
+        interval = float(self.settings.get('SNAPSHOT_INTERVAL', 300))
+        if interval > 0 and self.checkpointer is None and self.journal is not None:
+            max_records = int(self.settings.get('SNAPSHOT_MAX_RECORDS', 100_000))
+            self.checkpointer = Checkpointer(self.journal, self.snapshot_sessions, interval, max_records).start()
+
+    def snapshot_sessions(self):
+        """Write every changed user session to disk; the journal checkpoint covers what this saves."""
+        for manager in list(self.session_managers.values()):
+            manager.save_all()
+        if hasattr(os, 'sync'):  # Session files must be on disk before the log records they replace go
+            os.sync()
+
+    def replay_journal(self, command_name, manager, batch_size=100_000):
+        """Re-apply the journal records written since the last checkpoint to a per-user command's sessions."""
+        start = time.perf_counter()
+        replayed = 0
+        records = (record for record in self.journal.records() if record['command'] == command_name)
+        while batch := list(itertools.islice(records, batch_size)):
+            by_user = {}
+            for record in batch:
+                by_user.setdefault(record['user'], []).append(record)
+            for user_id, user_records in by_user.items():
+                with manager.session(user_id) as session:
+                    session.replay(user_records)
+            replayed += len(batch)
+        if replayed:
+            logging.info(f"Replayed {replayed} journal records for {command_name} in {time.perf_counter() - start:.2f}s.")
 
     def register_plugin_commands(self, plugin_module):
-     for item_name in dir(plugin_module):
-        item = getattr(plugin_module, item_name)
-        if isinstance(item, type) and issubclass(item, Command) and item is not Command:
+        """Instantiate and register every command in an imported plugin module."""
+        registered = []
+        for item_name in dir(plugin_module):
+            item = getattr(plugin_module, item_name)
+            if isinstance(item, type) and issubclass(item, Command) and item is not Command:
+                try:
+                    command_instance = self.create_command(item_name, item)
+                    self.command_handler.register_command(command_instance)
+                    registered.append((item_name, command_instance))
+                    logging.info(f"Command '{command_instance.name}' from plugin '{plugin_module.__name__}' registered.")
+                except TypeError as e:
+                    logging.error(f"Failed to instantiate command '{item_name}' from plugin '{plugin_module.__name__}': {e}")
+        return registered
+
+    def register_lazy_commands(self, module_name, cached_commands):
+        """Register placeholders for a plugin's commands using metadata from the manifest."""
+        for entry in cached_commands:
+            loader = functools.partial(self.load_plugin_command, module_name, entry['class'])
+            self.command_handler.register_command(LazyCommand(entry['name'], entry['description'], loader, entry['routing']))
+            logging.info(f"Command '{entry['name']}' from plugin '{module_name}' registered from manifest.")
+
+    def load_plugin_command(self, module_name, class_name):
+        """Import a plugin module and instantiate one of its commands."""
+        plugin_module = importlib.import_module(module_name)
+        return self.create_command(class_name, getattr(plugin_module, class_name))
+
+    def register_builtin_commands(self):
+        """Register the commands the application itself provides."""
+        # Ensure that 'name' and 'description' are passed according to the new constructor
+        dynamic_menu_command = DynamicMenuCommand("show_menu", "Show the dynamic menu of all commands.", self.command_handler)
+        self.command_handler.register_command(dynamic_menu_command)
+        self.command_handler.register_command(StatsCommand("stats", "Show latency percentiles and outcomes per command.", self.command_handler,
+                                                            lambda: self.journal.stats() if self.journal is not None else None))
+        interval = float(self.settings.get('STATS_DUMP_INTERVAL', 60))
+        if interval > 0 and self.metrics_dumper is None:
+            self.metrics_dumper = MetricsDumper(self.command_handler.metrics, os.path.join('logs', 'command_stats.json'), interval).start()
+
+    def shutdown(self):
+        """Release background resources before the application exits."""
+        if self.metrics_dumper is not None:
+            self.metrics_dumper.stop()
+            self.metrics_dumper = None
+        self.command_handler.shutdown(wait=False)
+        try:
+            self.command_handler.save_intent_model()
+            self.command_handler.result_cache.save(self.result_cache_path)
+        except OSError as e:
+            logging.warning(f"Could not save caches: {e}")
+        for compactor in self.compactors:
+            compactor.stop()
+        self.compactors = []
+        if self.checkpointer is not None:
+            self.checkpointer.stop()
+            self.checkpointer = None
+        if self.journal is not None:
             try:
-                # Attempt to dynamically determine the required constructor arguments here
-                # This is a simplified example; you might need a more complex approach
-                if item_name == 'FitnessHistory':
-                    user_id = self.settings.get('USER_ID')  # or another way to fetch user_id
-                    command_instance = item(user_id=user_id) if user_id is not None else item()
-                else:
-                    command_instance = item()
-                self.command_handler.register_command(command_instance)
-                logging.info(f"Command '{command_instance.name}' from plugin '{plugin_module.__name__}' registered.")
-            except TypeError as e:
-                logging.error(f"Failed to instantiate command '{item_name}' from plugin '{plugin_module.__name__}': {e}")
+                self.journal.checkpoint(self.snapshot_sessions)
+            except OSError as e:
+                logging.warning(f"Could not checkpoint the journal; it will be replayed on the next start: {e}")
+            self.journal.close()
+            self.journal = None
 
+    def parse_command_line(self, cmd_input):
+        """Split input into a command name and arguments, routing natural language to a command.
+
+        Returns None if the input reads as natural language that no command matched.
+        """
+        if cmd_input == '':  # Check if the input is empty
+            return "show_menu", []  # Execute the show_menu command
+        cmd_name, *args = cmd_input.split()
+        if args and self.command_handler.resolve_command_name(cmd_name) is None:
+            # Several words that don't start with a command read as a natural language request.
+            routed = self.command_handler.route_input(cmd_input)
+            return (routed, []) if routed is not None else None
+        return cmd_name, args
+
+    @staticmethod
+    def show_result(result):
+        if result is not None:
+            print(result)
+
+    def dispatch(self, cmd_input):
+        """Run one line of user input as a command. Returns True if the command succeeded."""
+        try:
+            parsed = self.parse_command_line(cmd_input)
+            if parsed is None:
+                return self.command_handler.fall_back(cmd_input)
+            cmd_name, args = parsed
+            self.show_result(self.command_handler.invoke(cmd_name, *args))
+            return True
+        except CommandNotFoundError:
+            self.command_handler.execute_command("show_menu")  # Show menu if unknown command
+        except (CommandTimeoutError, CommandCancelledError):
+            pass  # Logged by the command handler; the REPL carries on
+        except Exception as e:
+            logging.error(f"Error executing command: {e}")
+        return False
+
+    def complete_command(self, text, state):
+        """readline completer for the command name at the start of the line."""
+        if state == 0:
+            at_start = readline.get_begidx() == 0
+            self.completion_matches = self.command_handler.complete_command_name(text) if at_start else []
+        return self.completion_matches[state] if state < len(self.completion_matches) else None
+
+    def enable_tab_completion(self):
+        """Complete command names with Tab in the REPL when readline is available."""
+        if readline is None:
+            return
+        readline.set_completer(self.complete_command)
+        if 'libedit' in (readline.__doc__ or ''):
+            readline.parse_and_bind('bind ^I rl_complete')
+        else:
+            readline.parse_and_bind('tab: complete')
 
     def start(self):
         self.load_plugins()
-         # Ensure that 'name' and 'description' are passed according to the new constructor
-        dynamic_menu_command = DynamicMenuCommand("show_menu", "Show the dynamic menu of all commands.", self.command_handler)
-        self.command_handler.register_command(dynamic_menu_command)
+        self.register_builtin_commands()
+        self.enable_tab_completion()
         logging.info("Application started. Type 'show_menu' to see the menu or 'exit' to exit.")
         try:
             while True:
@@ -73,22 +285,138 @@ class App:
                 if cmd_input.lower() == 'exit':
                     logging.info("Application exit.")
                     break  # Graceful exit without sys.exit(0) for more natural control flow in some contexts
-                elif cmd_input == '':  # Check if the input is empty
-                    self.command_handler.execute_command("show_menu")  # Execute the show_menu command
-                else:
-                    try:
-                        cmd_name, *args = cmd_input.split()
-                        self.command_handler.execute_command(cmd_name, *args)
-                    except KeyError:
-                        logging.error(f"Unknown command: {cmd_input}")
-                        self.command_handler.execute_command("show_menu")  # Show menu if unknown command
-                    except Exception as e:
-                        logging.error(f"Error executing command: {e}")
+                self.dispatch(cmd_input)
+        except KeyboardInterrupt:
+            logging.info("Application interrupted and exiting gracefully.")
+        finally:
+            self.shutdown()
+            logging.info("Application shutdown.")
+
+    async def dispatch_async(self, cmd_input):
+        """Run one line of user input as a command on the event loop."""
+        loop = asyncio.get_running_loop()
+        executor = self.command_handler.get_executor()
+        try:
+            # Routing natural language may build the intent model, so keep it off the loop.
+            parsed = await loop.run_in_executor(executor, self.parse_command_line, cmd_input)
+            if parsed is None:
+                return await loop.run_in_executor(executor, self.command_handler.fall_back, cmd_input)
+            cmd_name, args = parsed
+            self.show_result(await self.command_handler.invoke_async(cmd_name, *args))
+            return True
+        except CommandNotFoundError:
+            await self.command_handler.execute_command_async("show_menu")
+        except (CommandTimeoutError, asyncio.CancelledError):
+            pass  # Logged by the command handler; the REPL carries on
+        except Exception as e:
+            logging.error(f"Error executing command: {e}")
+        return False
+
+    def read_input_lines(self, loop, queue):
+        """Feed input() lines to the event loop from a daemon thread so reading never blocks commands."""
+        while True:
+            try:
+                cmd_input = input(">>> ")
+            except EOFError:
+                cmd_input = 'exit'
+            loop.call_soon_threadsafe(queue.put_nowait, cmd_input)
+            if cmd_input.strip().lower() == 'exit':
+                return
+
+    async def repl_async(self):
+        """REPL that keeps reading input while earlier commands are still running."""
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        reader = threading.Thread(target=self.read_input_lines, args=(loop, queue), daemon=True)
+        reader.start()
+        running = set()
+
+        def interrupt():
+            # Ctrl-C cancels the running commands; with nothing running it exits like 'exit'.
+            if running:
+                logging.info(f"Cancelling {len(running)} running command(s).")
+                for task in running:
+                    task.cancel()
+            else:
+                queue.put_nowait('exit')
+
+        try:
+            loop.add_signal_handler(signal.SIGINT, interrupt)
+        except (NotImplementedError, RuntimeError):  # e.g. Windows event loops, or not the main thread
+            pass
+        try:
+            while True:
+                cmd_input = (await queue.get()).strip()
+                if cmd_input.lower() == 'exit':
+                    logging.info("Application exit.")
+                    break
+                task = asyncio.create_task(self.dispatch_async(cmd_input))
+                running.add(task)
+                task.add_done_callback(running.discard)
+            if running:
+                logging.info(f"Waiting for {len(running)} running command(s) to finish.")
+                await asyncio.gather(*running)
+        finally:
+            for task in running:
+                task.cancel()
+            try:
+                loop.remove_signal_handler(signal.SIGINT)
+            except (NotImplementedError, RuntimeError):
+                pass
+
+    def start_async(self):
+        """Start the asyncio-driven REPL."""
+        self.load_plugins()
+        self.register_builtin_commands()
+        self.enable_tab_completion()
+        logging.info("Application started in async mode. Type 'show_menu' to see the menu or 'exit' to exit.")
+        try:
+            asyncio.run(self.repl_async())
         except KeyboardInterrupt:
             logging.info("Application interrupted and exiting gracefully.")
         finally:
+            self.shutdown()
             logging.info("Application shutdown.")
 
+    def serve(self, socket_path=None):
+        """Keep the application warm behind a Unix socket for client.py to talk to."""
+        from app.server import CommandServer, default_socket_path
+        socket_path = socket_path or default_socket_path(self.settings)
+        self.load_plugins()
+        self.register_builtin_commands()
+        self.command_handler.preload()
+        if any(command.cpu_bound for command in self.command_handler.loaded_commands()):
+            self.command_handler.warm_process_pool()
+        with CommandServer(socket_path, self) as server:
+            logging.info(f"Application serving on '{socket_path}'. Press Ctrl-C to stop.")
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                logging.info("Server interrupted and exiting gracefully.")
+            finally:
+                self.shutdown()
+                logging.info("Server shutdown.")
+
+    def serve_http(self, host=None, port=None):
+        """Expose the commands as a JSON API over HTTP."""
+        from app.api import serve_api
+        host = host or self.settings.get('API_HOST', '127.0.0.1')
+        port = int(port or self.settings.get('API_PORT', 8080))
+        self.load_plugins()
+        self.register_builtin_commands()
+        self.command_handler.preload()
+        if any(command.cpu_bound for command in self.command_handler.loaded_commands()):
+            self.command_handler.warm_process_pool()
+        try:
+            asyncio.run(serve_api(self, host, port,
+                                  max_concurrency=int(self.settings.get('API_MAX_CONCURRENCY', 16)),
+                                  max_queue=int(self.settings.get('API_MAX_QUEUE', 256))))
+        except KeyboardInterrupt:
+            logging.info("Server interrupted and exiting gracefully.")
+        finally:
+            self.shutdown()
+            logging.info("Server shutdown.")
+
 class DynamicMenuCommand(Command):
     def __init__(self, name, description, command_handler):
         super().__init__(name, description)
@@ -102,11 +430,40 @@ class DynamicMenuCommand(Command):
         print(menu)
 
     def handle_input(self, user_input):
-    # Simple keyword-based routing
-     if "stronger" in user_input.lower():
-        self.command_handler.execute_command("fitness_trainer", user_input)
-     elif "history" in user_input.lower() or "past workouts" in user_input.lower():
-        self.command_handler.execute_command("fitness_history")
-     else:
-        # No matching keyword found, provide a helpful message
-        print("Sorry, I didn't understand that. You can type 'show_menu' to see available commands.")
\ No newline at end of file
+        # Trigger phrases declared by the commands first, then the intent router
+        if not self.command_handler.parse_natural_language_command(user_input):
+            # No matching keyword found, provide a helpful message
+            print("Sorry, I didn't understand that. You can type 'show_menu' to see available commands.")
+
+
+class StatsCommand(Command):
+    def __init__(self, name, description, command_handler, journal_stats=None):
+        super().__init__(name, description)
+        self.command_handler = command_handler
+        self.journal_stats = journal_stats  # Returns the journal's stats, or None while there is no journal
+
+    def execute(self, *args, **kwargs):
+        snapshot = self.command_handler.metrics.snapshot()
+        if not snapshot:
+            print("No commands have been executed yet.")
+            return
+        report = "Command Stats:\n"
+        for name, stats in snapshot.items():
+            outcomes = ", ".join(f"{count} {outcome}" for outcome, count in stats['outcomes'].items())
+            report += (f"{name}: {stats['calls']} calls ({outcomes}) "
+                       f"p50 {stats['p50_ms']:.2f} ms, p95 {stats['p95_ms']:.2f} ms, p99 {stats['p99_ms']:.2f} ms\n")
+        cache_stats = self.command_handler.result_cache.stats()
+        if cache_stats:
+            report += "Result Cache:\n"
+            for name, (hits, misses) in cache_stats.items():
+                report += f"{name}: {hits} hits, {misses} misses\n"
+        journal_stats = self.journal_stats() if self.journal_stats else None
+        if journal_stats:
+            report += (f"Journal: {journal_stats['records']} records in {journal_stats['batches']} batches, "
+                       f"queue depth {journal_stats['queue_depth']} (max {journal_stats['max_queue_depth']}, "
+                       f"{journal_stats['blocked_appends']} appends blocked), "
+                       f"flush p50 {journal_stats['flush_p50_ms']:.2f} ms, p99 {journal_stats['flush_p99_ms']:.2f} ms, "
+                       f"{journal_stats['write_errors']} write errors\n")
+            if journal_stats['last_error']:
+                report += f"Journal writes are failing and being retried: {journal_stats['last_error']}\n"
+        print(report)
@@ -0,0 +1,236 @@
+import sys
+import asyncio
+import inspect
+import logging
+import contextvars
+
+import orjson
+from aiohttp import web
+
+from app.commands import CommandTimeoutError
+from app.sessions import acting_as
+
+# Receives what the command running in this context prints, instead of the real stdout.
+output_sink = contextvars.ContextVar('output_sink', default=None)
+ITEM_BATCH = 256  # Items pulled from an iterator result per trip to the worker thread
+STREAM_DONE = object()
+
+
+def dumps(value):
+    """Serialize a response body, falling back to str() for values JSON has no type for."""
+    return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS)
+
+
+def json_response(body, status=200, headers=None):
+    return web.Response(body=dumps(body), status=status, headers=headers, content_type='application/json')
+
+
+def next_batch(iterator):
+    batch = []
+    for item in iterator:
+        batch.append(item)
+        if len(batch) == ITEM_BATCH:
+            break
+    return batch
+
+
+class OutputRouter:
+    """Replacement for sys.stdout that sends each request's printed output to that request.
+
+    Commands print from worker threads while other requests run, so output is routed
+    by context variable rather than by swapping sys.stdout per request.
+    """
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, text):
+        sink = output_sink.get()
+        if sink is None:
+            return self.stream.write(text)
+        sink(text)
+        return len(text)
+
+    def flush(self):
+        if output_sink.get() is None:
+            self.stream.flush()
+
+    def __getattr__(self, item):
+        return getattr(self.stream, item)
+
+
+class CommandAPI:
+    """JSON over HTTP front-end for an App's CommandHandler.
+
+    GET  /commands          list commands
+    POST /commands/{name}   run a command; body {"args": [...]}
+    POST /input             run a line of input as the REPL would; body {"input": "..."}
+
+    At most `max_concurrency` commands run at once and `max_queue` more wait for a
+    slot; beyond that requests get 503. With `?stream=1` the response is NDJSON
+    written while the command runs: {"output": ...} for printed text, {"item": ...}
+    for each element of an iterator result or {"result": ...}, then {"status": ...}.
+    The X-User-Id header picks whose state per-user commands act on.
+    """
+    def __init__(self, app, max_concurrency=16, max_queue=256):
+        self.app = app
+        self.command_handler = app.command_handler
+        self.max_queue = max_queue
+        self.semaphore = None  # Created on the server's event loop
+        self.max_concurrency = max_concurrency
+        self.waiting = 0
+        self.stdout = None
+
+    def make_application(self):
+        application = web.Application()
+        application.add_routes([
+            web.get('/commands', self.list_commands),
+            web.post('/commands/{name}', self.run_command),
+            web.post('/input', self.run_input),
+        ])
+        application.on_startup.append(self.on_startup)
+        application.on_cleanup.append(self.on_cleanup)
+        return application
+
+    async def on_startup(self, application):
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.stdout = sys.stdout
+        sys.stdout = OutputRouter(self.stdout)
+
+    async def on_cleanup(self, application):
+        sys.stdout = self.stdout
+
+    async def list_commands(self, request):
+        commands = [{'name': name, 'description': description} for name, description in self.command_handler.get_commands()]
+        return json_response({'commands': commands})
+
+    async def read_body(self, request):
+        if not request.can_read_body:
+            return {}
+        try:
+            body = orjson.loads(await request.read())
+        except orjson.JSONDecodeError as e:
+            raise web.HTTPBadRequest(text=dumps({'error': f"Invalid JSON: {e}"}).decode(), content_type='application/json')
+        if not isinstance(body, dict):
+            raise web.HTTPBadRequest(text=dumps({'error': "Expected a JSON object"}).decode(), content_type='application/json')
+        return body
+
+    async def run_command(self, request):
+        body = await self.read_body(request)
+        args = body.get('args', [])
+        if not isinstance(args, list):
+            return json_response({'error': "'args' must be a list"}, status=400)
+        return await self.execute(request, request.match_info['name'], [str(arg) for arg in args])
+
+    async def run_input(self, request):
+        body = await self.read_body(request)
+        cmd_input = str(body.get('input', '')).strip()
+        loop = asyncio.get_running_loop()
+        # Routing natural language may build the intent model, so keep it off the loop.
+        parsed = await loop.run_in_executor(self.command_handler.get_executor(), self.app.parse_command_line, cmd_input)
+        if parsed is None:
+            if self.command_handler.natural_language_fallback is None:
+                return json_response({'error': f"Could not match '{cmd_input}' to a command."}, status=404)
+            result = await loop.run_in_executor(self.command_handler.get_executor(), self.command_handler.fall_back, cmd_input)
+            return json_response({'result': result, 'output': ''})
+        cmd_name, args = parsed
+        return await self.execute(request, cmd_name, args)
+
+    async def execute(self, request, name, args):
+        """Run a command within the concurrency limit, as a JSON or streamed response."""
+        if self.command_handler.resolve_command_name(name) is None:
+            return json_response({'error': f"Command '{name}' not found.",
+                                  'suggestions': self.command_handler.index.suggest(name)}, status=404)
+        if self.semaphore.locked() and self.waiting >= self.max_queue:
+            return json_response({'error': "Too many requests in progress."}, status=503, headers={'Retry-After': '1'})
+        self.waiting += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        try:
+            with acting_as(request.headers.get('X-User-Id') or None):
+                if request.query.get('stream') in ('1', 'true'):
+                    return await self.stream_command(request, name, args)
+                return await self.call_command(name, args)
+        finally:
+            self.semaphore.release()
+
+    async def call_command(self, name, args):
+        output = []
+        token = output_sink.set(output.append)
+        try:
+            result = await self.command_handler.invoke_async(name, *args)
+            if inspect.isgenerator(result) or inspect.isasyncgen(result):
+                result = [item async for item in self.iterate(result)]
+        except CommandTimeoutError as e:
+            return json_response({'error': str(e)}, status=504)
+        except Exception as e:
+            logging.error(f"Error executing command '{name}' for an API request: {e}")
+            return json_response({'error': str(e)}, status=500)
+        finally:
+            output_sink.reset(token)
+        return json_response({'result': result, 'output': ''.join(output)})
+
+    async def iterate(self, result):
+        """Yield the items of a generator result without running its code on the event loop."""
+        if inspect.isasyncgen(result):
+            async for item in result:
+                yield item
+            return
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        while True:
+            batch = await loop.run_in_executor(self.command_handler.get_executor(), context.run, next_batch, result)
+            for item in batch:
+                yield item
+            if len(batch) < ITEM_BATCH:
+                return
+
+    async def stream_command(self, request, name, args):
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        token = output_sink.set(lambda text: loop.call_soon_threadsafe(queue.put_nowait, text))
+        try:
+            task = asyncio.ensure_future(self.command_handler.invoke_async(name, *args))
+        finally:
+            output_sink.reset(token)
+        task.add_done_callback(lambda _: queue.put_nowait(STREAM_DONE))
+        response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+        response.enable_chunked_encoding()
+        await response.prepare(request)
+        try:
+            while (text := await queue.get()) is not STREAM_DONE:
+                await response.write(dumps({'output': text}) + b'\n')
+            while not queue.empty():  # Printed just before the command returned
+                text = queue.get_nowait()
+                if text is not STREAM_DONE:
+                    await response.write(dumps({'output': text}) + b'\n')
+            try:
+                result = task.result()
+                if inspect.isgenerator(result) or inspect.isasyncgen(result):
+                    async for item in self.iterate(result):
+                        await response.write(dumps({'item': item}) + b'\n')
+                else:
+                    await response.write(dumps({'result': result}) + b'\n')
+                status = {'status': 'ok'}
+            except Exception as e:
+                status = {'status': 'error', 'error': str(e)}
+            await response.write(dumps(status) + b'\n')
+        finally:
+            task.cancel()  # The client went away mid-stream; stop the command too
+        await response.write_eof()
+        return response
+
+
+async def serve_api(app, host, port, max_concurrency, max_queue, keepalive_timeout=75.0):
+    """Run the API until cancelled."""
+    api = CommandAPI(app, max_concurrency, max_queue)
+    runner = web.AppRunner(api.make_application(), keepalive_timeout=keepalive_timeout, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    try:
+        await site.start()
+        logging.info(f"Application serving HTTP on http://{host}:{port}. Press Ctrl-C to stop.")
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
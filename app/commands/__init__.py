@@ -1,56 +1,419 @@
+import os
+import asyncio
+import contextvars
+import inspect
+import time
 import logging
+import threading
+import concurrent.futures
+from concurrent.futures import ThreadPoolExecutor
+
+from app.commands.cache import ResultCache, resolved
+from app.commands.deadline import call_with_cancel_event, run_in_daemon_thread
+from app.commands.index import CommandIndex
+from app.commands.metrics import CommandMetrics
+from app.commands.router import KeywordRouter
+from app.commands.workers import create_process_pool, execute_in_worker, ping
 
 class Command:
     """Base class for all command plugins, with metadata for dynamic menu generation."""
+    examples = ()  # Example phrases used to route natural language input to this command
+    triggers = ()  # Keywords or phrases that route input straight to this command
+    trigger_priority = 0  # Wins over lower priorities when triggers of several commands match
+    idempotent = False  # Results may be cached by CommandHandler, keyed on the arguments
+    cache_ttl = None  # Seconds a cached result stays fresh; None keeps it until evicted or invalidated
+    cache_persistent = False  # Cached results may be saved and reused after a restart
+    timeout = None  # Seconds before the caller gives up on this command; None uses the handler default
+    cpu_bound = False  # Run in the handler's process pool instead of the calling thread
+    process_pool_threshold = 0  # work_size() below which a cpu_bound command stays in-process
+
     def __init__(self, name, description):
         self.name = name  # Command name for menu display
         self.description = description  # Command description for menu display
 
     def execute(self, *args, **kwargs):
-        """Execute the command with given arguments."""
+        """Execute the command with given arguments. Subclasses may define this as `async def`."""
         raise NotImplementedError("Command execution not implemented.")
 
+    def is_cacheable(self, *args):
+        """Whether the result for these arguments may be cached. Defaults to `idempotent`."""
+        return self.idempotent
+
+    def cache_state(self):
+        """Token that changes whenever this command's cached results become stale.
+
+        Commands with cache_persistent set should derive it from their durable state,
+        since the default counter starts again from zero on every run.
+        """
+        return getattr(self, 'cache_generation', 0)
+
+    def invalidate_cache(self):
+        """Call when the command's state changes so its cached results are no longer used."""
+        self.cache_generation = self.cache_state() + 1
+
+    def work_size(self, *args):
+        """Rough size of the work these arguments imply, compared with process_pool_threshold.
+
+        cpu_bound commands are pickled with their arguments and sent to a worker process,
+        so they should define __getstate__ to ship only what execute needs.
+        """
+        return None  # Unknown, so always worth sending to the pool
+
+    def worker_command(self):
+        """The command a process pool worker runs execute() on; called by the submitting thread."""
+        return self
+
+
+class CommandNotFoundError(KeyError):
+    """Raised when a name matches no registered command, not even as an abbreviation."""
+
+
+class CommandTimeoutError(Exception):
+    """Raised when a command does not finish before its deadline."""
+    def __init__(self, name, timeout):
+        super().__init__(f"Command '{name}' timed out after {timeout} seconds.")
+        self.name = name
+        self.timeout = timeout
+
+
+class CommandCancelledError(Exception):
+    """Raised when a running command is cancelled, e.g. with Ctrl-C in the REPL."""
+
+
 class CommandHandler:
     """Handles registration and execution of commands."""
-    def __init__(self):
+    def __init__(self, max_workers=4, result_cache_size=256, default_timeout=None, process_workers=None):
         self.commands = {}
+        self.default_timeout = default_timeout  # Deadline for commands that don't set their own
+        self.max_workers = max_workers  # Threads available to sync commands on the async path
+        self.executor = None
+        self.process_workers = process_workers  # None lets ProcessPoolExecutor use one per CPU
+        self.process_pool = None
+        self.process_pool_lock = threading.Lock()
+        self.metrics = CommandMetrics()
+        self.result_cache = ResultCache(result_cache_size)
+        self.index = CommandIndex()
+        self.intent_router = None  # Built on first natural language request; NumPy is not needed before that
+        self.intent_pending = []  # Commands registered since the router last caught up
+        self.intent_lock = threading.Lock()
+        self.intent_model_path = None
+        self.keyword_router = None  # Rebuilt only after a command with triggers is (re)registered
+        self.natural_language_fallback = None  # e.g. an LLM call for inputs the router is unsure about
         logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
     def register_command(self, command):
         """Register a command instance."""
-        if command.name in self.commands:
+        previous = self.commands.get(command.name)
+        if previous is not None:
             logging.warning(f"Command '{command.name}' is already registered. Overwriting.")
+        if command.triggers or (previous is not None and previous.triggers):
+            self.keyword_router = None
         self.commands[command.name] = command
+        self.index.add(command.name, command.description)
+        self.intent_pending.append(command)
         logging.info(f"Command '{command.name}' registered successfully.")
     
     def get_commands(self):
         """Return a list of command metadata for all registered commands."""
         return [(cmd.name, cmd.description) for cmd in self.commands.values()]
 
-    def execute_command(self, name, *args):
-        """Execute a command by name."""
-        command = self.commands.get(name)
-        if not command:
+    def preload(self):
+        """Load every lazily registered command now, e.g. before serving requests."""
+        for command in self.commands.values():
+            if hasattr(command, 'resolve'):
+                command.resolve()
+
+    def loaded_commands(self):
+        """Return the real command objects, skipping lazily registered ones not imported yet."""
+        loaded = [cmd.command if hasattr(cmd, 'resolve') else cmd for cmd in self.commands.values()]
+        return [cmd for cmd in loaded if cmd is not None]
+
+    def resolve_command_name(self, name):
+        """Return the registered name for an exact name or unique abbreviation, or None."""
+        if name in self.commands:
+            return name
+        return self.index.resolve_prefix(name)
+
+    def report_unknown_command(self, name):
+        suggestions = self.index.suggest(name)
+        if suggestions:
+            logging.error(f"Command '{name}' not found. Did you mean: {', '.join(suggestions)}?")
+        else:
             logging.error(f"Command '{name}' not found.")
+
+    def complete_command_name(self, prefix):
+        """Return the registered command names starting with prefix, for tab completion."""
+        return self.index.complete(prefix)
+
+    def get_command(self, name):
+        """Return the command registered under a name or unique abbreviation."""
+        resolved = self.resolve_command_name(name)
+        if resolved is None:
+            self.report_unknown_command(name)
+            raise CommandNotFoundError(name)
+        return self.commands[resolved]
+
+    def call_command(self, command, args):
+        """Run a command, serving and storing idempotent results through the result cache."""
+        key = self.result_cache.key_for(command, args)
+        if key is not None:
+            hit, result = self.result_cache.get(key)
+            if hit:
+                return result
+        result = self.run_command(command, args)
+        if inspect.isawaitable(result):
+            # An async command called from synchronous code runs on its own event loop.
+            result = asyncio.run(result)
+        if key is not None:
+            self.result_cache.put(key, result, command)
+        return result
+
+    def run_command(self, command, args):
+        """Execute a command here, or in the process pool if it is CPU-bound and the input is large enough."""
+        target = resolved(command)
+        if target.cpu_bound:
+            size = target.work_size(*args)
+            if size is None or size >= target.process_pool_threshold:
+                future = self.get_process_pool(target).submit(execute_in_worker, target.worker_command(), args)
+                try:
+                    return future.result()
+                except KeyboardInterrupt:
+                    future.cancel()
+                    raise
+        return command.execute(*args)
+
+    def get_timeout(self, command):
+        """Return the deadline in seconds for a command, or None for no deadline."""
+        timeout = resolved(command).timeout
+        return timeout if timeout is not None else self.default_timeout
+
+    def call_with_deadline(self, command, args, timeout):
+        """Run a command on a worker thread, abandoning it if it misses the deadline."""
+        future, cancel_event = run_in_daemon_thread(self.call_command, command, args)
+        try:
+            # wait() rather than result(timeout) so a TimeoutError raised by the command itself isn't mistaken for ours
+            done, _ = concurrent.futures.wait([future], timeout)
+        except KeyboardInterrupt:
+            cancel_event.set()
+            raise
+        if not done:
+            cancel_event.set()
+            raise CommandTimeoutError(command.name, timeout)
+        return future.result()
+
+    def invoke(self, name, *args):
+        """Execute a command by name or unique abbreviation and return its result.
+
+        Raises CommandNotFoundError for unknown commands, CommandTimeoutError when the
+        command misses its deadline and CommandCancelledError on Ctrl-C; errors raised
+        by the command propagate.
+        """
+        command = self.get_command(name)
+        timeout = self.get_timeout(command)
+        outcome = 'error'
+        start = time.perf_counter()
+        try:
+            if timeout is None:
+                result = self.call_command(command, args)
+            else:
+                result = self.call_with_deadline(command, args, timeout)
+            outcome = 'success'
+            return result
+        except CommandTimeoutError as e:
+            outcome = 'timeout'
+            logging.warning(f"{e} Its worker was abandoned.")
+            raise
+        except KeyboardInterrupt:
+            # Ctrl-C while a command runs stops that command, not the whole application.
+            outcome = 'cancelled'
+            logging.warning(f"Command '{command.name}' cancelled.")
+            raise CommandCancelledError(command.name) from None
+        finally:
+            self.metrics.record(command.name, time.perf_counter() - start, outcome)
+
+    def execute_command(self, name, *args):
+        """Execute a command by name or unique abbreviation. Returns True if it succeeded."""
+        try:
+            self.invoke(name, *args)
+            return True
+        except (CommandNotFoundError, CommandTimeoutError, CommandCancelledError):
+            return False  # Already logged
+        except Exception as e:
+            logging.error(f"Error executing command '{name}': {e}")
             return False
+
+    async def call_command_async(self, command, args):
+        """Await an async command, serving and storing idempotent results through the result cache."""
+        key = self.result_cache.key_for(command, args)
+        if key is not None:
+            hit, result = self.result_cache.get(key)
+            if hit:
+                return result
+        result = await command.execute(*args)
+        if key is not None:
+            self.result_cache.put(key, result, command)
+        return result
+
+    async def invoke_async(self, name, *args):
+        """Execute a command without blocking the event loop and return its result.
+
+        Commands with an `async def execute` are awaited directly; synchronous ones
+        run on a bounded thread pool, or on a daemon thread when they have a deadline
+        so an abandoned command can't tie up the pool. Cancelling the awaiting task
+        cancels the command.
+        """
+        command = self.get_command(name)
+        timeout = self.get_timeout(command)
+        cancel_event = threading.Event()
+        outcome = 'error'
+        start = time.perf_counter()
+        try:
+            if inspect.iscoroutinefunction(command.execute):
+                awaitable = self.call_command_async(command, args)
+            elif timeout is None:
+                loop = asyncio.get_running_loop()
+                # run_in_executor doesn't carry context variables over to the worker thread.
+                context = contextvars.copy_context()
+                awaitable = loop.run_in_executor(self.get_executor(), context.run, call_with_cancel_event,
+                                                 cancel_event, self.call_command, command, args)
+            else:
+                future, cancel_event = run_in_daemon_thread(self.call_command, command, args)
+                awaitable = asyncio.wrap_future(future)
+            task = asyncio.ensure_future(awaitable)
+            try:
+                done, _ = await asyncio.wait({task}, timeout=timeout)
+            except asyncio.CancelledError:
+                task.cancel()
+                raise
+            if not done:
+                task.cancel()
+                raise CommandTimeoutError(command.name, timeout)
+            result = task.result()
+            outcome = 'success'
+            return result
+        except CommandTimeoutError as e:
+            outcome = 'timeout'
+            cancel_event.set()
+            logging.warning(f"{e} Its worker was abandoned.")
+            raise
+        except asyncio.CancelledError:
+            outcome = 'cancelled'
+            cancel_event.set()
+            logging.warning(f"Command '{command.name}' cancelled.")
+            raise
+        finally:
+            self.metrics.record(command.name, time.perf_counter() - start, outcome)
+
+    async def execute_command_async(self, name, *args):
+        """Async counterpart of execute_command. Returns True if the command succeeded."""
         try:
-            command.execute(*args)
+            await self.invoke_async(name, *args)
             return True
+        except (CommandNotFoundError, CommandTimeoutError):
+            return False  # Already logged
         except Exception as e:
             logging.error(f"Error executing command '{name}': {e}")
             return False
 
+    def invalidate_cache(self, name=None):
+        """Drop cached results for one command, or for all of them."""
+        self.result_cache.invalidate(name)
+
+    def get_executor(self):
+        """Return the thread pool used for synchronous commands, creating it on first use."""
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='command')
+        return self.executor
+
+    def get_process_pool(self, command=None):
+        """Return the process pool for CPU-bound commands, creating it on first use.
+
+        Workers import the plugin modules of every loaded CPU-bound command when they start.
+        """
+        with self.process_pool_lock:
+            if self.process_pool is None:
+                modules = {type(cmd).__module__ for cmd in self.loaded_commands() if cmd.cpu_bound}
+                if command is not None:
+                    modules.add(type(command).__module__)
+                self.process_pool = create_process_pool(self.get_process_workers(), sorted(modules))
+                logging.info(f"Process pool started with warm modules: {', '.join(sorted(modules)) or 'none'}.")
+            return self.process_pool
+
+    def get_process_workers(self):
+        return self.process_workers or os.cpu_count() or 1
+
+    def warm_process_pool(self):
+        """Start every process pool worker now so the first CPU-bound command doesn't wait for them."""
+        pool = self.get_process_pool()
+        for future in [pool.submit(ping) for _ in range(self.get_process_workers())]:
+            future.result()
+
+    def shutdown(self, wait=True):
+        """Release the worker threads and processes used to run commands."""
+        if self.executor is not None:
+            self.executor.shutdown(wait=wait)
+            self.executor = None
+        if self.process_pool is not None:
+            self.process_pool.shutdown(wait=wait, cancel_futures=True)
+            self.process_pool = None
+
+    def get_intent_router(self):
+        """Return the intent router, vectorizing any commands registered since the last call."""
+        with self.intent_lock:
+            if self.intent_router is None:
+                from app.commands.intent import IntentRouter
+                self.intent_router = IntentRouter()
+                if self.intent_model_path:
+                    self.intent_router.load(self.intent_model_path)
+            for command in self.intent_pending:
+                if self.commands.get(command.name) is command:
+                    self.intent_router.add(command)
+            self.intent_pending = []
+            return self.intent_router
+
+    def save_intent_model(self):
+        """Persist the intent router's vectors so the next run only vectorizes changed commands."""
+        if self.intent_router is not None and self.intent_model_path:
+            self.intent_router.save(self.intent_model_path)
+
+    def route_keywords(self, input_string):
+        """Return the command whose trigger phrases best match the input, or None."""
+        if self.keyword_router is None:
+            self.keyword_router = KeywordRouter(self.commands.values())
+        return self.keyword_router.route(input_string)
+
+    def route_natural_language(self, input_string):
+        """Return the command name the local intent router picks for the input, or None."""
+        return self.get_intent_router().route(input_string)
+
     def parse_natural_language_command(self, input_string):
-        """Parse natural language input to find and execute a command (Placeholder)."""
-        # This is a placeholder for natural language processing logic.
-        # You would typically use NLP techniques here to extract the command and arguments from the input string.
-        logging.info("Parsing natural language command (placeholder function).")
+        """Parse natural language input to find and execute a command.
+
+        Declared trigger phrases win, then confident matches from the local intent
+        router; anything else goes to natural_language_fallback (typically an LLM)
+        when one is configured.
+        """
+        name = self.route_input(input_string)
+        if name is not None:
+            return self.execute_command(name)
+        return self.fall_back(input_string)
+
+    def route_input(self, input_string):
+        """Return the command name for natural language input, or None if nothing matched confidently."""
+        return self.route_keywords(input_string) or self.route_natural_language(input_string)
+
+    def fall_back(self, input_string):
+        """Hand input the local routers could not place to natural_language_fallback, if any."""
+        if self.natural_language_fallback is not None:
+            logging.info(f"No confident local match for '{input_string}', using the fallback.")
+            return self.natural_language_fallback(input_string)
+        logging.info(f"Could not match '{input_string}' to a command.")
         return False
 
     # New method to discover commands based on keywords in their descriptions.
     def find_command_by_description(self, keyword):
         """Find commands by keyword in their descriptions."""
-        matches = [cmd for cmd in self.commands.values() if keyword.lower() in cmd.description.lower()]
+        matches = [self.commands[name] for name in self.index.search(keyword)]
         if not matches:
             logging.info(f"No commands found containing the keyword '{keyword}'.")
             return []
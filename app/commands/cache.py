@@ -0,0 +1,114 @@
+import os
+import time
+import pickle
+import logging
+import threading
+from collections import OrderedDict
+
+
+def resolved(command):
+    """Return the real command behind a lazily loaded placeholder."""
+    return command.resolve() if hasattr(command, 'resolve') else command
+
+
+class ResultCache:
+    """LRU cache of command results with optional per-entry expiry.
+
+    Keys combine the command name, its arguments and the command's cache_state()
+    token, so a command that calls invalidate_cache() simply stops hitting its old
+    entries, which then age out of the LRU.
+    """
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (expires_at or None, persistent, result)
+        self.lock = threading.Lock()
+        self.hits = {}
+        self.misses = {}
+
+    @staticmethod
+    def key_for(command, args):
+        """Return the cache key for a call, or None if the result must not be cached."""
+        target = resolved(command)
+        if not target.is_cacheable(*args):
+            return None
+        return (command.name, tuple(args), target.cache_state())
+
+    def get(self, key):
+        """Return (True, result) for a fresh entry, otherwise (False, None)."""
+        name = key[0]
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and (entry[0] is None or entry[0] > time.time()):
+                self.entries.move_to_end(key)
+                self.hits[name] = self.hits.get(name, 0) + 1
+                return True, entry[2]
+            if entry is not None:
+                del self.entries[key]
+            self.misses[name] = self.misses.get(name, 0) + 1
+            return False, None
+
+    def put(self, key, result, command):
+        """Store a result using the command's TTL and persistence settings."""
+        target = resolved(command)
+        self.put_entry(key, result, target.cache_ttl, target.cache_persistent)
+
+    def put_entry(self, key, result, ttl=None, persistent=False):
+        """Store a result, evicting the least recently used entries beyond max_entries."""
+        expires_at = time.time() + ttl if ttl is not None else None
+        with self.lock:
+            self.entries[key] = (expires_at, persistent, result)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, name=None):
+        """Drop every cached result, or only those of one command."""
+        with self.lock:
+            if name is None:
+                self.entries.clear()
+            else:
+                for key in [key for key in self.entries if key[0] == name]:
+                    del self.entries[key]
+
+    def stats(self):
+        """Return {command name: (hits, misses)}."""
+        with self.lock:
+            names = sorted(set(self.hits) | set(self.misses))
+            return {name: (self.hits.get(name, 0), self.misses.get(name, 0)) for name in names}
+
+    def load(self, path):
+        """Restore persistent entries saved by a previous run."""
+        try:
+            with open(path, 'rb') as f:
+                saved = pickle.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError) as e:
+            logging.warning(f"Ignoring unreadable result cache '{path}': {e}")
+            return
+        now = time.time()
+        with self.lock:
+            for key, (expires_at, result) in saved.items():
+                if expires_at is None or expires_at > now:
+                    self.entries[key] = (expires_at, True, result)
+        logging.info(f"Loaded {len(saved)} cached command results from '{path}'.")
+
+    def save(self, path):
+        """Write the unexpired entries of commands that opted into persistence."""
+        now = time.time()
+        with self.lock:
+            items = [(key, entry) for key, entry in self.entries.items()
+                     if entry[1] and (entry[0] is None or entry[0] > now)]
+        saved = {}
+        for key, (expires_at, _, result) in items:
+            try:
+                pickle.dumps(result)
+            except Exception:  # Results that can't be pickled just aren't persisted
+                continue
+            saved[key] = (expires_at, result)
+        if not saved and not os.path.exists(path):
+            return
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(saved, f)
+        os.replace(tmp_path, path)
@@ -0,0 +1,48 @@
+import threading
+import contextvars
+from concurrent.futures import Future
+
+# Holds the cancel event of the command running on the current worker thread.
+execution_context = threading.local()
+
+
+def cancellation_requested():
+    """Return True if the command running on this thread has timed out or been cancelled.
+
+    Long-running synchronous commands can poll this to stop early; Python threads
+    cannot be interrupted from outside, so a command that never checks simply runs
+    to completion in the background after its caller has given up on it.
+    """
+    cancel_event = getattr(execution_context, 'cancel_event', None)
+    return cancel_event is not None and cancel_event.is_set()
+
+
+def call_with_cancel_event(cancel_event, function, *args):
+    """Call function with cancel_event visible to cancellation_requested()."""
+    execution_context.cancel_event = cancel_event
+    try:
+        return function(*args)
+    finally:
+        execution_context.cancel_event = None
+
+
+def run_in_daemon_thread(function, *args):
+    """Run function on a new daemon thread and return (future, cancel event).
+
+    Daemon threads are used for commands with a deadline so a hung, abandoned
+    command can never keep the process from exiting.
+    """
+    future = Future()
+    cancel_event = threading.Event()
+    context = contextvars.copy_context()  # e.g. the user a server request acts for
+
+    def worker():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(context.run(call_with_cancel_event, cancel_event, function, *args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=worker, name='command-deadline', daemon=True).start()
+    return future, cancel_event
@@ -0,0 +1,181 @@
+import re
+import heapq
+import bisect
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text):
+    """Split text into lowercase alphanumeric tokens."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def trigrams(word):
+    """Return the padded character trigrams of a word, used to find fuzzy candidates."""
+    padded = f"  {word.lower()} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b):
+    """Levenshtein distance between two strings."""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+class TrieNode:
+    __slots__ = ('children', 'count', 'terminal')
+
+    def __init__(self):
+        self.children = {}
+        self.count = 0  # Number of command names at or below this node
+        self.terminal = False
+
+
+class CommandIndex:
+    """Incrementally maintained lookup structures over registered command names and descriptions.
+
+    - an inverted index from description tokens to command names, for keyword search
+    - a prefix trie of command names, for unique abbreviations and tab completion
+    - a trigram index of command names, for ranked "did you mean" suggestions
+    """
+    def __init__(self):
+        self.descriptions = {}  # name -> lowercased description
+        self.postings = {}  # token -> set of names
+        self.tokens = []  # sorted distinct tokens, for prefix matching
+        self.root = TrieNode()
+        self.trigram_postings = {}  # trigram -> set of names
+        self.name_trigrams = {}  # name -> trigrams of the name
+
+    def __contains__(self, name):
+        return name in self.descriptions
+
+    def add(self, name, description):
+        """Index a command, replacing any previous entry with the same name."""
+        if name in self.descriptions:
+            self.remove(name)
+        lowered = description.lower()
+        self.descriptions[name] = lowered
+        for token in set(tokenize(lowered)):
+            names = self.postings.get(token)
+            if names is None:
+                names = self.postings[token] = set()
+                bisect.insort(self.tokens, token)
+            names.add(name)
+        node = self.root
+        node.count += 1
+        for char in name:
+            node = node.children.setdefault(char, TrieNode())
+            node.count += 1
+        node.terminal = True
+        self.name_trigrams[name] = trigrams(name)
+        for trigram in self.name_trigrams[name]:
+            self.trigram_postings.setdefault(trigram, set()).add(name)
+
+    def remove(self, name):
+        """Drop a command from every index."""
+        lowered = self.descriptions.pop(name, None)
+        if lowered is None:
+            return
+        for token in set(tokenize(lowered)):
+            names = self.postings[token]
+            names.discard(name)
+            if not names:
+                del self.postings[token]
+                del self.tokens[bisect.bisect_left(self.tokens, token)]
+        node = self.root
+        node.count -= 1
+        for char in name:
+            child = node.children[char]
+            child.count -= 1
+            if child.count == 0:
+                del node.children[char]
+                break
+            node = child
+        else:
+            node.terminal = False
+        for trigram in self.name_trigrams.pop(name):
+            names = self.trigram_postings[trigram]
+            names.discard(name)
+            if not names:
+                del self.trigram_postings[trigram]
+
+    def search(self, keyword):
+        """Return the names of commands whose description contains the keyword.
+
+        Candidates come from the inverted index (each keyword token may be the start
+        of a description word), then the full phrase is checked against the description.
+        """
+        keyword = keyword.lower()
+        candidates = None
+        for token in tokenize(keyword):
+            matches = set()
+            position = bisect.bisect_left(self.tokens, token)
+            while position < len(self.tokens) and self.tokens[position].startswith(token):
+                matches |= self.postings[self.tokens[position]]
+                position += 1
+            candidates = matches if candidates is None else candidates & matches
+            if not candidates:
+                return []
+        if candidates is None:
+            return []
+        return sorted(name for name in candidates if keyword in self.descriptions[name])
+
+    def find_node(self, prefix):
+        node = self.root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return None
+        return node
+
+    def complete(self, prefix):
+        """Return every command name starting with prefix, in sorted order."""
+        node = self.find_node(prefix)
+        if node is None:
+            return []
+        names = []
+        stack = [(node, prefix)]
+        while stack:
+            node, name = stack.pop()
+            if node.terminal:
+                names.append(name)
+            for char, child in node.children.items():
+                stack.append((child, name + char))
+        return sorted(names)
+
+    def resolve_prefix(self, prefix):
+        """Return the only command name starting with prefix, or None if there are zero or several."""
+        node = self.find_node(prefix) if prefix else None
+        if node is None or node.count != 1:
+            return None
+        name = prefix
+        while not node.terminal:
+            char, node = next(iter(node.children.items()))
+            name += char
+        return name
+
+    def suggest(self, word, limit=3, max_distance=2):
+        """Return up to `limit` command names within `max_distance` edits of a mistyped word, best first."""
+        word = word.lower()
+        grams = trigrams(word)
+        # Each edit destroys at most three trigrams, so a close name must share `required` of them
+        # and therefore at least one of the rarest len(grams) - required + 1.
+        required = len(grams) - 3 * max_distance
+        by_rarity = sorted(grams, key=lambda gram: len(self.trigram_postings.get(gram, ())))
+        probe = by_rarity[:len(grams) - required + 1] if required > 0 else by_rarity
+        candidates = set()
+        for gram in probe:
+            candidates.update(self.trigram_postings.get(gram, ()))
+        shared = [(len(grams & self.name_trigrams[name]), name) for name in candidates
+                  if abs(len(name) - len(word)) <= max_distance]
+        # Only the names sharing the most trigrams are worth an exact edit distance.
+        best = heapq.nlargest(limit * 5, (item for item in shared if item[0] >= required))
+        ranked = sorted((edit_distance(word, name), name) for _, name in best)
+        return [name for distance, name in ranked if distance <= max_distance][:limit]
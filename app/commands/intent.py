@@ -0,0 +1,140 @@
+import os
+import zlib
+import logging
+
+import numpy as np
+
+from app.commands.index import tokenize
+
+N_FEATURES = 2 ** 12
+STOP_WORDS = frozenset(['a', 'an', 'the', 'i', 'me', 'my', 'you', 'your', 'to', 'of', 'and', 'or', 'with',
+                        'for', 'is', 'are', 'was', 'do', 'did', 'can', 'please', 'what', 'how', 'all'])
+
+
+def extract_features(text):
+    """Return hashed feature counts for text: words, word bigrams and in-word character trigrams."""
+    words = [word for word in tokenize(text.replace('_', ' ')) if word not in STOP_WORDS]
+    features = list(words)
+    features.extend(f"{first} {second}" for first, second in zip(words, words[1:]))
+    for word in words:
+        padded = f"<{word}>"
+        features.extend(f"#{padded[i:i + 3]}" for i in range(len(padded) - 2))
+    counts = {}
+    for feature in features:
+        # crc32 rather than hash() so the buckets are stable across processes and the cache stays valid.
+        bucket = zlib.crc32(feature.encode('utf-8')) % N_FEATURES
+        counts[bucket] = counts.get(bucket, 0) + 1
+    return counts
+
+
+def command_phrases(command):
+    """Phrases the router learns a command from: its name, description and examples."""
+    return [command.name, command.description, *getattr(command, 'examples', ())]
+
+
+class IntentRouter:
+    """Offline TF-IDF intent classifier over registered commands.
+
+    Every phrase of a command (name, description, examples) is hashed into a fixed
+    number of features, and a command scores the best cosine similarity of any of its
+    phrases. Adding a command only vectorizes that command; the normalised TF-IDF
+    matrix is rebuilt lazily with NumPy on the next query.
+    """
+    def __init__(self, threshold=0.35):
+        self.threshold = threshold  # Minimum cosine similarity to route without falling back
+        self.names = []
+        self.rows = {}  # name -> (fingerprint, sublinear term-frequency rows, one per phrase)
+        self.document_frequency = np.zeros(N_FEATURES, dtype=np.float32)
+        self.matrix = None  # normalised TF-IDF of every phrase, one column per phrase, built on demand
+        self.row_starts = None  # index of each command's first row in self.matrix
+        self.idf = None
+        self.cached_rows = {}
+        self.dirty = False
+
+    def add(self, command):
+        """Vectorize one command, replacing any previous version of it."""
+        phrases = command_phrases(command)
+        fingerprint = zlib.crc32("\n".join(phrases).encode('utf-8'))
+        cached = self.cached_rows.get(command.name)
+        if cached is not None and cached[0] == fingerprint:
+            rows = cached[1]
+        else:
+            rows = np.zeros((len(phrases), N_FEATURES), dtype=np.float32)
+            for row, phrase in zip(rows, phrases):
+                for bucket, count in extract_features(phrase).items():
+                    row[bucket] = 1.0 + np.log(count)
+            self.dirty = True
+        previous = self.rows.get(command.name)
+        if previous is not None:
+            self.document_frequency -= (previous[1] > 0).sum(axis=0)
+        else:
+            self.names.append(command.name)
+        self.rows[command.name] = (fingerprint, rows)
+        self.document_frequency += (rows > 0).sum(axis=0)
+        self.matrix = None
+
+    def build(self):
+        """Recompute IDF weights and the normalised document matrix."""
+        blocks = [self.rows[name][1] for name in self.names]
+        self.row_starts = np.cumsum([0] + [len(block) for block in blocks[:-1]])
+        n_documents = sum(len(block) for block in blocks)
+        self.idf = (np.log((1.0 + n_documents) / (1.0 + self.document_frequency)) + 1.0).astype(np.float32)
+        matrix = np.concatenate(blocks) * self.idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        # Stored feature-major so a query gathers a few contiguous rows.
+        self.matrix = np.ascontiguousarray((matrix / np.where(norms == 0, 1.0, norms)).T)
+
+    def scores(self, text):
+        """Return (name, cosine similarity) pairs for text, best first."""
+        if not self.names:
+            return []
+        if self.matrix is None:
+            self.build()
+        counts = extract_features(text)
+        if not counts:
+            return []
+        buckets = np.fromiter(counts.keys(), dtype=np.intp, count=len(counts))
+        weights = (1.0 + np.log(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))) * self.idf[buckets]
+        norm = np.linalg.norm(weights)
+        if norm == 0:
+            return []
+        # Only the query's few non-zero features take part, so this is a small gather, not a full product.
+        phrase_similarities = (weights / norm) @ self.matrix[buckets]
+        similarities = np.maximum.reduceat(phrase_similarities, self.row_starts)
+        order = np.argsort(similarities)[::-1]
+        return [(self.names[i], float(similarities[i])) for i in order]
+
+    def route(self, text):
+        """Return the best matching command name, or None if nothing clears the threshold."""
+        ranked = self.scores(text)
+        if not ranked:
+            return None
+        name, score = ranked[0]
+        logging.info(f"Intent router matched '{text}' to '{name}' with score {score:.2f}.")
+        return name if score >= self.threshold else None
+
+    def load(self, path):
+        """Load vectorized commands from a previous run so unchanged ones are not re-vectorized."""
+        try:
+            with np.load(path) as data:
+                blocks = np.split(data['rows'], np.cumsum(data['row_counts'])[:-1])
+                self.cached_rows = {
+                    str(name): (int(fingerprint), rows)
+                    for name, fingerprint, rows in zip(data['names'], data['fingerprints'], blocks)
+                }
+        except (OSError, KeyError, ValueError) as e:
+            if os.path.exists(path):
+                logging.warning(f"Ignoring unreadable intent model '{path}': {e}")
+
+    def save(self, path):
+        """Persist the vectorized commands if any were computed in this run."""
+        if not self.dirty or not self.names:
+            return
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path,
+                 names=np.array(self.names),
+                 fingerprints=np.array([self.rows[name][0] for name in self.names], dtype=np.int64),
+                 row_counts=np.array([len(self.rows[name][1]) for name in self.names]),
+                 rows=np.concatenate([self.rows[name][1] for name in self.names]))
+        os.replace(tmp_path, path)
+        self.dirty = False
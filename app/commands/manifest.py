@@ -0,0 +1,98 @@
+import os
+import json
+import logging
+
+from app.commands import Command
+
+MANIFEST_VERSION = 3
+# Command attributes the handler reads at registration time, so placeholders need them up front.
+ROUTING_ATTRIBUTES = ('examples', 'triggers', 'trigger_priority')
+
+
+class LazyCommand(Command):
+    """Stand-in for a plugin command whose module has not been imported yet."""
+    def __init__(self, name, description, loader, routing=None):
+        super().__init__(name, description)
+        for attribute, value in (routing or {}).items():
+            setattr(self, attribute, tuple(value) if isinstance(value, list) else value)
+        self.loader = loader  # Callable that imports the plugin and returns the real command
+        self.command = None
+
+    def resolve(self):
+        """Import the plugin and build the real command the first time it is needed."""
+        if self.command is None:
+            self.command = self.loader()
+            logging.info(f"Command '{self.name}' loaded on first use.")
+        return self.command
+
+    def execute(self, *args, **kwargs):
+        """Execute the real command, importing its plugin if necessary."""
+        return self.resolve().execute(*args, **kwargs)
+
+    def __getattr__(self, item):
+        # Only called for attributes the proxy does not have itself, e.g. plugin specific methods.
+        if item in ('loader', 'command'):
+            raise AttributeError(item)
+        return getattr(self.resolve(), item)
+
+
+class PluginManifest:
+    """On-disk cache of the commands each plugin provides, keyed by the plugin's source mtime."""
+    def __init__(self, plugins_package, cache_path):
+        self.plugins_package = plugins_package
+        self.plugins_path = plugins_package.replace('.', '/')
+        self.cache_path = cache_path
+        self.plugins = self.read()
+        self.dirty = False
+
+    def read(self):
+        """Load the cached manifest, returning an empty one if it is missing or stale."""
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if data.get('version') != MANIFEST_VERSION:
+            return {}
+        return data.get('plugins', {})
+
+    def save(self):
+        """Write the manifest back to disk if anything changed."""
+        if not self.dirty:
+            return
+        os.makedirs(os.path.dirname(self.cache_path) or '.', exist_ok=True)
+        tmp_path = f"{self.cache_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'plugins': self.plugins}, f, indent=2)
+        os.replace(tmp_path, self.cache_path)
+        self.dirty = False
+        logging.info(f"Plugin manifest saved to '{self.cache_path}'.")
+
+    def source_mtime(self, plugin_name):
+        """Return the newest modification time of any source file in a plugin package."""
+        newest = 0.0
+        for root, _, files in os.walk(os.path.join(self.plugins_path, plugin_name)):
+            for file_name in files:
+                if file_name.endswith('.py'):
+                    newest = max(newest, os.path.getmtime(os.path.join(root, file_name)))
+        return newest
+
+    def lookup(self, plugin_name, mtime):
+        """Return the cached command entries for a plugin, or None if the cache is out of date."""
+        entry = self.plugins.get(plugin_name)
+        if entry is None or entry.get('mtime') != mtime:
+            return None
+        return entry['commands']
+
+    def update(self, plugin_name, mtime, commands):
+        """Record the commands a freshly imported plugin registered."""
+        self.plugins[plugin_name] = {
+            'module': f'{self.plugins_package}.{plugin_name}',
+            'mtime': mtime,
+            'commands': [
+                {'class': class_name, 'name': command.name, 'description': command.description,
+                 'routing': {attribute: getattr(command, attribute) for attribute in ROUTING_ATTRIBUTES}}
+                for class_name, command in commands
+            ],
+        }
+        self.dirty = True
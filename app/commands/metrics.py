@@ -0,0 +1,141 @@
+import os
+import json
+import time
+import logging
+import threading
+
+# Each power of two is split into this many linear sub-buckets, giving ~1.5% relative precision.
+SUB_BUCKETS = 64
+SUB_BUCKET_BITS = SUB_BUCKETS.bit_length()  # Bits needed to hold a value in [SUB_BUCKETS, 2 * SUB_BUCKETS)
+# Values are stored in microseconds; 2**36 us is about 19 hours, which is plenty for a command.
+MAX_MAGNITUDE = 36
+
+
+class LatencyHistogram:
+    """HDR-style log-linear histogram of latencies recorded in microseconds.
+
+    Recording is a couple of integer operations and a list increment; percentiles
+    are only computed when someone asks for them.
+    """
+    def __init__(self):
+        self.counts = [0] * (SUB_BUCKETS * (MAX_MAGNITUDE - SUB_BUCKET_BITS + 2))
+        self.total = 0
+        self.max_value = 0
+
+    @staticmethod
+    def bucket_index(value):
+        """Map a value in microseconds to its bucket."""
+        if value < SUB_BUCKETS:
+            return value
+        shift = value.bit_length() - SUB_BUCKET_BITS
+        return (shift + 1) * SUB_BUCKETS + (value >> shift) - SUB_BUCKETS
+
+    @staticmethod
+    def bucket_upper_bound(index):
+        """Return the largest value that falls into a bucket."""
+        if index < SUB_BUCKETS:
+            return index
+        shift = index // SUB_BUCKETS - 1
+        sub_bucket = index % SUB_BUCKETS + SUB_BUCKETS
+        return ((sub_bucket + 1) << shift) - 1
+
+    def record(self, seconds):
+        """Record one latency measured in seconds."""
+        value = int(seconds * 1_000_000)
+        index = min(self.bucket_index(value), len(self.counts) - 1)
+        self.counts[index] += 1
+        self.total += 1
+        if value > self.max_value:
+            self.max_value = value
+
+    def percentile(self, percent):
+        """Return the latency in seconds at or below which `percent` of the recordings fall."""
+        if not self.total:
+            return 0.0
+        threshold = max(1, -(-self.total * percent // 100))  # ceil without floats
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= threshold:
+                return min(self.bucket_upper_bound(index), self.max_value) / 1_000_000
+        return self.max_value / 1_000_000
+
+
+class CommandStats:
+    """Latency histogram and outcome counts for one command."""
+    def __init__(self):
+        self.histogram = LatencyHistogram()
+        self.outcomes = {'success': 0, 'error': 0}
+
+    def snapshot(self):
+        return {
+            'calls': self.histogram.total,
+            'outcomes': dict(self.outcomes),
+            'p50_ms': self.histogram.percentile(50) * 1000,
+            'p95_ms': self.histogram.percentile(95) * 1000,
+            'p99_ms': self.histogram.percentile(99) * 1000,
+            'max_ms': self.histogram.max_value / 1000,
+        }
+
+
+class CommandMetrics:
+    """Per-command latency and outcome statistics collected by CommandHandler."""
+    def __init__(self):
+        self.stats = {}
+        self.lock = threading.Lock()  # Commands may finish on several worker threads at once
+        self.version = 0  # Bumped on every recording so the dumper can skip idle periods
+
+    def record(self, name, seconds, outcome):
+        """Record one command execution and whether it succeeded."""
+        with self.lock:
+            stats = self.stats.get(name)
+            if stats is None:
+                stats = self.stats[name] = CommandStats()
+            stats.histogram.record(seconds)
+            stats.outcomes[outcome] = stats.outcomes.get(outcome, 0) + 1
+            self.version += 1
+
+    def snapshot(self):
+        """Return a dict of per-command statistics, computing percentiles now."""
+        with self.lock:
+            return {name: stats.snapshot() for name, stats in sorted(self.stats.items())}
+
+
+class MetricsDumper:
+    """Background thread that periodically writes a metrics snapshot to a JSON file."""
+    def __init__(self, metrics, path, interval=60.0):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.dumped_version = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='metrics-dumper', daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.dump()
+
+    def dump(self):
+        """Write the current snapshot if anything was recorded since the last dump."""
+        if self.metrics.version == self.dumped_version:
+            return
+        self.dumped_version = self.metrics.version
+        snapshot = {'generated_at': time.time(), 'commands': self.metrics.snapshot()}
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.warning(f"Could not write command stats to '{self.path}': {e}")
+
+    def stop(self):
+        """Stop the thread and write one final snapshot."""
+        self.stopped.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        self.dump()
@@ -0,0 +1,92 @@
+from collections import deque
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton that finds every occurrence of many phrases in one pass over the text."""
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.outputs = [[]]  # state -> list of (phrase length, payload) ending in that state
+        for phrase, payload in patterns:
+            self.insert(phrase.lower(), payload)
+        self.build_failure_links()
+
+    def insert(self, phrase, payload):
+        state = 0
+        for char in phrase:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][char] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.outputs.append([])
+            state = next_state
+        self.outputs[state].append((len(phrase), payload))
+
+    def build_failure_links(self):
+        # Breadth-first, so every state's failure target is finished before its children need it.
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.outputs[next_state] = self.outputs[next_state] + self.outputs[self.fail[next_state]]
+
+    def find_all(self, text):
+        """Yield (start, end, payload) for every phrase occurrence in text (already lowercased)."""
+        goto, fail, outputs = self.goto, self.fail, self.outputs
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length, payload in outputs[state]:
+                yield position - length + 1, position + 1, payload
+
+
+class KeywordRouter:
+    """Routes input to commands by the trigger phrases they declare.
+
+    All triggers are compiled into a single automaton, so routing is one pass over the
+    input no matter how many routes exist. Matches must sit on word boundaries; when
+    several overlap, the higher `trigger_priority` wins, then the longer phrase, then
+    the earlier one.
+    """
+    def __init__(self, commands):
+        patterns = []
+        for command in commands:
+            for phrase in getattr(command, 'triggers', ()):
+                patterns.append((phrase, (getattr(command, 'trigger_priority', 0), command.name)))
+        self.automaton = KeywordAutomaton(patterns)
+
+    @staticmethod
+    def on_word_boundary(text, start, end):
+        return (start == 0 or not text[start - 1].isalnum()) and (end == len(text) or not text[end].isalnum())
+
+    def matches(self, text):
+        """Return the non-overlapping (start, end, command name) matches, best first."""
+        text = text.lower()
+        candidates = [
+            (priority, end - start, -start, end, name)
+            for start, end, (priority, name) in self.automaton.find_all(text)
+            if self.on_word_boundary(text, start, end)
+        ]
+        candidates.sort(reverse=True)
+        chosen = []
+        taken = []
+        for priority, length, negative_start, end, name in candidates:
+            start = -negative_start
+            if all(end <= other_start or start >= other_end for other_start, other_end in taken):
+                taken.append((start, end))
+                chosen.append((start, end, name))
+        return chosen
+
+    def route(self, text):
+        """Return the name of the best matching command, or None if no trigger occurs in text."""
+        matches = self.matches(text)
+        return matches[0][2] if matches else None
@@ -0,0 +1,40 @@
+import signal
+import asyncio
+import inspect
+import logging
+import importlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+
+def warm_worker(module_names):
+    """Process pool initializer: import plugin modules up front so the first task doesn't pay for it."""
+    # Ctrl-C is handled by the parent, which cancels the command; workers must survive it.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for module_name in module_names:
+        try:
+            importlib.import_module(module_name)
+        except ImportError as e:
+            logging.error(f"Worker could not import '{module_name}': {e}")
+
+
+def execute_in_worker(command, args):
+    """Run a command's execute method inside a pool worker and return the result."""
+    result = command.execute(*args)
+    if inspect.isawaitable(result):
+        result = asyncio.run(result)
+    return result
+
+
+def ping():
+    return True
+
+
+def create_process_pool(max_workers, module_names):
+    """Create a process pool whose workers start with the given modules imported.
+
+    Workers are spawned rather than forked because the parent runs several threads
+    (metrics dumper, command pool) whose locks a fork could copy mid-use.
+    """
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'),
+                               initializer=warm_worker, initargs=(tuple(module_names),))
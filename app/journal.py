@@ -0,0 +1,324 @@
+import os
+import time
+import logging
+import threading
+
+import orjson
+
+from app.commands.metrics import LatencyHistogram
+
+SEGMENT_SUFFIX = '.log'
+CHECKPOINT_FILE = 'checkpoint.json'
+TAIL_READ_SIZE = 1 << 16
+RETRY_DELAY = 0.1  # Seconds before a failed write is retried, doubling up to MAX_RETRY_DELAY
+MAX_RETRY_DELAY = 5.0
+
+
+class JournalError(OSError):
+    """Raised to writers whose records could not be made durable."""
+
+
+def segment_name(first_seq):
+    return f"{first_seq:020d}{SEGMENT_SUFFIX}"
+
+
+class Journal:
+    """Append-only log of orjson-encoded records with group commit.
+
+    Writers append a record and get its sequence number straight away; a single
+    commit thread writes everything pending in one go and fsyncs once, so writers
+    that arrive while a sync is in progress share the next one. Waiting for a
+    sequence number blocks until that record is on disk. A batch that fails to
+    write is cut back off the segment and retried, ahead of anything appended
+    since, so the log never skips a record the caller has applied.
+
+    With write_behind set, writers don't wait: a record is acknowledged once it is
+    queued and the commit thread syncs batches behind them, after commit_delay
+    seconds or as soon as flush_size records are waiting. append() blocks while
+    max_pending records are waiting, so writers can't outrun the disk, and close()
+    syncs whatever is left. A crash loses at most the records not yet synced. While
+    writes fail, records queue up behind the retries until the queue is full; stats()
+    reports the error.
+
+    The log is split into segments. checkpoint() starts a new segment, lets the
+    caller snapshot its state and then deletes the segments the snapshot covers,
+    so a restart only replays the records after the last checkpoint.
+    """
+    def __init__(self, directory, commit_delay=0.0, write_behind=False, flush_size=1000, max_pending=100_000):
+        self.directory = directory
+        self.commit_delay = commit_delay  # Seconds to wait for more writers before syncing
+        self.write_behind = write_behind  # Writers needn't wait() for their records
+        self.flush_size = flush_size  # Records that start a sync without waiting out commit_delay
+        self.max_pending = max_pending  # Records queued before append() blocks
+        os.makedirs(directory, exist_ok=True)
+        self.checkpoint_seq = self.read_checkpoint()
+        segments = self.segments()
+        if not segments:
+            segments = [segment_name(self.checkpoint_seq + 1)]
+        self.next_seq = self.repair_tail(segments[-1]) + 1
+        self.segment = open(os.path.join(directory, segments[-1]), 'ab')
+        self.lock = threading.Condition()
+        self.io_lock = threading.Lock()  # Held while writing to the current segment
+        self.checkpoint_lock = threading.Lock()
+        self.pending = []
+        self.committed_seq = self.next_seq - 1
+        self.error = None  # The last write error, until a batch is written again
+        self.torn = False  # A failed write left a partial line that couldn't be cut off
+        self.closing = False
+        self.closed = False
+        self.batches = 0
+        self.records_committed = 0
+        self.write_errors = 0
+        self.flush_latency = LatencyHistogram()  # Time to write and sync each batch
+        self.max_depth = 0  # Most records ever queued at once
+        self.blocked_appends = 0  # Appends that waited for room in the queue
+        self.thread = threading.Thread(target=self.commit_loop, name='journal-commit', daemon=True)
+        self.thread.start()
+
+    def segments(self):
+        """Return the segment file names, oldest first."""
+        return sorted(name for name in os.listdir(self.directory) if name.endswith(SEGMENT_SUFFIX))
+
+    def read_checkpoint(self):
+        try:
+            with open(os.path.join(self.directory, CHECKPOINT_FILE), 'rb') as f:
+                return orjson.loads(f.read())['seq']
+        except FileNotFoundError:
+            return 0
+
+    def repair_tail(self, name):
+        """Drop a record torn by a crash mid-write and return the last sequence number in the segment."""
+        path = os.path.join(self.directory, name)
+        last_seq = int(name[:-len(SEGMENT_SUFFIX)]) - 1
+        if not os.path.exists(path):
+            return last_seq
+        with open(path, 'rb+') as f:
+            size = f.seek(0, os.SEEK_END)
+            start = max(0, size - TAIL_READ_SIZE)
+            f.seek(start)
+            tail = f.read()
+            end = tail.rfind(b'\n') + 1
+            if end < len(tail):
+                logging.warning(f"Discarding {len(tail) - end} bytes of an incomplete record at the end of '{path}'.")
+                f.truncate(start + end)
+            complete = tail[:end]
+            if start and complete.count(b'\n') < 2:  # The only line found may begin before what was read
+                f.seek(0)
+                complete = f.read(start + end)
+            lines = complete.splitlines()
+            if lines:
+                last_seq = orjson.loads(lines[-1])['seq']
+        return last_seq
+
+    def append(self, record):
+        """Queue a record (a JSON-serializable dict) for the next commit and return its sequence number."""
+        with self.lock:
+            if len(self.pending) >= self.max_pending:  # Backpressure: wait for the commit thread to catch up
+                self.blocked_appends += 1
+                while len(self.pending) >= self.max_pending and not self.closing:
+                    self.lock.wait()
+            if self.closing:
+                raise JournalError("Journal is closed.")
+            seq = self.next_seq
+            self.next_seq += 1
+            record['seq'] = seq
+            self.pending.append(orjson.dumps(record) + b'\n')
+            self.max_depth = max(self.max_depth, len(self.pending))
+            self.lock.notify_all()
+        return seq
+
+    def wait(self, seq):
+        """Block until the record with this sequence number has been synced to disk.
+
+        Failed writes are retried, so this only raises if the journal is closed before the record is written.
+        """
+        with self.lock:
+            while self.committed_seq < seq and not self.closed:
+                self.lock.wait()
+            if self.committed_seq < seq:
+                raise JournalError(f"Journal closed before record {seq} was written: {self.error}")
+
+    def commit_loop(self):
+        retry_delay = 0
+        while True:
+            with self.lock:
+                while not self.pending and not self.closing:
+                    self.lock.wait()
+                if not self.pending or (self.closing and retry_delay):
+                    return  # close() makes the last attempt
+                deadline = time.monotonic() + (retry_delay or self.commit_delay)
+                # Let more writers join this batch, until it is big enough or has waited long enough;
+                # after a failed write, give the disk the whole retry delay.
+                while (retry_delay or len(self.pending) < self.flush_size) and not self.closing:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.lock.wait(remaining)
+            with self.io_lock:
+                written = self.commit_pending()
+            retry_delay = 0 if written else min(max(retry_delay * 2, RETRY_DELAY), MAX_RETRY_DELAY)
+
+    def commit_pending(self):
+        """Write and sync every pending record; returns False if the write failed. Call with io_lock held."""
+        with self.lock:
+            batch, self.pending = self.pending, []
+            last_seq = self.next_seq - 1
+            self.lock.notify_all()  # Writers held back by a full queue can carry on
+        if not batch:
+            return True
+        start = time.perf_counter()
+        size = self.segment.tell()
+        try:
+            # A partial line left by an earlier failure is ended first, so it can't swallow the next record.
+            self.segment.write((b'\n' if self.torn else b'') + b''.join(batch))
+            self.segment.flush()
+            os.fsync(self.segment.fileno())
+        except OSError as e:
+            logging.error(f"Journal write to '{self.segment.name}' failed; retrying {len(batch)} records: {e}")
+            self.reopen_segment(size)
+            with self.lock:
+                self.pending = batch + self.pending  # Retried first, so the log stays in sequence order
+                self.error = e
+                self.write_errors += 1
+                self.lock.notify_all()
+            return False
+        with self.lock:
+            self.flush_latency.record(time.perf_counter() - start)
+            self.committed_seq = last_seq
+            self.batches += 1
+            self.records_committed += len(batch)
+            self.error = None
+            self.torn = False
+            self.lock.notify_all()
+        return True
+
+    def reopen_segment(self, size):
+        """Cut what a failed write left after `size` bytes off the current segment and reopen it."""
+        path = self.segment.name
+        try:
+            self.segment.close()
+        except OSError:
+            pass  # Bytes still buffered couldn't be written either; the file is closed regardless
+        try:
+            os.truncate(path, size)
+        except OSError as e:
+            logging.error(f"Could not cut the failed write off '{path}': {e}")
+            self.torn = True
+        self.segment = open(path, 'ab')
+
+    def records(self, after_seq=None):
+        """Yield the records after a sequence number, by default those after the last checkpoint."""
+        last_seq = self.checkpoint_seq if after_seq is None else after_seq
+        first = True
+        for name in self.segments():
+            path = os.path.join(self.directory, name)
+            with open(path, 'rb') as f:
+                for number, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        record = orjson.loads(line)
+                    except orjson.JSONDecodeError:  # Left by a write that failed and couldn't be cut off
+                        logging.warning(f"Skipping an unreadable record on line {number} of '{path}'.")
+                        continue
+                    if record['seq'] <= last_seq:  # Before the range, or written again by a retry
+                        continue
+                    if record['seq'] > last_seq + 1 and not first:
+                        logging.warning(f"Journal records {last_seq + 1} to {record['seq'] - 1} are missing.")
+                    last_seq = record['seq']
+                    first = False
+                    yield record
+
+    def checkpoint(self, snapshot):
+        """Start a new segment, call snapshot(), then forget the records it covers.
+
+        snapshot() must persist the effect of every record appended before it was called.
+        """
+        with self.checkpoint_lock:
+            return self.write_checkpoint(snapshot)
+
+    def write_checkpoint(self, snapshot):
+        with self.io_lock:
+            if not self.commit_pending():
+                raise JournalError(f"Journal write failed: {self.error}")
+            with self.lock:
+                seq = self.next_seq - 1
+                self.segment.close()
+                self.segment = open(os.path.join(self.directory, segment_name(seq + 1)), 'ab')
+                self.torn = False
+        snapshot()
+        tmp_path = os.path.join(self.directory, f"{CHECKPOINT_FILE}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(orjson.dumps({'seq': seq, 'created_at': time.time()}))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self.directory, CHECKPOINT_FILE))
+        self.checkpoint_seq = seq
+        for name in self.segments()[:-1]:  # Everything before the segment opened above
+            os.remove(os.path.join(self.directory, name))
+        logging.info(f"Journal checkpoint at record {seq}.")
+        return seq
+
+    def stats(self):
+        with self.lock:
+            return {'records': self.records_committed, 'batches': self.batches,
+                    'committed_seq': self.committed_seq, 'checkpoint_seq': self.checkpoint_seq,
+                    'write_errors': self.write_errors, 'last_error': None if self.error is None else str(self.error),
+                    'queue_depth': len(self.pending), 'max_queue_depth': self.max_depth,
+                    'blocked_appends': self.blocked_appends,
+                    'flush_p50_ms': self.flush_latency.percentile(50) * 1000,
+                    'flush_p99_ms': self.flush_latency.percentile(99) * 1000,
+                    'flush_max_ms': self.flush_latency.max_value / 1000}
+
+    def close(self):
+        """Commit what is pending and stop the commit thread."""
+        with self.lock:
+            self.closing = True
+            self.lock.notify_all()
+        self.thread.join()
+        with self.io_lock:
+            self.commit_pending()
+            self.segment.close()
+        with self.lock:
+            self.closed = True  # Waiters for records still unwritten give up
+            self.lock.notify_all()
+
+
+class Checkpointer:
+    """Background thread that checkpoints a journal so restarts only replay a bounded tail.
+
+    A checkpoint is taken once `max_records` records have been written since the last
+    one, or `interval` seconds after it if anything was written at all.
+    """
+    def __init__(self, journal, snapshot, interval=300.0, max_records=100_000, poll_interval=1.0):
+        self.journal = journal
+        self.snapshot = snapshot
+        self.interval = interval
+        self.max_records = max_records
+        self.poll_interval = min(poll_interval, interval)
+        self.last_checkpoint = time.monotonic()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='journal-checkpoint', daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def due(self):
+        tail = self.journal.committed_seq - self.journal.checkpoint_seq
+        return tail >= self.max_records or (tail > 0 and time.monotonic() - self.last_checkpoint >= self.interval)
+
+    def run(self):
+        while not self.stopped.wait(self.poll_interval):
+            if not self.due():
+                continue
+            try:
+                self.journal.checkpoint(self.snapshot)
+            except OSError as e:
+                logging.warning(f"Journal checkpoint failed: {e}")
+            self.last_checkpoint = time.monotonic()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread.is_alive():
+            self.thread.join()
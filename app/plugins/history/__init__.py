@@ -1,47 +1,461 @@
 import os
+import pickle
 import logging
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta
+import numpy as np
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from app import Command
+from app.plugins.history.aggregates import AGGREGATES, register_aggregate  # register_aggregate is for other plugins
+from app.plugins.history.binary import map_sessions, write_sessions
+from app.plugins.history.columns import SessionColumns, to_epoch_us
+from app.plugins.history.exercises import ExerciseIndex, notify_records, top_in_chunks, top_in_columns
+from app.plugins.history.exercises import register_record_listener  # For other plugins
+from app.plugins.history.exporter import export_sessions
+from app.plugins.history.importer import CHUNK_SIZE, import_sessions
+from app.plugins.history.records import EXERCISE_FIELD, WorkoutSession, now_epoch_us
+from app.plugins.history.tiers import TieredSessions, cold_directory
+from app.plugins.history.timeline import EPOCH_DATE, Timeline, day_of, midnight
+from app.plugins.history.training import daily_matrix, training_loads
 
 class FitnessHistory(Command):
     """Command for interacting with a user's workout history."""
+    examples = (
+        "show my workout history",
+        "summarize my past workouts",
+        "how many calories have I burned",
+        "how much time have I spent training",
+        "what was my last workout session",
+    )
+    triggers = ("history", "past workouts")
+    idempotent = True  # 'summary', 'last' and 'stats' only read the history; see is_cacheable
+    per_user = True  # Every user gets their own instance through the app's SessionManager
 
-    def __init__(self, user_id=None):
+    def __init__(self, user_id=None, database_url=None):
         # Call the superclass constructor with the name and description
         super().__init__("fitness_history", "Interact with your fitness history to track your progress.")
-        self.history = []  # List to store the workout sessions
+        database_url = database_url or os.environ.get('HISTORY_DATABASE_URL')
+        if database_url:  # e.g. sqlite:///cache/history.db
+            from app.plugins.history.sql import SQLSessions
+            self.history = SQLSessions(database_url, user_id)
+        else:
+            self.history = SessionColumns()  # The workout sessions, stored column by column
+        self.aggregates = {}  # name -> running aggregate, created by current_aggregates() and updated on every add
+        self.timeline = None  # Time index and calendar rollups, created by current_timeline() and updated on every add
+        self.exercises = None  # Sessions and personal records by exercise, created by current_exercises()
         self.user_id = user_id  # Assuming each user has a unique ID
+        self.journal = None  # Set by the app so added sessions survive a restart; see app.journal
+        self.journal_seq = 0  # Last journal record reflected in this history
+        self.lock = threading.Lock()
+
+    def add_workout_session(self, session_data, timestamp=None):
+        """Add a workout session (a dict or WorkoutSession) to the history, timestamped now unless a timestamp is given."""
+        if isinstance(session_data, WorkoutSession):
+            session = session_data
+            session.timestamp = now_epoch_us() if timestamp is None else to_epoch_us(timestamp)
+        else:  # Epoch microseconds rather than an ISO string; it reads back as one
+            session = WorkoutSession.from_dict(session_data, now_epoch_us() if timestamp is None else timestamp)
+        seq = None
+        with self.lock:
+            if self.journal is not None and not self.history.durable:  # A database commits the session itself
+                record = {'command': type(self).__name__, 'user': self.user_id, 'session': session.to_dict()}
+                seq = self.journal_seq = self.journal.append(record)
+            records = self.record_session(session)
+        if seq is not None and not self.journal.write_behind:  # Write-behind: synced later, in a batch
+            self.journal.wait(seq)  # Returns once the record is synced; concurrent adds share the sync
+        logging.info(f"User {self.user_id}: Added workout session to history: {session.to_dict()}")
+        for record in records:
+            logging.info(f"User {self.user_id}: New personal record: {record['exercise']} {record['field']} "
+                         f"{record['value']} (was {record['previous']}).")
+        notify_records(self.user_id, records)
+
+    def add_workout_sessions(self, sessions):
+        """Add a batch of timestamped sessions, as dicts or SessionColumns, journaled together and logged once."""
+        seq = None
+        with self.lock:
+            if self.journal is not None and not self.history.durable:
+                record = {'command': type(self).__name__, 'user': self.user_id}
+                if isinstance(sessions, SessionColumns):  # Journaled column by column, like it is stored
+                    record['length'] = len(sessions)
+                    record['fields'] = {name: (rows.tolist(), values.tolist() if isinstance(values, np.ndarray) else values)
+                                        for name, (rows, values) in sessions.fields().items()}
+                else:
+                    record['sessions'] = sessions
+                seq = self.journal_seq = self.journal.append(record)
+            self.record_sessions(sessions)
+        if seq is not None and not self.journal.write_behind:
+            self.journal.wait(seq)
+
+    def import_sessions(self, path, chunk_size=CHUNK_SIZE, progress=None, errors_path=None):
+        """Import the sessions in a CSV or JSONL file (optionally gzipped), streaming it a chunk at a time.
+
+        Returns a report of the rows read, imported and rejected, with the first rejected rows'
+        line numbers and errors; see app.plugins.history.importer.
+        """
+        report = import_sessions(path, self.add_workout_sessions, chunk_size, progress, errors_path)
+        logging.info(f"User {self.user_id}: Imported {report['imported']} of {report['rows']} rows from '{path}' "
+                     f"in {report['seconds']:.1f}s; {report['rejected']} rejected.")
+        return report
+
+    def export_sessions(self, path, since=None, until=None, **fields):
+        """Write the sessions in [since, until) matching fields to a CSV or JSONL file, gzipped if it ends in .gz.
+
+        Streams from the store a chunk at a time, taking the lock only while a chunk is
+        read, so sessions can be added during a long export; those past the point the
+        export has reached may or may not be included. Returns a report of what was written.
+        """
+        chunks = self.history.chunks(since, until, **fields)
+
+        def locked_chunks():
+            while True:
+                with self.lock:
+                    chunk = next(chunks, None)
+                if chunk is None:
+                    return
+                yield chunk
+
+        report = export_sessions(path, locked_chunks(), self.history.field_names)
+        logging.info(f"User {self.user_id}: Exported {report['sessions']} sessions to '{path}' "
+                     f"in {report['seconds']:.1f}s.")
+        return report
+
+    def record_session(self, session_data):
+        """Store a session and update everything kept from it; returns the personal records it set."""
+        aggregates = self.current_aggregates()  # Caught up before the session is stored, so it counts once
+        timeline = self.current_timeline()
+        exercises = self.current_exercises()
+        self.history.append(session_data)  # Copied into the columns; later changes to the dict aren't seen
+        for aggregate in aggregates.values():
+            aggregate.add(session_data)
+        timeline.add(session_data)
+        records = exercises.add(session_data)
+        self.invalidate_cache()
+        return records
 
-    def add_workout_session(self, session_data):
-        """Add a workout session to the history."""
-        session_data['timestamp'] = datetime.now().isoformat()  # Automatically add the current timestamp
-        self.history.append(session_data)
-        logging.info(f"User {self.user_id}: Added workout session to history: {session_data}")
-        # Here you might also want to persist this data to a database or file
+    def record_sessions(self, sessions):
+        """Store a batch of sessions with one column fill and one aggregate update per aggregate."""
+        aggregates = self.current_aggregates()
+        timeline = self.current_timeline()
+        exercises = self.current_exercises()
+        columns = isinstance(self.history, SessionColumns)
+        first_row = len(self.history) if columns else None
+        self.history.extend(sessions)
+        for aggregate in aggregates.values():
+            add_many = getattr(aggregate, 'add_many', None)
+            if add_many is not None:
+                add_many(sessions)
+            else:
+                for session in sessions:
+                    aggregate.add(session)
+        if columns:  # Index the timestamps and exercises the columns have just parsed
+            timeline.add_stored(self.history, first_row)
+            exercises.add_stored(self.history, first_row)
+        else:
+            timeline.add_many(sessions)
+            exercises.add_many(sessions)
+        self.invalidate_cache()
+
+    def replay(self, records):
+        """Apply journal records from before a restart, skipping those this history already reflects."""
+        with self.lock:
+            sessions = []
+            for record in records:
+                if record['seq'] <= self.journal_seq:
+                    continue
+                if 'fields' in record:  # A batch from add_workout_sessions(), e.g. a chunk of an import
+                    if sessions:
+                        self.record_sessions(sessions)
+                        sessions = []
+                    self.record_sessions(SessionColumns.from_fields(record['length'], record['fields']))
+                else:
+                    sessions.extend(record['sessions'] if 'sessions' in record else [record['session']])
+            if sessions:
+                self.record_sessions(sessions)
+            if records and records[-1]['seq'] > self.journal_seq:
+                self.journal_seq = records[-1]['seq']
 
     def get_last_session(self):
         """Get the last workout session if available."""
-        return self.history[-1] if self.history else None
+        with self.lock:
+            return self.history[-1] if self.history else None
+
+    def current_aggregates(self):
+        """Return the running aggregates, first catching up on any registered since this history was created."""
+        aggregates = self.__dict__.setdefault('aggregates', {})  # Histories pickled before aggregates existed
+        for name in AGGREGATES.keys() - aggregates.keys():
+            aggregate = AGGREGATES[name]()
+            add_stored = getattr(aggregate, 'add_stored', None)
+            if add_stored is None or not add_stored(self.history):
+                for session in self.history:
+                    aggregate.add(session)
+            aggregates[name] = aggregate
+        return aggregates
+
+    def current_timeline(self):
+        """Return the time index and calendar rollups, building them from the stored sessions the first time."""
+        timeline = self.__dict__.get('timeline')  # Histories pickled before the timeline existed
+        if timeline is None:
+            timeline = Timeline()
+            timeline.add_stored(self.history)
+            self.timeline = timeline
+        return timeline
+
+    def current_exercises(self):
+        """Return the index by exercise, building it from the stored sessions the first time."""
+        exercises = self.__dict__.get('exercises')  # Histories pickled before the index existed
+        if exercises is None:
+            exercises = ExerciseIndex()
+            exercises.add_stored(self.history)
+            self.exercises = exercises
+        return exercises
+
+    def summarize_history(self, since=None, until=None, **fields):
+        """Create a summary of the workout history, optionally of sessions in [since, until) matching fields."""
+        with self.lock:
+            if fields:  # Summed by the store: whole columns, or an SQL aggregate
+                total_workouts, (total_time, total_calories) = self.history.totals(
+                    ('duration', 'calories_burned'), since, until, **fields)
+            elif since or until:  # Whole days and months come from the rollups
+                total_workouts, total_time, total_calories = self.current_timeline().totals(
+                    since, until, getattr(self.history, 'cold_totals', None))  # Partial days in the cold tier
+            else:  # Kept up to date by add_workout_session, so this doesn't depend on the history's size
+                aggregates = self.current_aggregates()
+                total_time = aggregates['duration'].total
+                total_workouts = aggregates['sessions'].value()
+                total_calories = aggregates['calories_burned'].total
+
+            summary = {
+                "total_sessions": total_workouts,
+                "total_time_spent": total_time,
+                "total_calories_burned": total_calories
+            }
+            return summary
+
+    def summarize_periods(self, period='week', since=None, until=None):
+        """Summarize each day, week or month that has sessions, optionally only those within [since, until)."""
+        with self.lock:
+            return [{"period": start.isoformat(), "total_sessions": sessions, "total_time_spent": total_time,
+                     "total_calories_burned": total_calories}
+                    for start, (sessions, total_time, total_calories) in self.current_timeline().periods(period, since, until)]
+
+    def sessions_between(self, since=None, until=None):
+        """Return the sessions in [since, until), oldest first."""
+        with self.lock:
+            between = getattr(self.history, 'between', None)
+            if between is not None:  # The store has its own time index, e.g. SQLite's
+                return between(since, until)
+            return [self.history.row(row) for row in self.current_timeline().rows_between(since, until).tolist()]
+
+    def personal_records(self, exercise=None):
+        """Return the best value of every numeric field per exercise, with when it was set, or those of one exercise."""
+        with self.lock:
+            return self.current_exercises().personal_records(exercise)
+
+    def records_set(self, since=None, until=None, exercise=None):
+        """Return the personal records set by sessions in [since, until), e.g. this month's, in the order set."""
+        with self.lock:
+            return self.current_exercises().records_set(since, until, exercise)
+
+    def top_sessions(self, exercise, field='duration', k=5):
+        """Return the k sessions of an exercise with the highest value of a field, best first.
+
+        Up to TOP_K come straight from the index; more are found among the exercise's sessions.
+        """
+        with self.lock:
+            exercises = self.current_exercises()
+            top = exercises.top(exercise, field, k)
+            if top is None:  # More than the index keeps: look through the exercise's sessions
+                if isinstance(self.history, SessionColumns):  # The index has their rows
+                    top = top_in_columns(self.history, exercises.rows(exercise), field, k)
+                else:
+                    top = top_in_chunks(self.history.chunks(**{EXERCISE_FIELD: exercise}), field, k)
+            return top
+
+    def training_load(self, since=None, until=None):
+        """Return the load, ATL, CTL and TSB of every day from since, or the first session, to until or the last.
+
+        Backfilled over the whole history with NumPy; see app.plugins.history.training.
+        """
+        with self.lock:  # daily() copies the loads out of the rollups, so the backfill runs without it
+            first_day, loads = self.current_timeline().daily()
+        if not len(loads):
+            return []
+        last_day = first_day + len(loads)
+        if until is not None:
+            last_day, at_midnight = day_of(until)
+            last_day += 0 if at_midnight else 1
+        start = first_day if since is None else max(first_day, day_of(since)[0])
+        loads = daily_matrix([(first_day, loads)], first_day, last_day)[0]
+        atl, ctl, tsb = training_loads(loads)
+        return [{'date': (EPOCH_DATE + timedelta(days=day)).isoformat(), 'load': load, 'atl': day_atl, 'ctl': day_ctl,
+                 'tsb': day_tsb}
+                for day, load, day_atl, day_ctl, day_tsb in zip(range(start, last_day), *(
+                    values[start - first_day:].tolist() for values in (loads, atl, ctl, tsb)))]
+
+    def current_training_load(self, when=None):
+        """Return today's (or when's) ATL, CTL and TSB from the running values kept as sessions are added."""
+        with self.lock:
+            timeline = self.current_timeline()
+            day = day_of(datetime.now() if when is None else when)[0]
+            if timeline.load.day is None or day >= timeline.load.day:
+                atl, ctl, tsb = timeline.load.value(day)
+            else:  # Later sessions are in the running values already: backfill up to the day instead
+                first_day, loads = timeline.daily()
+                atl, ctl, tsb = ((values[-1].item() for values in training_loads(loads[:day - first_day + 1]))
+                                 if day >= first_day else (0.0, 0.0, 0.0))
+            return {'date': (EPOCH_DATE + timedelta(days=day)).isoformat(), 'atl': atl, 'ctl': ctl, 'tsb': tsb}
+
+    @staticmethod
+    def backfill_training_loads(histories, since=None, until=None):
+        """Work out the daily load, ATL, CTL and TSB of many histories in one go, e.g. every user's in a batch job.
+
+        Returns {'dates': [...], 'load': ..., 'atl': ..., 'ctl': ..., 'tsb': ...}, each a
+        (histories x days) array over the days from since, or the first session of any,
+        to until or the last.
+        """
+        dailies = []
+        for history in histories:
+            with history.lock:
+                dailies.append(history.current_timeline().daily())
+        spans = [(first_day, first_day + len(loads)) for first_day, loads in dailies if len(loads)]
+        first_day = min((span[0] for span in spans), default=0)
+        last_day = max((span[1] for span in spans), default=0)
+        if until is not None:
+            last_day, at_midnight = day_of(until)
+            last_day += 0 if at_midnight else 1
+        start = first_day if since is None else max(first_day, day_of(since)[0])
+        loads = daily_matrix(dailies, first_day, last_day)
+        series = dict(zip(('atl', 'ctl', 'tsb'), training_loads(loads)), load=loads)
+        series = {name: values[:, start - first_day:] for name, values in series.items()}
+        series['dates'] = [(EPOCH_DATE + timedelta(days=day)).isoformat() for day in range(start, last_day)]
+        return series
+
+    def compact(self, before=None):
+        """Move sessions from before the hot window, or before a time, to cold segment files; returns how many moved.
+
+        The hot window is HISTORY_HOT_DAYS days back, from the start of that month, so
+        a compaction moves about a month of sessions at a time; unset or 0 keeps every
+        session in memory. Summaries stay exact: the running aggregates and rollups
+        cover both tiers, and cold sessions are paged in from disk only for partial
+        days and filtered or raw reads.
+        """
+        if before is None:
+            hot_days = int(os.environ.get('HISTORY_HOT_DAYS', 0))
+            if not hot_days:
+                return 0
+            before = (datetime.now() - timedelta(days=hot_days)).replace(day=1)
+        before = midnight(day_of(before)[0])  # Cold segments hold whole days
+        with self.lock:
+            if self.history.durable:  # A database keeps its sessions on disk already
+                return 0
+            self.current_aggregates()  # Caught up while every session is still in memory
+            timeline = self.current_timeline()
+            exercises = self.current_exercises()
+            store = self.history
+            if not isinstance(store, TieredSessions):
+                root = os.environ.get('HISTORY_COLD_DIR', os.path.join(os.environ.get('CACHE_DIR', 'cache'), 'history'))
+                store = TieredSessions(cold_directory(root, self.user_id), self.history)
+            moved = store.compact(before)
+            if moved:
+                self.history = store
+                exercises.drop_rows(timeline.compact(before))
+                self.invalidate_cache()
+        if moved:
+            logging.info(f"User {self.user_id}: Moved {moved} workout sessions to cold storage; "
+                         f"{len(store.hot)} remain in memory.")
+        return moved
+
+    def storage_tiers(self):
+        """Return how many sessions are in memory and how many in cold segments on disk."""
+        with self.lock:
+            if not isinstance(self.history, TieredSessions):
+                return {'hot_sessions': len(self.history), 'cold_sessions': 0, 'segments': 0}
+            return {'hot_sessions': len(self.history.hot), 'cold_sessions': self.history.cold_length(),
+                    'segments': len(self.history.segments)}
+
+    def statistics(self):
+        """Return the value of every running aggregate, including those registered by other plugins."""
+        with self.lock:
+            return {name: aggregate.value() for name, aggregate in self.current_aggregates().items()}
+
+    def save_sessions(self, path):
+        """Write the sessions to a binary session file that load_sessions() maps back in without parsing it."""
+        with self.lock:
+            write_sessions(self.history, path)
+
+    @classmethod
+    def load_sessions(cls, path, user_id=None):
+        """Return a history over the sessions in a binary session file, which stays on disk until changed."""
+        history = cls(user_id=user_id)
+        history.history = map_sessions(path)
+        return history
+
+    def memory_size(self):
+        """Approximate bytes held by the history, used to budget sessions kept in memory."""
+        size = self.history.memory_size()
+        for index in (self.__dict__.get('timeline'), self.__dict__.get('exercises')):  # Only once built
+            if index is not None:
+                size += index.nbytes()
+        return size
+
+    def __getstate__(self):
+        # The sessions are serialized while holding the lock so a concurrent add can't tear the snapshot.
+        with self.lock:
+            state = dict(self.__dict__)
+            state['history'] = pickle.dumps(self.history, protocol=pickle.HIGHEST_PROTOCOL)
+            if self.history.durable:  # The database may get sessions after this snapshot; see catch_up_stored
+                state['stored'] = self.history.watermark()
+            state['aggregates'] = pickle.dumps(self.current_aggregates(), protocol=pickle.HIGHEST_PROTOCOL)
+            state['timeline'] = pickle.dumps(self.current_timeline(), protocol=pickle.HIGHEST_PROTOCOL)
+            state['exercises'] = pickle.dumps(self.current_exercises(), protocol=pickle.HIGHEST_PROTOCOL)
+        del state['lock']
+        state['journal'] = None
+        return state
+
+    def __setstate__(self, state):
+        for name in ('history', 'aggregates', 'timeline', 'exercises'):
+            if isinstance(state.get(name), bytes):
+                state[name] = pickle.loads(state[name])
+        state.setdefault('journal', None)
+        state.setdefault('journal_seq', 0)
+        stored = state.pop('stored', None)
+        if state['history'].durable and stored is None:  # Pickled without its aggregates; rebuilt from the database
+            state['aggregates'], state['timeline'], state['exercises'] = {}, None, None
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+        if stored is not None:
+            self.catch_up_stored(stored)
+
+    def catch_up_stored(self, stored):
+        """Bring the aggregates and indexes pickled with a database-backed history up to date with the database.
 
-    def summarize_history(self):
-        """Create a summary of the workout history."""
-        total_time = sum(session['duration'] for session in self.history)
-        total_workouts = len(self.history)
-        total_calories = sum(session['calories_burned'] for session in self.history)
+        stored is the database's watermark() when they were pickled. Sessions added since
+        are read by row id and applied; if any were removed instead, everything is rebuilt
+        from the database on first use, as for a history that was never pickled.
+        """
+        count, last_id = self.history.watermark()
+        if (count, last_id) == tuple(stored):
+            return
+        added = self.history.added_after(stored[1]) if last_id >= stored[1] else []
+        if stored[0] + len(added) != count:
+            self.aggregates, self.timeline, self.exercises = {}, None, None
+            return
+        for session in added:
+            for aggregate in self.aggregates.values():
+                aggregate.add(session)
+            self.timeline.add(session)
+            self.exercises.add(session)
 
-        summary = {
-            "total_sessions": total_workouts,
-            "total_time_spent": total_time,
-            "total_calories_burned": total_calories
-        }
-        return summary
+    def is_cacheable(self, *args):
+        """Only the read-only operations may be served from the result cache."""
+        return (args[0] if args else 'summary') in ('summary', 'last', 'stats', 'periods', 'records', 'top')
 
     def execute(self, *args, **kwargs):
         """Execute the fitness history command."""
-        user_input = kwargs.get('user_input', 'summary')  # Default to showing summary
+        # The operation comes from the REPL as the first argument, or as a keyword when called directly
+        user_input = args[0] if args else kwargs.get('user_input', 'summary')  # Default to showing summary
 
         if user_input == 'add':
             session_data = kwargs.get('session_data')
@@ -49,10 +463,51 @@ class FitnessHistory(Command):
                 self.add_workout_session(session_data)
             else:
                 logging.error("No session data provided for 'add' operation.")
+        elif user_input == 'import':  # e.g. 'fitness_history import workouts.csv'
+            path = args[1] if len(args) > 1 else kwargs.get('path')
+            if path:
+                return self.import_sessions(path, errors_path=kwargs.get('errors_path'))
+            logging.error("No file provided for 'import' operation.")
+        elif user_input == 'export':  # e.g. 'fitness_history export workouts.jsonl.gz 2024-01-01'
+            path = args[1] if len(args) > 1 else kwargs.get('path')
+            if path:
+                return self.export_sessions(path, args[2] if len(args) > 2 else kwargs.get('since'),
+                                            args[3] if len(args) > 3 else kwargs.get('until'),
+                                            **kwargs.get('fields', {}))
+            logging.error("No file provided for 'export' operation.")
         elif user_input == 'last':
             return self.get_last_session()
         elif user_input == 'summary':
             return self.summarize_history()
+        elif user_input == 'stats':
+            return self.statistics()
+        elif user_input == 'periods':  # e.g. 'fitness_history periods month'
+            return self.summarize_periods(args[1] if len(args) > 1 else kwargs.get('period', 'week'))
+        elif user_input == 'records':  # e.g. 'fitness_history records run'
+            return self.personal_records(args[1] if len(args) > 1 else kwargs.get('exercise'))
+        elif user_input == 'top':  # e.g. 'fitness_history top run duration 5'
+            exercise = args[1] if len(args) > 1 else kwargs.get('exercise')
+            if exercise:
+                return self.top_sessions(exercise, args[2] if len(args) > 2 else kwargs.get('field', 'duration'),
+                                         int(args[3] if len(args) > 3 else kwargs.get('k', 5)))
+            logging.error("No exercise provided for 'top' operation.")
+        elif user_input == 'prs':  # e.g. 'fitness_history prs 30' for the records set in the last 30 days
+            days = int(args[1] if len(args) > 1 else kwargs.get('days', 30))
+            return self.records_set(since=datetime.now() - timedelta(days=days))
+        elif user_input == 'load':  # e.g. 'fitness_history load 42' for each of the last 42 days
+            days = int(args[1] if len(args) > 1 else kwargs.get('days', 42))
+            today = datetime.combine(datetime.now(), datetime.min.time())
+            return self.training_load(since=today - timedelta(days=days - 1), until=today + timedelta(days=1))
+        elif user_input == 'form':
+            return self.current_training_load()
+        elif user_input == 'compact':  # e.g. 'fitness_history compact 2024-01-01' to move older sessions to disk
+            before = args[1] if len(args) > 1 else kwargs.get('before')
+            return {'moved': self.compact(before), **self.storage_tiers()}
+        elif user_input == 'tiers':
+            return self.storage_tiers()
+        elif user_input == 'recent':  # e.g. 'fitness_history recent 30' for the last 30 days
+            days = int(args[1] if len(args) > 1 else kwargs.get('days', 30))
+            return self.summarize_history(since=datetime.now() - timedelta(days=days))
         else:
             logging.error(f"Invalid user input for fitness history: {user_input}")
 
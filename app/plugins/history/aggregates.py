@@ -0,0 +1,116 @@
+import math
+
+import numpy as np
+
+from app.plugins.history.columns import SessionColumns
+
+# name -> callable returning a new aggregate; every FitnessHistory maintains one of each.
+AGGREGATES = {}
+
+
+def register_aggregate(name, factory):
+    """Have every workout history maintain an extra running aggregate.
+
+    factory() must return an object with add(session), called once per added session
+    dict, and value(), which should not depend on the number of sessions seen. It may
+    also define add_many(sessions) to take a batch, e.g. a bulk import, at once, and
+    add_stored(history) to catch up from a history's store in bulk, returning False
+    if it can't. Histories that already exist catch up from their stored sessions the
+    first time they are asked for their statistics.
+    """
+    AGGREGATES[name] = factory
+    return factory
+
+
+class Count:
+    """Number of sessions."""
+    def __init__(self):
+        self.count = 0
+
+    def add(self, session):
+        self.count += 1
+
+    def add_many(self, sessions):
+        self.count += len(sessions)
+
+    def add_stored(self, history):
+        self.count += len(history)
+        return True
+
+    def value(self):
+        return self.count
+
+
+class FieldStats:
+    """Count, sum, min, max, mean and variance of a numeric field, using Welford's update."""
+    def __init__(self, field):
+        self.field = field
+        self.count = 0
+        self.total = 0
+        self.minimum = None
+        self.maximum = None
+        self.mean = 0.0
+        self.m2 = 0.0  # Sum of squared distances from the mean
+
+    def add(self, session):
+        value = session.get(self.field)
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or math.isnan(value):
+            return
+        self.count += 1
+        self.total += value
+        self.minimum = value if self.minimum is None else min(self.minimum, value)
+        self.maximum = value if self.maximum is None else max(self.maximum, value)
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def add_many(self, sessions):
+        """Fold in a batch, merging its mean and variance with Chan et al.'s pairwise update."""
+        stats = sessions.field_stats(self.field) if isinstance(sessions, SessionColumns) else None
+        if stats is None or stats['mean'] != stats['mean']:  # Not a numeric column, or one holding NaN
+            values = [value for value in (session.get(self.field) for session in sessions)
+                      if not isinstance(value, bool) and isinstance(value, (int, float)) and not math.isnan(value)]
+            if not values:
+                return
+            batch = np.array(values, dtype=np.float64)
+            mean = float(batch.mean())
+            stats = {'count': len(values), 'sum': sum(values), 'min': min(values), 'max': max(values), 'mean': mean,
+                     'm2': float(((batch - mean) ** 2).sum())}
+        self.merge(stats)
+
+    def merge(self, stats):
+        """Fold in the count, sum, min, max, mean and m2 of other values, as field_stats() returns them."""
+        if not stats['count']:
+            return
+        count = self.count + stats['count']
+        delta = stats['mean'] - self.mean
+        self.m2 += stats['m2'] + delta * delta * self.count * stats['count'] / count
+        self.mean += delta * stats['count'] / count
+        self.count = count
+        self.total += stats['sum']
+        self.minimum = stats['min'] if self.minimum is None else min(self.minimum, stats['min'])
+        self.maximum = stats['max'] if self.maximum is None else max(self.maximum, stats['max'])
+
+    def add_stored(self, history):
+        """Start from a store's own statistics of the field, e.g. computed in SQL. Call on a new aggregate."""
+        stats = history.field_stats(self.field)
+        if stats is None:
+            return False
+        self.count, self.total, self.mean, self.m2 = stats['count'], stats['sum'], stats['mean'], stats['m2']
+        self.minimum, self.maximum = stats['min'], stats['max']
+        return True
+
+    def value(self):
+        return {
+            'count': self.count,
+            'sum': self.total,
+            'min': self.minimum,
+            'max': self.maximum,
+            'mean': self.mean if self.count else None,
+            'variance': self.m2 / self.count if self.count else None,  # Population variance
+        }
+
+
+register_aggregate('sessions', Count)
+register_aggregate('duration', lambda: FieldStats('duration'))
+register_aggregate('calories_burned', lambda: FieldStats('calories_burned'))
@@ -0,0 +1,167 @@
+import os
+import mmap
+import struct
+
+import numpy as np
+import orjson
+
+from app.plugins.history.columns import (CategoricalColumn, NumericColumn, ObjectColumn, SessionColumns,
+                                         TimestampColumn)
+
+# File layout, little-endian:
+#   header        HEADER, then one FIELD descriptor per field
+#   records       record_count fixed-width records starting at records_offset (8-byte aligned):
+#                 each field's value, then one presence byte per field, padded to 8 bytes
+#   string table  string_count entries of uint32 byte length + UTF-8 bytes: field names,
+#                 categories of string fields, and JSON of values no fixed-width type holds
+MAGIC = b'FITHIST\0'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<8sHHIQQQQ')  # magic, version, field count, record size, record count,
+                                      # records offset, string table offset, string count
+FIELD = struct.Struct('<IcxxxIIII')  # name string, kind, value offset, presence offset,
+                                     # first category string, category count
+LENGTH = struct.Struct('<I')
+KINDS = {b'i': np.dtype('<i8'), b'f': np.dtype('<f8'), b't': np.dtype('<i8'), b's': np.dtype('<i4'),
+         b'j': np.dtype('<i4')}  # int, float, timestamp, category code, JSON value string
+
+
+class BinaryFormatError(ValueError):
+    """Raised for files that aren't session files of a version this code reads."""
+
+
+def aligned(offset, alignment=8):
+    return -(-offset // alignment) * alignment
+
+
+def record_dtype(fields):
+    """Lay out a record from (kind, value_offset, present_offset) per field."""
+    names, formats, offsets = [], [], []
+    for i, (kind, value_offset, present_offset) in enumerate(fields):
+        names += [f'v{i}', f'p{i}']
+        formats += [KINDS[kind], np.uint8]
+        offsets += [value_offset, present_offset]
+    end = max((offset + np.dtype(form).itemsize for offset, form in zip(offsets, formats)), default=0)
+    return np.dtype({'names': names, 'formats': formats, 'offsets': offsets, 'itemsize': aligned(end)})
+
+
+def layout(kinds):
+    """Place 8-byte values first, then 4-byte ones, then the presence bytes, so every value is aligned."""
+    value_offsets = {}
+    offset = 0
+    for i in sorted(range(len(kinds)), key=lambda i: -KINDS[kinds[i]].itemsize):
+        value_offsets[i] = offset
+        offset += KINDS[kinds[i]].itemsize
+    return [(kind, value_offsets[i], offset + i) for i, kind in enumerate(kinds)]
+
+
+def write_sessions(store, path):
+    """Write the sessions of a store to a binary session file, replacing it atomically."""
+    if not isinstance(store, SessionColumns):  # e.g. SQLSessions
+        columns = SessionColumns()
+        columns.extend(store)
+        store = columns
+    count = len(store)
+    strings = []
+    kinds, arrays, names, categories = [], [], [], []
+    for name, column in store.columns.items():
+        names.append(len(strings))
+        strings.append(name)
+        present = column.present[:count]
+        if isinstance(column, TimestampColumn):
+            kind, values = b't', column.values[:count]
+        elif isinstance(column, NumericColumn):
+            kind, values = (b'f' if column.values.dtype.kind == 'f' else b'i'), column.values[:count]
+        elif isinstance(column, CategoricalColumn):
+            kind, values = b's', column.codes[:count]
+            categories.append((len(strings), len(column.categories)))
+            strings.extend(column.categories)
+        else:
+            kind, values = b'j', np.full(count, -1, dtype=np.int32)
+            for row in np.flatnonzero(present):
+                values[row] = len(strings)
+                try:
+                    strings.append(orjson.dumps(column.values[row]).decode())
+                except TypeError as e:
+                    raise BinaryFormatError(f"Field '{name}' holds a value that isn't JSON serializable: {e}")
+        if kind != b's':
+            categories.append((0, 0))
+        kinds.append(kind)
+        arrays.append((values, present))
+
+    fields = layout(kinds)
+    dtype = record_dtype(fields)
+    records_offset = aligned(HEADER.size + FIELD.size * len(fields))
+    records = np.zeros(count, dtype=dtype)
+    for i, (values, present) in enumerate(arrays):
+        records[f'v{i}'] = values
+        records[f'p{i}'] = present
+    encoded = [string.encode('utf-8') for string in strings]
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(fields), dtype.itemsize, count, records_offset,
+                            records_offset + count * dtype.itemsize, len(encoded)))
+        for name, (kind, value_offset, present_offset), (first, length) in zip(names, fields, categories):
+            f.write(FIELD.pack(name, kind, value_offset, present_offset, first, length))
+        f.write(b'\0' * (records_offset - f.tell()))
+        records.tofile(f)
+        f.write(b''.join(LENGTH.pack(len(string)) + string for string in encoded))
+    os.replace(tmp_path, path)
+
+
+def read_strings(mapped, offset, count):
+    strings = []
+    for _ in range(count):
+        (length,) = LENGTH.unpack_from(mapped, offset)
+        offset += LENGTH.size
+        strings.append(mapped[offset:offset + length].decode('utf-8'))
+        offset += length
+    return strings
+
+
+def map_sessions(path):
+    """Open a binary session file as a SessionColumns whose columns are views of the mapped file.
+
+    Nothing is copied or parsed except the header, the string table and fields stored
+    as JSON, so opening takes about as long for a multi-GB file as for a small one.
+    The columns are read-only; the first session added copies them into memory.
+    """
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if len(mapped) < HEADER.size:
+                raise BinaryFormatError(f"'{path}' is too short to be a session file.")
+            magic, version, field_count, record_size, count, records_offset, strings_offset, string_count = \
+                HEADER.unpack_from(mapped)
+            if magic != MAGIC:
+                raise BinaryFormatError(f"'{path}' is not a session file.")
+            if version != FORMAT_VERSION:
+                raise BinaryFormatError(f"'{path}' has format version {version}; only {FORMAT_VERSION} is supported.")
+            descriptors = [FIELD.unpack_from(mapped, HEADER.size + i * FIELD.size) for i in range(field_count)]
+            strings = read_strings(mapped, strings_offset, string_count)
+
+    dtype = record_dtype([(kind, value_offset, present_offset)
+                          for _, kind, value_offset, present_offset, _, _ in descriptors])
+    if dtype.itemsize != record_size:
+        raise BinaryFormatError(f"'{path}' has {record_size}-byte records; its fields need {dtype.itemsize}.")
+    records = np.memmap(path, dtype=dtype, mode='r', offset=records_offset, shape=(count,)) if count \
+        else np.zeros(0, dtype=dtype)
+
+    columns = SessionColumns()
+    columns.length = columns.capacity = count
+    for i, (name, kind, _, _, first, length) in enumerate(descriptors):
+        values, present = records[f'v{i}'], records[f'p{i}'].view(np.bool_)
+        if kind == b's':
+            column = CategoricalColumn(0)
+            column.codes = values
+            column.categories = strings[first:first + length]
+            column.category_codes = {category: code for code, category in enumerate(column.categories)}
+        elif kind == b'j':
+            column = ObjectColumn(count)
+            for row in np.flatnonzero(present):
+                column.values[row] = orjson.loads(strings[values[row]])
+        else:
+            column = (TimestampColumn if kind == b't' else NumericColumn)(0)
+            column.values = values
+        column.present = present
+        columns.columns[strings[name]] = column
+    return columns
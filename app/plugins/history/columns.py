@@ -0,0 +1,508 @@
+import sys
+import copy
+import functools
+from datetime import datetime, timezone, timedelta
+
+import numpy as np
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+NAIVE_EPOCH = datetime(1970, 1, 1)
+TIMESTAMP_FIELD = 'timestamp'
+MIN_CAPACITY = 16
+CHUNK_ROWS = 100_000  # Sessions per chunk read by chunks()
+STORED_BATCH = 100_000  # Sessions read at a time when an index catches up from a store without columns
+HOUR_US = 3_600_000_000
+DAY_US = 24 * HOUR_US
+
+
+def to_epoch_us(value):
+    """Convert a datetime, ISO 8601 string or epoch microseconds to int epoch microseconds.
+
+    Naive datetimes are taken as local time, which is what datetime.now() returns.
+    """
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return (value.astimezone(timezone.utc) - EPOCH) // MICROSECOND
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def local_day_epoch_us(day):
+    """to_epoch_us() of local midnight at the start of a day, counted in days from 1970-01-01."""
+    return to_epoch_us(NAIVE_EPOCH + timedelta(days=day))
+
+
+def local_to_epoch_us(wall):
+    """Vectorized to_epoch_us() of naive local times, given as int64 wall-clock microseconds since 1970-01-01 00:00.
+
+    On a day the clocks don't change, local time runs evenly from midnight, so only
+    each distinct day's midnight is converted; times on the few days a change falls
+    on are converted one by one.
+    """
+    days, inverse = np.unique(wall // DAY_US, return_inverse=True)
+    starts = np.array([local_day_epoch_us(day) for day in days.tolist()], dtype=np.int64)
+    ends = np.array([local_day_epoch_us(day + 1) for day in days.tolist()], dtype=np.int64)
+    epochs = starts[inverse] + wall % DAY_US
+    for i in np.flatnonzero((ends - starts != DAY_US)[inverse]).tolist():
+        epochs[i] = to_epoch_us(NAIVE_EPOCH + int(wall[i]) * MICROSECOND)
+    return epochs
+
+
+def from_epoch_us(value):
+    """Return the naive local ISO 8601 string for epoch microseconds."""
+    seconds, microseconds = divmod(int(value), 1_000_000)
+    return (datetime.fromtimestamp(seconds) + microseconds * MICROSECOND).isoformat()
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def utc_day_offset_us(day):
+    """Local UTC offset in microseconds at the start of a UTC day, counted in days from 1970-01-01."""
+    return (datetime.fromtimestamp(day * 86_400) - NAIVE_EPOCH) // MICROSECOND - day * DAY_US
+
+
+def isoformats(epochs):
+    """Vectorized from_epoch_us() of an int64 array of epoch microseconds, returning a list of strings.
+
+    Like local_to_epoch_us(), each distinct day's offset is looked up once, and times on
+    a day the clocks change are converted one by one.
+    """
+    days, inverse = np.unique(epochs // DAY_US, return_inverse=True)
+    starts = np.array([utc_day_offset_us(day) for day in days.tolist()], dtype=np.int64)
+    ends = np.array([utc_day_offset_us(day + 1) for day in days.tolist()], dtype=np.int64)
+    wall = (epochs + starts[inverse]).astype('datetime64[us]')
+    # isoformat() leaves out microseconds when there are none.
+    strings = np.datetime_as_string(wall, unit='s').astype(object)
+    fractional = np.flatnonzero(epochs % 1_000_000)
+    strings[fractional] = np.datetime_as_string(wall[fractional], unit='us')
+    for i in np.flatnonzero((ends != starts)[inverse]).tolist():
+        strings[i] = from_epoch_us(epochs[i])
+    return strings.tolist()
+
+
+def resized(array, capacity):
+    grown = np.zeros(capacity, dtype=array.dtype)
+    kept = min(len(array), capacity)
+    grown[:kept] = array[:kept]
+    return grown
+
+
+class Column:
+    """One field of every session, with a flag per row for whether the session had it."""
+    def __init__(self, capacity):
+        self.present = np.zeros(capacity, dtype=bool)
+
+    def resize(self, capacity):
+        self.present = resized(self.present, capacity)
+
+    def take(self, rows):
+        """Return the values of the given rows in a form set_many() takes."""
+        return self.values[rows]
+
+    def nbytes(self):
+        return self.present.nbytes
+
+
+class NumericColumn(Column):
+    """int64 values, switching to float64 for good once a float is stored."""
+    def __init__(self, capacity):
+        super().__init__(capacity)
+        self.values = np.zeros(capacity, dtype=np.int64)
+
+    @staticmethod
+    def accepts(value):
+        if isinstance(value, bool):
+            return False
+        if isinstance(value, int):
+            return -2 ** 63 <= value < 2 ** 63
+        return isinstance(value, (float, np.integer, np.floating))
+
+    def resize(self, capacity):
+        super().resize(capacity)
+        self.values = resized(self.values, capacity)
+
+    def set(self, row, value):
+        if self.values.dtype == np.int64 and isinstance(value, (float, np.floating)):
+            self.values = self.values.astype(np.float64)
+        self.values[row] = value
+        self.present[row] = True
+
+    def get(self, row):
+        return self.values[row].item()
+
+    def set_many(self, rows, values):
+        """Store many values at once; returns False, changing nothing, if any of them doesn't fit."""
+        array = np.asarray(values)
+        if array.dtype.kind == 'f' and self.values.dtype == np.int64:
+            self.values = self.values.astype(np.float64)
+        elif array.dtype.kind not in 'iuf':  # Strings, bools, objects and out of range ints
+            return False
+        self.values[rows] = array
+        self.present[rows] = True
+        return True
+
+    def nbytes(self):
+        return super().nbytes() + self.values.nbytes
+
+
+class TimestampColumn(NumericColumn):
+    """Timestamps as int64 epoch microseconds, returned as the ISO strings sessions carry."""
+    @staticmethod
+    def accepts(value):
+        if isinstance(value, (int, np.integer)):  # Already epoch microseconds, e.g. from a WorkoutSession
+            return not isinstance(value, bool) and -2 ** 63 <= value < 2 ** 63
+        if isinstance(value, str):
+            try:
+                datetime.fromisoformat(value)
+            except ValueError:
+                return False
+            return True
+        return isinstance(value, datetime)
+
+    def set(self, row, value):
+        self.values[row] = to_epoch_us(value)
+        self.present[row] = True
+
+    def get(self, row):
+        return from_epoch_us(self.values[row])
+
+    def set_many(self, rows, values):
+        if isinstance(values, np.ndarray) and values.dtype.kind == 'i':  # Epoch microseconds already
+            self.values[rows] = values
+            self.present[rows] = True
+            return True
+        converted = {}  # Sessions imported together often share timestamps
+        epochs = np.empty(len(values), dtype=np.int64)
+        for i, value in enumerate(values):
+            epoch = converted.get(value)
+            if epoch is None:
+                if not self.accepts(value):
+                    return False
+                epoch = converted[value] = to_epoch_us(value)
+            epochs[i] = epoch
+        self.values[rows] = epochs
+        self.present[rows] = True
+        return True
+
+
+class CategoricalColumn(Column):
+    """Strings stored as int32 codes into a table of the distinct values."""
+    def __init__(self, capacity):
+        super().__init__(capacity)
+        self.codes = np.zeros(capacity, dtype=np.int32)
+        self.categories = []
+        self.category_codes = {}
+
+    @staticmethod
+    def accepts(value):
+        return isinstance(value, str)
+
+    def resize(self, capacity):
+        super().resize(capacity)
+        self.codes = resized(self.codes, capacity)
+
+    def code_for(self, value):
+        """Return the code of a category, or -1 if no session has it."""
+        return self.category_codes.get(value, -1)
+
+    def set(self, row, value):
+        code = self.category_codes.get(value)
+        if code is None:
+            code = self.category_codes[value] = len(self.categories)
+            self.categories.append(value)
+        self.codes[row] = code
+        self.present[row] = True
+
+    def get(self, row):
+        return self.categories[self.codes[row]]
+
+    def take(self, rows):
+        categories = self.categories
+        return [categories[code] for code in self.codes[rows].tolist()]
+
+    def set_many(self, rows, values):
+        try:
+            distinct = dict.fromkeys(values)  # In first-seen order, so codes are too
+        except TypeError:  # Unhashable values, e.g. lists
+            return False
+        if not all(isinstance(value, str) for value in distinct):
+            return False
+        for value in distinct - self.category_codes.keys():
+            self.category_codes[value] = len(self.categories)
+            self.categories.append(value)
+        self.codes[rows] = np.fromiter(map(self.category_codes.__getitem__, values), dtype=np.int32, count=len(values))
+        self.present[rows] = True
+        return True
+
+    def nbytes(self):
+        return super().nbytes() + self.codes.nbytes + sum(sys.getsizeof(value) for value in self.categories)
+
+
+class ObjectColumn(Column):
+    """Anything the typed columns can't hold, kept as Python objects."""
+    def __init__(self, capacity):
+        super().__init__(capacity)
+        self.values = np.empty(capacity, dtype=object)
+
+    @staticmethod
+    def accepts(value):
+        return True
+
+    @classmethod
+    def from_column(cls, column):
+        """Convert a typed column that met a value of another type."""
+        converted = cls(len(column.present))
+        for row in np.flatnonzero(column.present):
+            converted.set(row, column.get(row))
+        return converted
+
+    def resize(self, capacity):
+        super().resize(capacity)
+        values = np.empty(capacity, dtype=object)
+        kept = min(len(self.values), capacity)
+        values[:kept] = self.values[:kept]
+        self.values = values
+
+    def set(self, row, value):
+        self.values[row] = value
+        self.present[row] = True
+
+    def get(self, row):
+        return self.values[row]
+
+    def set_many(self, rows, values):
+        if isinstance(values, np.ndarray):  # Python objects rather than NumPy scalars
+            values = values.tolist()
+        for row, value in zip(rows, values):
+            self.set(row, value)
+        return True
+
+    def nbytes(self):
+        return super().nbytes() + self.values.nbytes
+
+
+def column_for(name, value):
+    """Pick the column type for a field from its first value."""
+    if name == TIMESTAMP_FIELD and TimestampColumn.accepts(value):
+        return TimestampColumn
+    for column_type in (NumericColumn, CategoricalColumn):
+        if column_type.accepts(value):
+            return column_type
+    return ObjectColumn
+
+
+class SessionColumns:
+    """Workout sessions stored column by column in growable NumPy arrays.
+
+    Reads like the list of session dicts it replaces (len, iteration and indexing
+    return dicts), while sums and filters run over whole columns at once.
+    """
+    durable = False  # Lives in memory; the app journals what is added
+
+    def __init__(self):
+        self.length = 0
+        self.capacity = 0
+        self.columns = {}  # field name -> Column, in the order fields were first seen
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        for row in range(self.length):
+            yield self.row(row)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.row(row) for row in range(*index.indices(self.length))]
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("session index out of range")
+        return self.row(index)
+
+    def row(self, row):
+        return {name: column.get(row) for name, column in self.columns.items() if column.present[row]}
+
+    def reserve(self, length):
+        """Make room for `length` sessions in every column."""
+        if length <= self.capacity:
+            return
+        self.capacity = max(MIN_CAPACITY, self.capacity * 2, length)
+        for column in self.columns.values():
+            column.resize(self.capacity)
+
+    def set_value(self, name, row, value):
+        column = self.columns.get(name)
+        if column is None:
+            column = self.columns[name] = column_for(name, value)(self.capacity)
+        elif not column.accepts(value):
+            column = self.columns[name] = ObjectColumn.from_column(column)
+        column.set(row, value)
+
+    def append(self, session):
+        """Store one session dict as a new row."""
+        self.reserve(self.length + 1)
+        for name, value in session.items():
+            self.set_value(name, self.length, value)
+        self.length += 1
+
+    @classmethod
+    def from_fields(cls, length, fields):
+        """Build `length` sessions from {field: (rows, values)}, each field's values in the order of its rows."""
+        columns = cls()
+        columns.reserve(length)
+        for name, (rows, values) in fields.items():
+            columns.fill(name, rows, values)
+        columns.length = length
+        return columns
+
+    def fields(self):
+        """Return {field: (rows, values)} of the rows each field is present in, as from_fields() takes them."""
+        fields = {}
+        for name, column in self.columns.items():
+            rows = np.flatnonzero(column.present[:self.length])
+            fields[name] = (rows, column.take(rows))
+        return fields
+
+    def fill(self, name, rows, values):
+        """Set a field of the given rows, which must already have room."""
+        if not len(rows):
+            return
+        column = self.columns.get(name)
+        if column is None:
+            column = self.columns[name] = column_for(name, values[0])(self.capacity)
+        if not column.set_many(np.asarray(rows), values):
+            # Some value needs a different column type; store this field value by value.
+            for row, value in zip(rows, values.tolist() if isinstance(values, np.ndarray) else values):
+                self.set_value(name, row, value)
+
+    def extend(self, sessions):
+        """Store many session dicts, or another SessionColumns, filling each column in one go where the values allow it."""
+        first_row = self.length
+        if isinstance(sessions, SessionColumns):  # e.g. a chunk of a bulk import: copied column by column
+            fields = {name: (first_row + rows, values) for name, (rows, values) in sessions.fields().items()}
+            count = len(sessions)
+        else:
+            fields = {}  # name -> (rows, values)
+            count = 0
+            for row, session in enumerate(sessions, first_row):
+                for name, value in session.items():
+                    entry = fields.get(name)
+                    if entry is None:
+                        entry = fields[name] = ([], [])
+                    entry[0].append(row)
+                    entry[1].append(value)
+                count += 1
+        self.reserve(first_row + count)
+        for name, (rows, values) in fields.items():
+            self.fill(name, rows, values)
+        self.length = first_row + count
+
+    def values(self, name):
+        """Return a field's values for every session (zero where absent), or None if no session has it."""
+        column = self.columns.get(name)
+        if column is None:
+            return None
+        return (column.codes if isinstance(column, CategoricalColumn) else column.values)[:self.length]
+
+    def mask(self, since=None, until=None, **fields):
+        """Return a boolean array selecting sessions in [since, until) whose fields equal the given values."""
+        return self.range_mask(0, self.length, since, until, fields)
+
+    def range_mask(self, start, stop, since, until, fields):
+        """mask() of only the rows in [start, stop)."""
+        rows = slice(start, stop)
+        selected = np.ones(stop - start, dtype=bool)
+        if since is not None or until is not None:
+            column = self.columns.get(TIMESTAMP_FIELD)
+            if column is None:
+                return np.zeros(stop - start, dtype=bool)
+            timestamps = column.values[rows]
+            selected &= column.present[rows]
+            if since is not None:
+                selected &= timestamps >= to_epoch_us(since)
+            if until is not None:
+                selected &= timestamps < to_epoch_us(until)
+        for name, value in fields.items():
+            column = self.columns.get(name)
+            if column is None:
+                return np.zeros(stop - start, dtype=bool)
+            selected &= column.present[rows]
+            if isinstance(column, CategoricalColumn):
+                selected &= column.codes[rows] == column.code_for(value)
+            else:
+                selected &= column.values[rows] == value
+        return selected
+
+    def select(self, rows):
+        """Return the sessions at the given rows, in that order, as new SessionColumns."""
+        fields = {}
+        for name, column in self.columns.items():
+            positions = np.flatnonzero(column.present[rows])
+            fields[name] = (positions, column.take(rows[positions]))
+        return SessionColumns.from_fields(len(rows), fields)
+
+    def chunks(self, since=None, until=None, size=CHUNK_ROWS, **fields):
+        """Yield the sessions in [since, until) whose fields equal the given values, in row order.
+
+        Each chunk is a SessionColumns of up to size sessions, copied out of these columns
+        as it is reached, so only one is held at a time.
+        """
+        for start in range(0, self.length, size):
+            stop = min(start + size, self.length)
+            rows = start + np.flatnonzero(self.range_mask(start, stop, since, until, fields))
+            if len(rows):
+                yield self.select(rows)
+
+    def field_names(self):
+        """Return the name of every field any session has, in the order they were first seen."""
+        return list(self.columns)
+
+    def sum(self, name, mask=None):
+        """Sum a numeric field over all sessions, or over those selected by mask."""
+        column = self.columns.get(name)
+        if column is None:
+            return 0
+        if isinstance(column, NumericColumn):  # Absent rows hold zero, so they can be summed too
+            return column.values[:self.length].sum(where=True if mask is None else mask).item()
+        if isinstance(column, CategoricalColumn):  # Only strings, and no string is a number
+            return 0
+        rows = column.present[:self.length] if mask is None else column.present[:self.length] & mask
+        # Like the running aggregates, skip values that aren't numbers, e.g. 'unknown' calories.
+        return sum((value for value in column.values[:self.length][rows]
+                    if NumericColumn.accepts(value)), 0)
+
+    def totals(self, names, since=None, until=None, **fields):
+        """Return the number of selected sessions and the sum of each named numeric field over them."""
+        mask = self.mask(since, until, **fields)
+        return int(mask.sum()), [self.sum(name, mask) for name in names]
+
+    def field_stats(self, name):
+        """Return count, sum, min, max, mean and sum of squared deviations of a numeric field, or None."""
+        column = self.columns.get(name)
+        if column is not None and type(column) is not NumericColumn:  # Strings, objects or timestamps
+            return None
+        values = column.values[:self.length][column.present[:self.length]] if column is not None else ()
+        if not len(values):
+            return {'count': 0, 'sum': 0, 'min': None, 'max': None, 'mean': 0.0, 'm2': 0.0}
+        mean = values.mean(dtype=np.float64).item()
+        return {'count': len(values), 'sum': values.sum().item(), 'min': values.min().item(),
+                'max': values.max().item(), 'mean': mean, 'm2': ((values - mean) ** 2).sum().item()}
+
+    def memory_size(self):
+        return sys.getsizeof(self) + sum(column.nbytes() for column in self.columns.values())
+
+    def __getstate__(self):
+        # Spare capacity isn't worth pickling. Trimmed copies are pickled instead, so these columns keep it.
+        state = dict(self.__dict__)
+        state['columns'] = {name: self.trimmed(column) for name, column in self.columns.items()}
+        state['capacity'] = self.length
+        return state
+
+    def trimmed(self, column):
+        if self.capacity == self.length:
+            return column
+        column = copy.copy(column)
+        column.resize(self.length)  # Replaces the copy's arrays; the column's own are left alone
+        return column
@@ -0,0 +1,289 @@
+import sys
+import heapq
+import logging
+import itertools
+
+import numpy as np
+
+from app.plugins.history.columns import (STORED_BATCH, TIMESTAMP_FIELD, CategoricalColumn, NumericColumn,
+                                         SessionColumns, TimestampColumn, from_epoch_us, resized, to_epoch_us)
+from app.plugins.history.records import EXERCISE_FIELD, WorkoutSession
+
+TOP_K = 10  # Sessions kept per exercise and field for top_sessions(); larger k reads the store
+
+# Callables notified of every personal record set by a single added session; see register_record_listener.
+RECORD_LISTENERS = []
+
+
+def register_record_listener(listener):
+    """Have listener(user_id, record) called the moment a session added to any history sets a personal record.
+
+    record is a dict like records_set() returns. Listeners are called after the session
+    is stored, outside the history's lock; an exception in one is logged and doesn't
+    stop the others. Sessions added in a batch, such as an import or a journal replay,
+    update the records without notifying listeners.
+    """
+    RECORD_LISTENERS.append(listener)
+    return listener
+
+
+def notify_records(user_id, records):
+    for record in records:
+        for listener in RECORD_LISTENERS:
+            try:
+                listener(user_id, record)
+            except Exception as e:
+                logging.error(f"Personal record listener {listener!r} failed: {e}")
+
+
+def is_number(value):
+    return NumericColumn.accepts(value) and value == value  # Not NaN
+
+
+def numeric_values(column, rows):
+    """Return the rows among rows where a column holds a number, and those numbers as an array."""
+    if type(column) is NumericColumn:
+        rows = rows[np.asarray(column.present[rows])]
+        values = np.asarray(column.values[rows])
+        if values.dtype.kind == 'f':
+            keep = ~np.isnan(values)
+            rows, values = rows[keep], values[keep]
+        return rows, values
+    if column is None or isinstance(column, (TimestampColumn, CategoricalColumn)):
+        return rows[:0], np.zeros(0)
+    pairs = [(row, value) for row in rows[np.asarray(column.present[rows])].tolist()  # Numbers among other values
+             if is_number(value := column.get(row))]
+    values = np.array([value for _, value in pairs])
+    if values.dtype.kind not in 'if':  # e.g. ints too large for int64 alongside floats
+        return rows[:0], np.zeros(0)
+    return np.array([row for row, _ in pairs], dtype=np.int64), values
+
+
+def top_positions(values, k):
+    """Return the positions of the k largest values, ties going to the first, in no particular order."""
+    if len(values) <= k:
+        return np.arange(len(values))
+    threshold = np.partition(values, -k)[-k]
+    above = np.flatnonzero(values > threshold)
+    return np.concatenate((above, np.flatnonzero(values == threshold)[:k - len(above)]))
+
+
+def top_in_columns(history, rows, field, k):
+    """Return the k sessions with the highest value of a field among the given rows of a SessionColumns, best first."""
+    rows, values = numeric_values(history.columns.get(field), rows)
+    best = top_positions(values, k)
+    rows, values = rows[best], values[best]
+    return [history.row(row) for row in rows[np.lexsort((rows, -values))].tolist()]
+
+
+def top_in_chunks(chunks, field, k):
+    """Return the k sessions with the highest value of a field among SessionColumns chunks, best first."""
+    best = []  # (value, -position, session) of the k best so far; ties go to the earlier session
+    offset = 0
+    for chunk in chunks:
+        rows, values = numeric_values(chunk.columns.get(field), np.arange(len(chunk)))
+        best = heapq.nlargest(k, itertools.chain(best, (
+            (values[i].item(), -(offset + int(rows[i])), chunk.row(int(rows[i]))) for i in top_positions(values, k))),
+            key=lambda entry: entry[:2])
+        offset += len(chunk)
+    return [session for _, _, session in best]
+
+
+def record_of(epoch, name, field, value, best):
+    """A record as the index keeps it: (epoch, exercise, field, value, previous best or None)."""
+    return epoch, name, field, value, None if best is None else best[0]
+
+
+def describe(record):
+    epoch, name, field, value, previous = record
+    return {'exercise': name, 'field': field, 'value': value, 'previous': previous,
+            'timestamp': None if epoch is None else from_epoch_us(epoch)}
+
+
+class Exercise:
+    """One exercise's sessions: their rows in the store, best value of each numeric field and top TOP_K by each."""
+    def __init__(self):
+        self.length = 0
+        self.rows = np.zeros(0, dtype=np.int64)  # In the order added; capacity beyond length is spare
+        self.best = {}  # field -> (value, epoch microseconds of the session that set it)
+        self.top = {}  # field -> min-heap of (value, -row, session dict), at most TOP_K long
+
+    def add_row(self, row):
+        if self.length == len(self.rows):
+            self.rows = resized(self.rows, max(16, 2 * len(self.rows)))
+        self.rows[self.length] = row
+        self.length += 1
+
+    def add_rows(self, rows):
+        length = self.length + len(rows)
+        if length > len(self.rows):
+            self.rows = resized(self.rows, max(16, 2 * len(self.rows), length))
+        self.rows[self.length:length] = rows
+        self.length = length
+
+    def nbytes(self):
+        """Approximate bytes held: the rows, plus the top sessions, whose dicts are counted shallowly."""
+        return self.rows.nbytes + sum(sys.getsizeof(heap) + sum(sys.getsizeof(entry[2]) for entry in heap)
+                                      for heap in self.top.values())
+
+    def offer(self, field, value, row, session):
+        """Keep a session among the top TOP_K of a field; session may be a callable returning its dict."""
+        heap = self.top.setdefault(field, [])
+        if len(heap) < TOP_K:
+            heapq.heappush(heap, (value, -row, session() if callable(session) else session))
+        elif (value, -row) > heap[0][:2]:  # Ties keep the session added first
+            heapq.heapreplace(heap, (value, -row, session() if callable(session) else session))
+
+
+class ExerciseIndex:
+    """Secondary index of a history's sessions by exercise, with each exercise's personal records.
+
+    Kept up to date as sessions are added, like the timeline. A personal record is a
+    session with a higher value of a numeric field (duration, calories or any other)
+    than every session of the same exercise added before it. Top sessions by a field
+    come from bounded heaps, so neither needs a scan however many sessions there are.
+    Row numbers are the sessions' positions in the store, as in the timeline.
+    """
+    def __init__(self):
+        self.rows_seen = 0
+        self.exercises = {}  # exercise name -> Exercise
+        self.records = []  # (epoch, exercise, field, value, previous value or None), in the order set
+
+    def nbytes(self):
+        """Approximate bytes held by the index, for the session manager's memory budget."""
+        return (sum(exercise.nbytes() for exercise in self.exercises.values()) +
+                sys.getsizeof(self.records) + sum(map(sys.getsizeof, self.records)))
+
+    def exercise(self, name):
+        exercise = self.exercises.get(name)
+        if exercise is None:
+            exercise = self.exercises[name] = Exercise()
+        return exercise
+
+    def add(self, session):
+        """Index one session; returns the personal records it set, as records_set() lists them."""
+        row = self.rows_seen
+        self.rows_seen += 1
+        name = session.get(EXERCISE_FIELD)
+        if not isinstance(name, str):
+            return []
+        exercise = self.exercise(name)
+        exercise.add_row(row)
+        as_dict = None
+        records = []
+        for field, value in session.items():
+            if field == TIMESTAMP_FIELD or not is_number(value):
+                continue
+            best = exercise.best.get(field)
+            if best is None or value > best[0]:
+                timestamp = session.get(TIMESTAMP_FIELD)
+                epoch = to_epoch_us(timestamp) if timestamp is not None else None
+                exercise.best[field] = (value, epoch)
+                records.append(record_of(epoch, name, field, value, best))
+            heap = exercise.top.get(field)
+            if heap is None or len(heap) < TOP_K or value > heap[0][0]:  # Usually not: skip making the dict
+                if as_dict is None:
+                    as_dict = session.to_dict() if isinstance(session, WorkoutSession) else dict(session)
+                exercise.offer(field, value, row, as_dict)
+        if len(records) > 1:
+            records.sort(key=lambda record: record[2])  # By field, as the batch path orders them
+        self.records.extend(records)
+        return [describe(record) for record in records]
+
+    def add_many(self, sessions):
+        for session in sessions:
+            self.add(session)
+
+    def add_stored(self, history, start=0):
+        """Index the sessions in a store from row start on, a whole exercise and field at a time where it has columns."""
+        column = history.columns.get(EXERCISE_FIELD) if isinstance(history, SessionColumns) else None
+        if not isinstance(history, SessionColumns) or (column is not None and not isinstance(column, CategoricalColumn)):
+            sessions = iter(history[start:] if isinstance(history, SessionColumns) else history)
+            while batch := list(itertools.islice(sessions, STORED_BATCH)):
+                self.add_many(batch)
+            return
+        end = len(history)
+        records = []  # (row, record) of the records set, gathered an exercise and field at a time
+        if column is not None:
+            rows = start + np.flatnonzero(column.present[start:end])
+            codes = np.asarray(column.codes[rows])
+            order = np.argsort(codes, kind='stable')  # Rows stay in order within each exercise
+            counts = np.bincount(codes, minlength=len(column.categories))
+            bounds = np.concatenate(([0], np.cumsum(counts)))
+            for code in np.flatnonzero(counts).tolist():
+                records += self.add_columns(history, column.categories[code], rows[order[bounds[code]:bounds[code + 1]]])
+        records.sort(key=lambda entry: (entry[0], entry[1][2]))  # In the order the sessions were added
+        self.records.extend(record for _, record in records)
+        self.rows_seen = end
+
+    def add_columns(self, history, name, rows):
+        """Index the given rows of a SessionColumns, all sessions of one exercise; returns (row, record) of the records set."""
+        records = []
+        exercise = self.exercise(name)
+        exercise.add_rows(rows)
+        times = history.columns.get(TIMESTAMP_FIELD)
+        for field, column in history.columns.items():
+            field_rows, values = numeric_values(column, rows)
+            if not len(values):
+                continue
+            # A session sets a record if it beats the best before these rows and every earlier one among them.
+            best = exercise.best.get(field)
+            beats = np.empty(len(values), dtype=bool)
+            beats[0] = True
+            beats[1:] = values[1:] > np.maximum.accumulate(values)[:-1]
+            if best is not None:
+                beats &= values > best[0]
+            for i in np.flatnonzero(beats).tolist():
+                row = int(field_rows[i])
+                epoch = self.epoch(times, row)
+                value = values[i].item()
+                records.append((row, record_of(epoch, name, field, value, best)))
+                best = exercise.best[field] = (value, epoch)
+            for i in top_positions(values, TOP_K).tolist():
+                row = int(field_rows[i])
+                exercise.offer(field, values[i].item(), row, lambda row=row: history.row(row))
+        return records
+
+    @staticmethod
+    def epoch(times, row):
+        if times is None or not times.present[row]:
+            return None
+        return int(times.values[row]) if isinstance(times, TimestampColumn) else to_epoch_us(times.get(row))
+
+    def personal_records(self, name=None):
+        """Return {exercise: {field: {'value', 'timestamp'}}} of the best sessions, or {field: ...} of one exercise."""
+        def bests(exercise):
+            return {field: {'value': value, 'timestamp': None if epoch is None else from_epoch_us(epoch)}
+                    for field, (value, epoch) in exercise.best.items()}
+        if name is not None:
+            exercise = self.exercises.get(name)
+            return bests(exercise) if exercise is not None else {}
+        return {exercise_name: bests(exercise) for exercise_name, exercise in self.exercises.items()}
+
+    def records_set(self, since=None, until=None, name=None):
+        """Return the personal records set by sessions in [since, until), in the order they were set."""
+        first = None if since is None else to_epoch_us(since)
+        last = None if until is None else to_epoch_us(until)
+        return [describe(record) for record in self.records
+                if (name is None or record[1] == name) and (first is None or (record[0] is not None and record[0] >= first))
+                and (last is None or (record[0] is not None and record[0] < last))]
+
+    def top(self, name, field, k):
+        """Return the k best sessions of an exercise by a field, best first, or None if k is more than is kept."""
+        if k > TOP_K:
+            return None
+        exercise = self.exercises.get(name)
+        heap = exercise.top.get(field, []) if exercise is not None else []
+        return [session for _, _, session in heapq.nlargest(k, heap, key=lambda entry: entry[:2])]
+
+    def drop_rows(self, rows):
+        """Forget the rows of sessions the store has moved out of memory; records and top sessions are kept."""
+        for exercise in self.exercises.values():
+            kept = exercise.rows[:exercise.length]
+            exercise.rows = kept[~np.isin(kept, rows)]
+            exercise.length = len(exercise.rows)
+
+    def rows(self, name):
+        """Return the rows of an exercise's sessions, in the order they were added."""
+        exercise = self.exercises.get(name)
+        return exercise.rows[:exercise.length] if exercise is not None else np.zeros(0, dtype=np.int64)
@@ -0,0 +1,119 @@
+import io
+import os
+import csv
+import gzip
+import time
+import itertools
+
+import numpy as np
+import orjson
+
+from app.plugins.history.columns import CategoricalColumn, ObjectColumn, TimestampColumn, isoformats
+from app.plugins.history.importer import file_format, gc_paused
+
+# The pipeline: the store's chunks() yields the selected sessions a chunk at a time as
+# SessionColumns, encode_csv()/encode_jsonl() turn each chunk into text column by column,
+# and export_sessions() writes it through gzip if asked, keeping one chunk in memory.
+SEPARATOR = '},{'
+GZIP_LEVEL = 6  # zlib's default; 9 is several times slower for a few percent smaller files
+
+
+class ExportFormatError(ValueError):
+    """Raised for export paths whose format can't be told from the name."""
+
+
+def field_values(chunk, name):
+    """Return a field's value in every session of a chunk, None where the session doesn't have it.
+
+    Timestamps become the ISO strings sessions carry, formatted a whole column at a time.
+    """
+    length = len(chunk)
+    column = chunk.columns.get(name)
+    if column is None:
+        return [None] * length
+    if isinstance(column, TimestampColumn):
+        values = isoformats(column.values[:length])
+    elif isinstance(column, CategoricalColumn):
+        values = np.array(column.categories, dtype=object)[column.codes[:length]].tolist()
+    else:
+        values = column.values[:length].tolist()
+    present = column.present[:length]
+    if not present.all():
+        values = [value if is_present else None for value, is_present in zip(values, present.tolist())]
+    return values
+
+
+def encode_jsonl(chunk):
+    """Return a chunk of sessions as JSON lines."""
+    names = chunk.field_names()
+    columns = [field_values(chunk, name) for name in names]
+    if any(None in values for values in columns):
+        rows = [{name: value for name, value in zip(names, values) if value is not None} for values in zip(*columns)]
+    else:
+        rows = [dict(zip(names, values)) for values in zip(*columns)]
+    if not rows:
+        return b''
+    # One orjson call for the whole chunk is several times faster than one per session. The
+    # sessions are then split apart at '},{', which orjson only writes between them unless a
+    # string or a nested value holds one; chunks that might are encoded session by session.
+    nested = any(isinstance(column, ObjectColumn) for column in chunk.columns.values())
+    if not nested and not any(SEPARATOR in text for text in itertools.chain(names, *(
+            column.categories for column in chunk.columns.values() if isinstance(column, CategoricalColumn)))):
+        return orjson.dumps(rows)[1:-1].replace(b'},{', b'}\n{') + b'\n'
+    return b''.join([orjson.dumps(row, option=orjson.OPT_APPEND_NEWLINE) for row in rows])
+
+
+def csv_cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, (str, int, float)) and not isinstance(value, bool):
+        return value
+    return orjson.dumps(value).decode()  # Lists, objects and booleans, as JSON
+
+
+def encode_csv(chunk, header):
+    """Return a chunk of sessions as CSV rows with the given columns."""
+    columns = []
+    for name in header:
+        values = field_values(chunk, name)
+        if isinstance(chunk.columns.get(name), ObjectColumn) or None in values:
+            values = list(map(csv_cell, values))
+        columns.append(values)
+    text = io.StringIO()
+    csv.writer(text).writerows(zip(*columns))
+    return text.getvalue().encode()
+
+
+def export_sessions(path, chunks, field_names):
+    """Write the sessions from an iterator of SessionColumns chunks to a CSV or JSONL file, gzipped if it ends in .gz.
+
+    field_names() is called for the CSV header. The file is written under a temporary
+    name and moved into place once complete. Returns a report of the sessions and
+    bytes written.
+    """
+    format_name = file_format(path, ExportFormatError)
+    start = time.perf_counter()
+    sessions = 0
+    tmp_path = f"{os.fspath(path)}.tmp"
+    try:
+        with gc_paused(), open(tmp_path, 'wb') as raw:
+            out = raw
+            if os.fspath(path).lower().endswith('.gz'):
+                out = gzip.GzipFile(filename=os.path.basename(os.fspath(path))[:-3], mode='wb', fileobj=raw,
+                                    compresslevel=GZIP_LEVEL)
+            with out:
+                if format_name == 'csv':
+                    header = field_names()
+                    text = io.StringIO()
+                    csv.writer(text).writerow(header)
+                    out.write(text.getvalue().encode())
+                for chunk in chunks:
+                    out.write(encode_csv(chunk, header) if format_name == 'csv' else encode_jsonl(chunk))
+                    sessions += len(chunk)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return {'path': os.fspath(path), 'sessions': sessions, 'bytes': os.path.getsize(path),
+            'seconds': time.perf_counter() - start}
@@ -0,0 +1,306 @@
+import gc
+import io
+import os
+import csv
+import gzip
+import contextlib
+import math
+import time
+import logging
+import warnings
+import itertools
+
+import numpy as np
+import orjson
+
+from app.plugins.history.columns import TIMESTAMP_FIELD, SessionColumns, local_to_epoch_us, to_epoch_us
+from app.plugins.history.records import EXERCISE_FIELD
+
+# The pipeline: read_chunks() parses a file a chunk of rows at a time into columns of raw
+# values, validate() checks and converts each column of a chunk in bulk into SessionColumns,
+# and import_sessions() hands each chunk to the store, keeping count of what was rejected.
+FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+CHUNK_SIZE = 20_000  # Rows validated and stored at a time; bounds the memory an import uses
+NUMERIC_FIELDS = ('duration', 'calories_burned')
+MAX_REPORTED_ERRORS = 100  # Rejected rows listed in the report; all of them go to errors_path
+PROGRESS_INTERVAL = 5.0  # Seconds between progress log lines
+
+
+class ImportFormatError(ValueError):
+    """Raised for files that can't be imported at all, as opposed to rows that are rejected."""
+
+
+class RowError(ValueError):
+    """A row that fails validation; the import skips it and carries on."""
+
+
+def file_format(path, error=ImportFormatError):
+    """Return 'csv' or 'jsonl' from a file name, looking past a '.gz' suffix; raises error if it's neither.
+
+    Shared with the exporter, which passes its own error class.
+    """
+    name = os.fspath(path).lower()
+    if name.endswith('.gz'):
+        name = name[:-3]
+    format_name = FORMATS.get(os.path.splitext(name)[1])
+    if format_name is None:
+        raise error(f"Can't tell the format of '{path}'; expected one of {', '.join(FORMATS)} (optionally gzipped).")
+    return format_name
+
+
+def open_binary(path):
+    return gzip.open(path, 'rb') if os.fspath(path).lower().endswith('.gz') else open(path, 'rb')
+
+
+@contextlib.contextmanager
+def gc_paused():
+    """Pause the cyclic garbage collector, e.g. while streaming a file a chunk at a time.
+
+    Each chunk allocates hundreds of thousands of short-lived lists, tuples or dicts,
+    none in a cycle, which would otherwise set off full collections over every object
+    in the process.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def chunked(rows, size=CHUNK_SIZE):
+    """Group an iterator into lists of up to size items."""
+    rows = iter(rows)
+    while chunk := list(itertools.islice(rows, size)):
+        yield chunk
+
+
+def read_csv(f, size):
+    """Yield (line numbers, {field: values}, rejected) per chunk of CSV rows; empty cells are None."""
+    reader = csv.reader(f)
+    header = next(reader, None)
+    if not header:
+        return
+    if TIMESTAMP_FIELD not in header:
+        raise ImportFormatError(f"The CSV header has no '{TIMESTAMP_FIELD}' column: {header}")
+    width = len(header)
+    for chunk in chunked(((reader.line_num, values) for values in reader), size):
+        lines, rows, rejected = [], [], []
+        for line_number, values in chunk:
+            if len(values) == width:
+                lines.append(line_number)
+                rows.append(values)
+            elif values:  # Not a blank line
+                rejected.append((line_number, f"expected {width} values, got {len(values)}", values))
+        columns = zip(*rows) if rows else [()] * width
+        yield lines, {name: [value or None for value in values] for name, values in zip(header, columns)}, rejected
+
+
+def read_jsonl(f, size):
+    """Yield (line numbers, {field: values}, rejected) per chunk of JSON lines; missing fields are None."""
+    for chunk in chunked(enumerate(f, 1), size):
+        lines, rows, rejected = [], [], []
+        for line_number, line in chunk:
+            try:
+                data = orjson.loads(line)
+            except orjson.JSONDecodeError as e:
+                if line.strip():
+                    rejected.append((line_number, f"invalid JSON: {e}", line.decode(errors='replace')))
+                continue
+            if isinstance(data, dict):
+                lines.append(line_number)
+                rows.append(data)
+            else:
+                rejected.append((line_number, f"expected a JSON object, got {type(data).__name__}", data))
+        names = dict.fromkeys(itertools.chain.from_iterable(rows))  # Every field, in the order first seen
+        yield lines, {name: [row.get(name) for row in rows] for name in names}, rejected
+
+
+def read_chunks(path, size=CHUNK_SIZE):
+    """Stream a CSV or JSONL file, gzipped or not, as (line numbers, {field: values}, rejected) per chunk."""
+    format_name = file_format(path)
+    with open_binary(path) as f:
+        if format_name == 'csv':
+            yield from read_csv(io.TextIOWrapper(f, encoding='utf-8', newline=''), size)
+        else:
+            yield from read_jsonl(f, size)
+
+
+def present(values):
+    """Return the positions of the values that aren't None, and those values."""
+    if None not in values:
+        return np.arange(len(values)), values
+    positions = [i for i, value in enumerate(values) if value is not None]
+    return np.array(positions, dtype=np.int64), [values[i] for i in positions]
+
+
+def to_number(value, name):
+    """Return a duration or calorie count as a non-negative int or float; CSV gives them as text."""
+    if isinstance(value, str):
+        try:
+            value = int(value)
+        except ValueError:
+            try:
+                value = float(value)
+            except ValueError:
+                raise RowError(f"{name} is not a number: {value!r}") from None
+    elif isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise RowError(f"{name} is not a number: {value!r}")
+    if not math.isfinite(value) or value < 0:
+        raise RowError(f"{name} must be a non-negative number, got {value!r}")
+    return value
+
+
+def to_timestamp(value):
+    """Return an ISO 8601 string or int epoch microseconds as epoch microseconds."""
+    if isinstance(value, bool) or not isinstance(value, (str, int)):
+        raise RowError(f"{TIMESTAMP_FIELD} is not an ISO 8601 string or epoch microseconds: {value!r}")
+    try:
+        epoch = to_epoch_us(value)
+    except (ValueError, OverflowError):
+        raise RowError(f"invalid {TIMESTAMP_FIELD}: {value!r}") from None
+    if not -2 ** 63 <= epoch < 2 ** 63:
+        raise RowError(f"{TIMESTAMP_FIELD} out of range: {value!r}")
+    return epoch
+
+
+def one_by_one(positions, values, convert, errors):
+    """Convert values separately, recording the errors of those that fail; the slow path of parse_*()."""
+    kept, converted = [], []
+    for position, value in zip(positions.tolist(), values):
+        try:
+            converted.append(convert(value))
+        except RowError as e:
+            errors.setdefault(position, str(e))
+            continue
+        kept.append(position)
+    return np.array(kept, dtype=np.int64), np.array(converted)
+
+
+def parse_timestamps(values, errors):
+    """Return the positions of the timestamps and their epoch microseconds, recording errors for bad ones.
+
+    ISO strings are parsed by NumPy in one go; a chunk with any string NumPy can't
+    parse, or with time zones, is converted value by value instead.
+    """
+    positions, values = present(values)
+    kinds = set(map(type, values))
+    if kinds <= {str}:
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter('error')  # NumPy warns about, and converts, times with a UTC offset
+                if min(map(len, values), default=10) < 10:  # e.g. '2024-05', which fromisoformat() rejects
+                    raise ValueError
+                wall = np.array(values, dtype='datetime64[us]').view(np.int64)
+            return positions, local_to_epoch_us(wall)
+        except (ValueError, DeprecationWarning):
+            pass
+    elif kinds <= {int}:
+        epochs = np.array(values)
+        if epochs.dtype == np.int64:
+            return positions, epochs
+    return one_by_one(positions, values, to_timestamp, errors)
+
+
+def parse_numbers(values, name, errors):
+    """Return the positions of a numeric field's values and the values, recording errors for bad ones."""
+    positions, values = present(values)
+    numbers = None
+    kinds = set(map(type, values))
+    if kinds <= {str}:
+        for convert in (int, float):
+            try:
+                numbers = np.array(list(map(convert, values)))
+                break
+            except ValueError:
+                pass
+    elif kinds <= {int, float}:
+        numbers = np.array(values)
+    if numbers is None or numbers.dtype.kind not in 'if':
+        return one_by_one(positions, values, lambda value: to_number(value, name), errors)
+    bad = ~np.isfinite(numbers) | (numbers < 0)
+    if bad.any():
+        for position, value in zip(positions[bad].tolist(), numbers[bad].tolist()):
+            errors.setdefault(position, f"{name} must be a non-negative number, got {value!r}")
+    return positions, numbers
+
+
+def validate(lines, fields):
+    """Check a chunk column by column; returns its valid rows as SessionColumns, and the rejected rows.
+
+    Timestamps become epoch microseconds and durations and calories numbers; other
+    fields are kept as they are. Rejected rows are (line number, error, row).
+    """
+    count = len(lines)
+    errors = {}  # position in the chunk -> the first error found in that row
+    parsed = {}  # field -> (positions, values)
+    for name, values in fields.items():
+        if name == TIMESTAMP_FIELD:
+            parsed[name] = parse_timestamps(values, errors)
+        elif name in NUMERIC_FIELDS:
+            parsed[name] = parse_numbers(values, name, errors)
+        else:
+            if name == EXERCISE_FIELD and not set(map(type, values)) <= {str, type(None)}:
+                for position, value in enumerate(values):
+                    if value is not None and not isinstance(value, str):
+                        errors.setdefault(position, f"{EXERCISE_FIELD} is not a string: {value!r}")
+            parsed[name] = present(values)
+    timestamps = parsed.get(TIMESTAMP_FIELD, (np.zeros(0, dtype=np.int64), None))[0]
+    missing = np.ones(count, dtype=bool)
+    missing[timestamps] = False
+    for position in np.flatnonzero(missing).tolist():
+        errors.setdefault(position, f"missing {TIMESTAMP_FIELD}")
+
+    valid = np.ones(count, dtype=bool)
+    valid[list(errors)] = False
+    new_rows = np.cumsum(valid) - 1  # Row in the batch of each valid row
+    batch_fields = {}
+    for name, (positions, values) in parsed.items():
+        keep = valid[positions]
+        if isinstance(values, np.ndarray):
+            values = values[keep]
+        elif not keep.all():
+            values = [value for value, kept in zip(values, keep.tolist()) if kept]
+        batch_fields[name] = (new_rows[positions[keep]], values)
+    rejected = [(lines[position], error, {name: values[position] for name, values in fields.items()
+                                          if values[position] is not None})
+                for position, error in sorted(errors.items())]
+    return SessionColumns.from_fields(int(valid.sum()), batch_fields), rejected
+
+
+def import_sessions(path, store, chunk_size=CHUNK_SIZE, progress=None, errors_path=None):
+    """Stream sessions from a CSV or JSONL file into store(sessions), one validated chunk at a time.
+
+    Only one chunk is held at once, so memory use doesn't grow with the file. Rows that
+    fail validation are skipped: the first MAX_REPORTED_ERRORS are listed in the
+    report, and every one is written to errors_path as a JSON line if given. progress
+    is called with the running report after each chunk. Returns the report.
+    """
+    report = {'path': os.fspath(path), 'rows': 0, 'imported': 0, 'rejected': 0, 'errors': [], 'seconds': 0.0}
+    start = last_logged = time.perf_counter()
+    errors = open(errors_path, 'wb') if errors_path is not None else contextlib.nullcontext()
+    with gc_paused(), errors as errors_file:
+        for lines, fields, unreadable in read_chunks(path, chunk_size):
+            sessions, invalid = validate(lines, fields)
+            if len(sessions):
+                store(sessions)
+            rejected = sorted(unreadable + invalid, key=lambda entry: entry[0])
+            report['rows'] += len(lines) + len(unreadable)
+            report['imported'] += len(sessions)
+            report['rejected'] += len(rejected)
+            for line_number, error, row in rejected:
+                if len(report['errors']) < MAX_REPORTED_ERRORS:
+                    report['errors'].append({'line': line_number, 'error': error})
+                if errors_path is not None:
+                    errors_file.write(orjson.dumps({'line': line_number, 'error': error, 'row': row}) + b'\n')
+            now = time.perf_counter()
+            report['seconds'] = now - start
+            if progress is not None:
+                progress(report)
+            if now - last_logged >= PROGRESS_INTERVAL:
+                last_logged = now
+                logging.info(f"Importing '{path}': {report['rows']} rows read, {report['imported']} imported, "
+                             f"{report['rejected']} rejected ({report['rows'] / report['seconds']:,.0f} rows/s).")
+    report['seconds'] = time.perf_counter() - start
+    return report
@@ -0,0 +1,112 @@
+import sys
+import time
+
+from app.plugins.history.columns import TIMESTAMP_FIELD, from_epoch_us, to_epoch_us
+
+EXERCISE_FIELD = 'type'  # The exercise a session was, e.g. 'run'
+
+
+def now_epoch_us():
+    return time.time_ns() // 1000
+
+
+class WorkoutSession:
+    """One workout session, in less than half the memory of the dict it stands for.
+
+    The timestamp is int epoch microseconds, exercise names are interned so every
+    session of a kind shares one string, and fields other than the usual ones go in
+    `extra`. Reads like the session dict (get, items, [] and `in`), so it can be passed
+    wherever a session dict is expected; from_dict(d).to_dict() == d for any dict d.
+    A field the session doesn't have is simply an unset slot.
+    """
+    __slots__ = (TIMESTAMP_FIELD, 'duration', 'calories_burned', 'exercise', 'extra')
+    FIELDS = (TIMESTAMP_FIELD, 'duration', 'calories_burned', EXERCISE_FIELD)  # Dict keys of the slots above
+
+    @classmethod
+    def from_dict(cls, data, timestamp=None):
+        """Build a session from a session dict, stamped with epoch microseconds `timestamp` if given."""
+        session = cls()
+        extra = None
+        for name, value in data.items():
+            if name == TIMESTAMP_FIELD:
+                if timestamp is not None:  # Stamped by the caller instead
+                    continue
+                try:
+                    epoch = to_epoch_us(value)
+                except (TypeError, ValueError, AttributeError):
+                    epoch = None
+                if epoch is not None:
+                    session.timestamp = epoch
+                    if isinstance(value, str) and from_epoch_us(epoch) == value:
+                        continue
+                # Kept as given too, since it wouldn't read back the same from the epoch alone.
+            elif name == 'duration':
+                session.duration = value
+                continue
+            elif name == 'calories_burned':
+                session.calories_burned = value
+                continue
+            elif name == EXERCISE_FIELD:
+                session.exercise = sys.intern(value) if type(value) is str else value
+                continue
+            if extra is None:
+                extra = {}
+            extra[name] = value
+        if timestamp is not None:
+            session.timestamp = to_epoch_us(timestamp)
+        if extra is not None:
+            session.extra = extra
+        return session
+
+    def to_dict(self):
+        """Return the session as a dict, with the timestamp as the ISO 8601 string sessions have always carried."""
+        data = {}
+        for slot, name in zip(self.__slots__, self.FIELDS):
+            value = getattr(self, slot, self)
+            if value is not self:
+                data[name] = from_epoch_us(value) if name == TIMESTAMP_FIELD else value
+        extra = getattr(self, 'extra', None)
+        if extra:
+            data.update(extra)
+        return data
+
+    def get(self, name, default=None):
+        extra = getattr(self, 'extra', None)
+        if extra and name in extra:
+            return extra[name]
+        if name == EXERCISE_FIELD:
+            return getattr(self, 'exercise', default)
+        return getattr(self, name, default) if name in self.FIELDS else default  # Timestamps as epoch microseconds
+
+    def items(self):
+        """Yield (field, value) like the session dict, except that the timestamp is epoch microseconds."""
+        extra = getattr(self, 'extra', None) or {}
+        for slot, name in zip(self.__slots__, self.FIELDS):
+            value = getattr(self, slot, self)
+            if value is not self and name not in extra:
+                yield name, value
+        yield from extra.items()
+
+    def __getitem__(self, name):
+        value = self.get(name, self)
+        if value is self:
+            raise KeyError(name)
+        return value
+
+    def __contains__(self, name):
+        return self.get(name, self) is not self
+
+    def __eq__(self, other):
+        if isinstance(other, WorkoutSession):
+            return self.to_dict() == other.to_dict()
+        return NotImplemented
+
+    def __repr__(self):
+        return f"WorkoutSession({self.to_dict()!r})"
+
+    def __getstate__(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__ if hasattr(self, slot)}
+
+    def __setstate__(self, state):
+        for slot, value in state.items():
+            setattr(self, slot, value)
@@ -0,0 +1,253 @@
+import sys
+import threading
+
+import orjson
+from sqlalchemy import (JSON, BigInteger, Column, Index, Integer, MetaData, Numeric, String, Table, and_,
+                        create_engine, event, func, select)
+from sqlalchemy.pool import QueuePool
+
+from app.plugins.history.columns import CHUNK_ROWS, TIMESTAMP_FIELD, SessionColumns, from_epoch_us, to_epoch_us
+
+NUMERIC_FIELDS = ('duration', 'calories_burned')  # Stored in their own columns so SQL can sum them
+INSERT_BATCH = 50_000  # Sessions converted and sent per executemany
+
+metadata = MetaData()
+workout_sessions = Table(
+    'workout_sessions', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('user_id', String, nullable=False),
+    Column(TIMESTAMP_FIELD, BigInteger),  # Epoch microseconds
+    # NUMERIC affinity keeps ints as ints and floats as floats.
+    *(Column(name, Numeric(asdecimal=False)) for name in NUMERIC_FIELDS),
+    Column('data', JSON),  # Every other field, and numeric fields that held something else
+    # Carries the numeric fields too, so totals over a time range are read from the index alone.
+    Index('ix_workout_sessions_user_timestamp', 'user_id', TIMESTAMP_FIELD, *NUMERIC_FIELDS),
+)
+
+ROW_COLUMNS = ('user_id', TIMESTAMP_FIELD, *NUMERIC_FIELDS, 'data')
+# Rows go straight to the driver's executemany: SQLAlchemy's per-row parameter processing
+# costs more than SQLite's insert itself.
+INSERT_SQL = (f"INSERT INTO workout_sessions ({', '.join(ROW_COLUMNS)}) "
+              f"VALUES ({', '.join('?' * len(ROW_COLUMNS))})")
+
+engines = {}  # database URL -> Engine, shared by every history stored there
+engines_lock = threading.Lock()
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets readers run while a session is written; NORMAL only syncs at WAL checkpoints,
+    # which still survives the process crashing.
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+def engine_for(url, pool_size=5):
+    """Return the pooled engine for a database URL, creating its tables the first time."""
+    with engines_lock:
+        engine = engines.get(url)
+        if engine is None:
+            engine = create_engine(url, poolclass=QueuePool, pool_size=pool_size, max_overflow=pool_size,
+                                   connect_args={'check_same_thread': False, 'timeout': 30},
+                                   json_serializer=lambda value: orjson.dumps(value).decode(),
+                                   json_deserializer=orjson.loads)
+            event.listen(engine, 'connect', set_sqlite_pragmas)
+            metadata.create_all(engine)
+            engines[url] = engine
+        return engine
+
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class SQLSessions:
+    """Workout sessions of one user, stored in a SQLite database through SQLAlchemy.
+
+    A drop-in for SessionColumns: len, iteration and indexing return session dicts,
+    in timestamp order, and totals() and field_stats() run as SQL aggregates over the
+    (user_id, timestamp) index instead of pulling rows into Python. Sessions are
+    committed as they are added, so the app doesn't journal them.
+    """
+    durable = True
+
+    def __init__(self, url, user_id):
+        self.url = url
+        self.user_id = '' if user_id is None else str(user_id)
+        self.engine = engine_for(url)
+
+    def to_row(self, session, epochs):
+        """Return the INSERT parameters of a session, in ROW_COLUMNS order."""
+        timestamp = None
+        numbers = dict.fromkeys(NUMERIC_FIELDS)
+        data = {}
+        for name, value in session.items():
+            if name == TIMESTAMP_FIELD and value is not None:
+                timestamp = epochs.get(value)
+                if timestamp is None:
+                    timestamp = epochs[value] = to_epoch_us(value)
+            elif name in numbers and is_number(value):
+                numbers[name] = value
+            else:
+                data[name] = value
+        return (self.user_id, timestamp, *numbers.values(), orjson.dumps(data).decode() if data else None)
+
+    @staticmethod
+    def to_session(row):
+        values = row._mapping
+        session = {name: values[name] for name in NUMERIC_FIELDS if values[name] is not None}
+        if row.data:
+            session.update(row.data)
+        if row.timestamp is not None:
+            session[TIMESTAMP_FIELD] = from_epoch_us(row.timestamp)
+        return session
+
+    def where(self, since=None, until=None, **fields):
+        """Return the SQL condition selecting sessions in [since, until) whose fields equal the given values."""
+        conditions = [workout_sessions.c.user_id == self.user_id]
+        if since is not None:
+            conditions.append(workout_sessions.c.timestamp >= to_epoch_us(since))
+        if until is not None:
+            conditions.append(workout_sessions.c.timestamp < to_epoch_us(until))
+        for name, value in fields.items():
+            if name in NUMERIC_FIELDS:
+                conditions.append(workout_sessions.c[name] == value)
+            else:
+                conditions.append(func.json_extract(workout_sessions.c.data, f'$."{name}"') == value)
+        return and_(*conditions)
+
+    def ordered(self, query):
+        return query.order_by(workout_sessions.c.timestamp, workout_sessions.c.id)
+
+    def __len__(self):
+        with self.engine.connect() as connection:
+            return connection.scalar(select(func.count()).where(self.where()))
+
+    def __iter__(self):
+        query = self.ordered(select(workout_sessions).where(self.where()))
+        with self.engine.connect() as connection:
+            for row in connection.execution_options(yield_per=INSERT_BATCH).execute(query):
+                yield self.to_session(row)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            query = self.ordered(select(workout_sessions).where(self.where())).offset(start).limit(max(0, stop - start))
+            with self.engine.connect() as connection:
+                return [self.to_session(row) for row in connection.execute(query)][::step]
+        query = select(workout_sessions).where(self.where())
+        if index < 0:  # Walk the index backwards rather than counting from the start
+            query = query.order_by(workout_sessions.c.timestamp.desc(), workout_sessions.c.id.desc())
+            index = -index - 1
+        else:
+            query = self.ordered(query)
+        with self.engine.connect() as connection:
+            row = connection.execute(query.offset(index).limit(1)).first()
+        if row is None:
+            raise IndexError("session index out of range")
+        return self.to_session(row)
+
+    def between(self, since=None, until=None):
+        """Return the sessions in [since, until), oldest first, read through the (user_id, timestamp) index."""
+        query = self.ordered(select(workout_sessions).where(self.where(since, until)))
+        with self.engine.connect() as connection:
+            return [self.to_session(row) for row in connection.execute(query)]
+
+    def chunks(self, since=None, until=None, size=CHUNK_ROWS, **fields):
+        """Yield the sessions in [since, until) whose fields equal the given values, oldest first.
+
+        Each chunk is a SessionColumns of up to size sessions, fetched as it is reached
+        from one read transaction, so the export sees a consistent snapshot.
+        """
+        names = (TIMESTAMP_FIELD, *NUMERIC_FIELDS)
+        query = self.ordered(select(*(workout_sessions.c[name] for name in names), workout_sessions.c.data)
+                             .where(self.where(since, until, **fields)))
+        with self.engine.connect() as connection:
+            for rows in connection.execution_options(yield_per=size).execute(query).partitions():
+                columns = {}  # name -> (positions, values)
+                for position, row in enumerate(rows):
+                    for name, value in zip(names, row):
+                        if value is not None:
+                            entry = columns.setdefault(name, ([], []))
+                            entry[0].append(position)
+                            entry[1].append(value)
+                    for name, value in (row.data or {}).items():
+                        entry = columns.setdefault(name, ([], []))
+                        entry[0].append(position)
+                        entry[1].append(value)
+                yield SessionColumns.from_fields(len(rows), columns)
+
+    def field_names(self):
+        """Return the name of every field any session has: the columns, then other fields in the order first stored."""
+        keys = ("SELECT field.key FROM workout_sessions, json_each(workout_sessions.data) AS field "
+                "WHERE workout_sessions.user_id = ? GROUP BY field.key ORDER BY min(workout_sessions.id)")
+        with self.engine.connect() as connection:
+            return [TIMESTAMP_FIELD, *NUMERIC_FIELDS,
+                    *(key for key, in connection.exec_driver_sql(keys, (self.user_id,)) if key not in NUMERIC_FIELDS)]
+
+    def watermark(self):
+        """Return the number of sessions and the highest row id; they change whenever a session is stored."""
+        with self.engine.connect() as connection:
+            count, last_id = connection.execute(
+                select(func.count(), func.coalesce(func.max(workout_sessions.c.id), 0)).where(self.where())).one()
+        return count, last_id
+
+    def added_after(self, row_id):
+        """Return the sessions stored after a row id, in the order they were added."""
+        query = select(workout_sessions).where(and_(self.where(), workout_sessions.c.id > row_id)).order_by(
+            workout_sessions.c.id)
+        with self.engine.connect() as connection:
+            return [self.to_session(row) for row in connection.execute(query)]
+
+    def append(self, session):
+        """Store one session dict as a new row."""
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql(INSERT_SQL, self.to_row(session, {}))
+
+    def extend(self, sessions):
+        """Store many session dicts in one transaction, with one executemany per batch."""
+        epochs = {}  # Sessions imported together often share timestamps
+        batch = []
+        with self.engine.begin() as connection:
+            for session in sessions:
+                batch.append(self.to_row(session, epochs))
+                if len(batch) == INSERT_BATCH:
+                    connection.exec_driver_sql(INSERT_SQL, batch)
+                    batch = []
+            if batch:
+                connection.exec_driver_sql(INSERT_SQL, batch)
+
+    def totals(self, names, since=None, until=None, **fields):
+        """Return the number of selected sessions and the sum of each named numeric field over them."""
+        columns = [func.coalesce(func.sum(workout_sessions.c[name]), 0) if name in NUMERIC_FIELDS
+                   else func.coalesce(func.sum(func.json_extract(workout_sessions.c.data, f'$."{name}"')), 0)
+                   for name in names]
+        with self.engine.connect() as connection:
+            count, *sums = connection.execute(select(func.count(), *columns).where(self.where(since, until, **fields))).one()
+        return count, sums
+
+    def field_stats(self, name):
+        """Return count, sum, min, max, mean and sum of squared deviations of a numeric field, or None."""
+        if name not in NUMERIC_FIELDS:
+            return None
+        column = workout_sessions.c[name]
+        condition = and_(self.where(), column.isnot(None))
+        with self.engine.connect() as connection:
+            count, total, minimum, maximum = connection.execute(
+                select(func.count(column), func.sum(column), func.min(column), func.max(column)).where(condition)).one()
+            if not count:
+                return {'count': 0, 'sum': 0, 'min': None, 'max': None, 'mean': 0.0, 'm2': 0.0}
+            mean = total / count
+            # A second pass around the mean; SQLite has no variance function and E[x²] - E[x]² loses precision.
+            m2 = connection.scalar(select(func.sum((column - mean) * (column - mean))).where(condition))
+        return {'count': count, 'sum': total, 'min': minimum, 'max': maximum, 'mean': mean, 'm2': float(m2)}
+
+    def memory_size(self):
+        return sys.getsizeof(self)
+
+    def __getstate__(self):
+        return {'url': self.url, 'user_id': self.user_id}
+
+    def __setstate__(self, state):
+        self.__init__(state['url'], state['user_id'])
@@ -0,0 +1,198 @@
+import os
+import sys
+import hashlib
+import itertools
+
+import numpy as np
+
+from app.plugins.history.aggregates import FieldStats
+from app.plugins.history.binary import map_sessions, write_sessions
+from app.plugins.history.columns import (CHUNK_ROWS, TIMESTAMP_FIELD, NumericColumn, SessionColumns, TimestampColumn,
+                                         to_epoch_us)
+
+SEGMENT_SUFFIX = '.fit'
+
+
+def cold_directory(root, user_id):
+    """Return the directory of a user's cold segments, sharded like the session manager's spill files."""
+    digest = hashlib.sha1(str(user_id).encode('utf-8')).hexdigest()
+    return os.path.join(root, digest[:2], digest)
+
+
+def timed_rows(columns, since=None, until=None):
+    """Return the rows of a SessionColumns with a timestamp in [since, until), in row order."""
+    column = columns.columns.get(TIMESTAMP_FIELD)
+    if column is None:
+        return np.zeros(0, dtype=np.int64)
+    return np.flatnonzero(columns.mask(since, until) & column.present[:len(columns)])
+
+
+class Segment:
+    """Sessions moved out of memory into a binary session file, mapped back in when they are read.
+
+    The sessions are written in timestamp order, so a time range is found by binary
+    search and only its pages are read.
+    """
+    def __init__(self, path, columns):
+        write_sessions(columns, path)
+        times = columns.values(TIMESTAMP_FIELD)
+        self.path = path
+        self.length = len(columns)
+        self.first = int(times.min())  # Epoch microseconds of the oldest and newest session
+        self.last = int(times.max())
+        self.mapped = None
+
+    def overlaps(self, since=None, until=None):
+        return ((since is None or self.last >= to_epoch_us(since)) and
+                (until is None or self.first < to_epoch_us(until)))
+
+    def columns(self):
+        """Return the sessions as SessionColumns over the mapped file; pages are read as they are touched."""
+        if self.mapped is None:
+            self.mapped = map_sessions(self.path)
+        return self.mapped
+
+    def totals(self, names, since, until, fields):
+        """SessionColumns.totals() over just the rows whose timestamps fall in [since, until)."""
+        columns = self.columns()
+        times = columns.columns[TIMESTAMP_FIELD].values
+        start = 0 if since is None else int(np.searchsorted(times, to_epoch_us(since), side='left'))
+        stop = self.length if until is None else int(np.searchsorted(times, to_epoch_us(until), side='left'))
+        if start >= stop:
+            return 0, [0] * len(names)
+        mask = columns.range_mask(start, stop, None, None, fields)
+        sums = []
+        for name in names:
+            column = columns.columns.get(name)
+            if isinstance(column, NumericColumn):
+                sums.append(column.values[start:stop].sum(where=mask).item())
+            else:  # Absent, or values of mixed types: sum as the columns do
+                selected = np.zeros(self.length, dtype=bool)
+                selected[start:stop] = mask
+                sums.append(columns.sum(name, selected))
+        return int(mask.sum()), sums
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['mapped'] = None
+        return state
+
+
+class TieredSessions:
+    """Workout sessions split between a hot tier in memory and cold segments on disk.
+
+    A drop-in for SessionColumns, which the hot tier is: len, iteration and indexing
+    see the cold segments, oldest first, then the hot sessions, and totals(), chunks()
+    and between() read every tier. compact() moves the hot sessions older than a time
+    into a new segment, so memory holds only the sessions inside the hot window, plus
+    any added late with an older timestamp until the next compaction. Segments are
+    never changed once written and are named by their position, so a snapshot taken
+    before a compaction still reads correctly; the next compaction overwrites the file
+    it left behind.
+    """
+    durable = False  # The hot tier lives in memory; the app journals what is added
+
+    def __init__(self, directory, hot=None):
+        self.directory = directory
+        self.hot = SessionColumns() if hot is None else hot
+        self.segments = []  # Segment per compaction, oldest first
+
+    def tiers(self, since=None, until=None):
+        """Yield the SessionColumns of every tier that may hold sessions in [since, until), cold first."""
+        for segment in self.segments:
+            if segment.overlaps(since, until):
+                yield segment.columns()
+        yield self.hot
+
+    def cold_length(self):
+        return sum(segment.length for segment in self.segments)
+
+    def __len__(self):
+        return self.cold_length() + len(self.hot)
+
+    def __iter__(self):
+        for columns in self.tiers():
+            yield from columns
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            return list(itertools.islice(self, start, stop, step)) if step > 0 else \
+                [self[i] for i in range(start, stop, step)]
+        if index < 0:
+            index += len(self)
+        for columns in self.tiers():
+            if 0 <= index < len(columns):
+                return columns.row(index)
+            index -= len(columns)
+        raise IndexError("session index out of range")
+
+    def append(self, session):
+        self.hot.append(session)
+
+    def extend(self, sessions):
+        self.hot.extend(sessions)
+
+    def between(self, since=None, until=None):
+        """Return the sessions in [since, until), oldest first, paging in only the segments the range overlaps."""
+        parts = [(columns, timed_rows(columns, since, until)) for columns in self.tiers(since, until)]
+        times = np.concatenate([columns.values(TIMESTAMP_FIELD)[rows] if len(rows) else np.zeros(0, dtype=np.int64)
+                                for columns, rows in parts])
+        sessions = [columns.row(row) for columns, rows in parts for row in rows.tolist()]
+        return [sessions[i] for i in np.argsort(times, kind='stable').tolist()]
+
+    def chunks(self, since=None, until=None, size=CHUNK_ROWS, **fields):
+        """Yield the sessions in [since, until) whose fields equal the given values, cold segments first."""
+        for columns in self.tiers(since, until):
+            yield from columns.chunks(since, until, size, **fields)
+
+    def field_names(self):
+        return list(dict.fromkeys(itertools.chain.from_iterable(
+            columns.field_names() for columns in self.tiers())))
+
+    def totals(self, names, since=None, until=None, **fields):
+        """Return the number of selected sessions in every tier and the sum of each named numeric field over them."""
+        count, sums = self.cold_totals(names, since, until, **fields)
+        hot_count, hot_sums = self.hot.totals(names, since, until, **fields)
+        return count + hot_count, [total + value for total, value in zip(sums, hot_sums)]
+
+    def cold_totals(self, names, since=None, until=None, **fields):
+        """totals() of the cold segments alone, e.g. for the partial days of a range the timeline no longer indexes."""
+        count, sums = 0, [0] * len(names)
+        for segment in self.segments:
+            if segment.overlaps(since, until):
+                segment_count, segment_sums = segment.totals(names, since, until, fields)
+                count += segment_count
+                sums = [total + value for total, value in zip(sums, segment_sums)]
+        return count, sums
+
+    def field_stats(self, name):
+        """Return the statistics of a numeric field over every tier, merged pairwise, or None."""
+        merged = FieldStats(name)
+        for columns in self.tiers():
+            stats = columns.field_stats(name)
+            if stats is None:
+                return None
+            merged.merge(stats)
+        return {'count': merged.count, 'sum': merged.total, 'min': merged.minimum, 'max': merged.maximum,
+                'mean': merged.mean, 'm2': merged.m2}
+
+    def compact(self, before):
+        """Move the hot sessions with a timestamp before a time into a new cold segment; returns how many moved."""
+        column = self.hot.columns.get(TIMESTAMP_FIELD)
+        if not isinstance(column, TimestampColumn):  # No timestamps, or some that aren't epoch microseconds
+            return 0
+        length = len(self.hot)
+        old = column.present[:length] & (column.values[:length] < to_epoch_us(before))
+        rows = np.flatnonzero(old)
+        if not len(rows):
+            return 0
+        rows = rows[np.argsort(column.values[rows], kind='stable')]
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{len(self.segments):06d}{SEGMENT_SUFFIX}")
+        self.segments.append(Segment(path, self.hot.select(rows)))  # Written before the hot tier lets go of them
+        self.hot = self.hot.select(np.flatnonzero(~old))
+        return len(rows)
+
+    def memory_size(self):
+        return sys.getsizeof(self) + self.hot.memory_size() + sum(sys.getsizeof(segment) for segment in self.segments)
@@ -0,0 +1,347 @@
+import sys
+import operator
+import itertools
+import functools
+from bisect import bisect_left, insort
+from datetime import date, datetime, time, timedelta, timezone
+
+import numpy as np
+
+from app.plugins.history.columns import (DAY_US, HOUR_US, MICROSECOND, STORED_BATCH, TIMESTAMP_FIELD, NumericColumn,
+                                         SessionColumns, TimestampColumn, resized, to_epoch_us)
+from app.plugins.history.training import LOAD_FIELD, TrainingLoad
+
+SUMMED_FIELDS = ('duration', 'calories_burned')
+PERIODS = ('day', 'week', 'month')
+EPOCH_DATE = date(1970, 1, 1)
+LOAD_SUM = SUMMED_FIELDS.index(LOAD_FIELD)  # Sum the training load is kept from
+
+
+@functools.lru_cache(maxsize=1 << 17)
+def utc_offset_us(hour):
+    """Local UTC offset in microseconds during an hour since the epoch; it only changes on the hour."""
+    return datetime.fromtimestamp(hour * 3600, timezone.utc).astimezone().utcoffset() // MICROSECOND
+
+
+def local_days(times):
+    """Return the local calendar day, as days since 1970-01-01, of each epoch-microsecond timestamp."""
+    hours, inverse = np.unique(times // HOUR_US, return_inverse=True)
+    offsets = np.array([utc_offset_us(hour) for hour in hours.tolist()], dtype=np.int64)
+    return (times + offsets[inverse]) // DAY_US
+
+
+def period_starts(days, period):
+    """Return the first day of the day, week (from Monday) or month that each day falls in."""
+    if period == 'day':
+        return days
+    if period == 'week':
+        return days - (days + 3) % 7  # 1970-01-01 was a Thursday
+    if period == 'month':
+        return days.astype('datetime64[D]').astype('datetime64[M]').astype('datetime64[D]').astype(np.int64)
+    raise ValueError(f"Unknown period '{period}'; expected one of {', '.join(PERIODS)}.")
+
+
+def period_start(day, period):
+    """period_starts() for a single day."""
+    if period == 'month':
+        return day - (EPOCH_DATE + timedelta(days=day)).day + 1
+    return period_starts(day, period)
+
+
+def day_of(value):
+    """Return the local day of a timestamp, and whether it falls exactly at midnight."""
+    epoch = to_epoch_us(value)
+    day = int(local_days(np.array([epoch]))[0])
+    return day, epoch == midnight(day)
+
+
+def midnight(day):
+    return to_epoch_us(datetime.combine(EPOCH_DATE + timedelta(days=day), time()))
+
+
+def month_after(day):
+    start = EPOCH_DATE + timedelta(days=day)
+    following = date(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return (following - EPOCH_DATE).days
+
+
+def numbers(values):
+    """Return values as an int64 array, or float64 if any is a float; anything that isn't a number counts as 0."""
+    array = np.asarray([value if NumericColumn.accepts(value) else 0 for value in values])
+    return array if array.dtype.kind in 'if' else np.zeros(len(values), dtype=np.int64)
+
+
+class Rollup:
+    """Session count and sums of SUMMED_FIELDS per day, week or month, keyed by the period's first day."""
+    def __init__(self, period):
+        self.period = period
+        self.starts = []  # Sorted first days of the periods that have sessions
+        self.buckets = {}  # first day -> [sessions, *sums]
+
+    def add(self, days, sums):
+        starts, inverse = np.unique(period_starts(days, self.period), return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(starts))
+        totals = []
+        for values in sums:
+            total = np.zeros(len(starts), dtype=values.dtype)
+            np.add.at(total, inverse, values)
+            totals.append(total.tolist())
+        for start, *bucket in zip(starts.tolist(), counts.tolist(), *totals):
+            self.add_bucket(start, bucket)
+
+    def add_one(self, day, bucket):
+        self.add_bucket(period_start(day, self.period), bucket)
+
+    def add_bucket(self, start, bucket):
+        existing = self.buckets.get(start)
+        if existing is None:
+            insort(self.starts, start)  # Only sessions older than the rest land before the end
+            self.buckets[start] = bucket
+        else:
+            for i, value in enumerate(bucket):
+                existing[i] += value
+
+    def between(self, first_day, last_day):
+        """Yield (first day, bucket) of the periods starting in [first_day, last_day)."""
+        for start in itertools.islice(self.starts, bisect_left(self.starts, first_day),
+                                      bisect_left(self.starts, last_day)):
+            yield start, self.buckets[start]
+
+
+class Timeline:
+    """Timestamps of a history's sessions in sorted order, with daily, weekly and monthly rollups.
+
+    Kept up to date as sessions are added, like the running aggregates, including
+    sessions older than ones already added. Totals over a time range take the
+    whole months and days inside it from the rollups and only the partial days at
+    its ends from the sorted timestamps, so they cost O(log n + periods) however
+    many sessions the range holds. Row numbers are the sessions' positions in the
+    store, counting sessions without a timestamp, which the timeline skips.
+    Sessions moved to a store's cold tier leave the index through compact() but
+    stay in the rollups.
+    """
+    def __init__(self):
+        self.length = 0  # Sessions in the index
+        self.rows_seen = 0  # Sessions added, with or without a timestamp
+        self.times = np.zeros(0, dtype=np.int64)  # Sorted; capacity beyond length is spare
+        self.rows = np.zeros(0, dtype=np.int64)
+        self.sums = [np.zeros(0, dtype=np.int64) for _ in SUMMED_FIELDS]
+        self.rollups = {period: Rollup(period) for period in PERIODS}
+        self.load = TrainingLoad()  # ATL and CTL, updated as sessions are added
+        self.compacted_until = None  # Epoch microseconds before which sessions may be in the rollups only
+
+    def nbytes(self):
+        """Approximate bytes held by the index and rollups, for the session manager's memory budget."""
+        return (self.times.nbytes + self.rows.nbytes + sum(values.nbytes for values in self.sums) +
+                sum(sys.getsizeof(rollup.starts) + sys.getsizeof(rollup.buckets) +
+                    sum(map(sys.getsizeof, rollup.buckets.values())) for rollup in self.rollups.values()))
+
+    def add(self, session):
+        """Index one session; in timestamp order this skips the batch path's sorting and merging."""
+        timestamp = session.get(TIMESTAMP_FIELD)
+        if timestamp is None:
+            self.rows_seen += 1
+            return
+        epoch = to_epoch_us(timestamp)
+        values = [value if NumericColumn.accepts(value) else 0 for value in (session.get(field) for field in SUMMED_FIELDS)]
+        if (self.length and epoch < self.times[self.length - 1]) or any(
+                isinstance(value, (float, np.floating)) and stored.dtype.kind != 'f'
+                for value, stored in zip(values, self.sums)):
+            self.add_many([session])
+            return
+        if self.length == len(self.times):
+            self.reserve(self.length + 1)
+        self.times[self.length] = epoch
+        self.rows[self.length] = self.rows_seen
+        for stored, value in zip(self.sums, values):
+            stored[self.length] = value
+        self.length += 1
+        self.rows_seen += 1
+        day = (epoch + utc_offset_us(epoch // HOUR_US)) // DAY_US
+        for rollup in self.rollups.values():
+            rollup.add_one(day, [1, *values])
+        self.load.add(day, values[LOAD_SUM])
+
+    def reserve(self, length):
+        capacity = max(16, 2 * len(self.times), length)
+        self.times, self.rows = resized(self.times, capacity), resized(self.rows, capacity)
+        self.sums = [resized(values, capacity) for values in self.sums]
+
+    def add_many(self, sessions):
+        epochs = {}  # Sessions added together often share timestamps
+        times, rows, values = [], [], [[] for _ in SUMMED_FIELDS]
+        for row, session in enumerate(sessions, self.rows_seen):
+            timestamp = session.get(TIMESTAMP_FIELD)
+            if timestamp is None:
+                continue
+            epoch = epochs.get(timestamp)
+            if epoch is None:
+                epoch = epochs[timestamp] = to_epoch_us(timestamp)
+            times.append(epoch)
+            rows.append(row)
+            for field_values, field in zip(values, SUMMED_FIELDS):
+                field_values.append(session.get(field))
+        self.rows_seen += len(sessions)
+        if times:
+            self.insert(np.array(times, dtype=np.int64), np.array(rows, dtype=np.int64),
+                        [numbers(field_values) for field_values in values])
+
+    def add_stored(self, history, start=0):
+        """Index the sessions already in a store from row start on, straight from its columns where it has them."""
+        column = history.columns.get(TIMESTAMP_FIELD) if isinstance(history, SessionColumns) else None
+        if column is not None and not isinstance(column, TimestampColumn):  # Timestamps of mixed types
+            history = history[start:]
+        if not isinstance(history, SessionColumns):  # Sessions added before start are in rows_seen already
+            sessions = iter(history)
+            while batch := list(itertools.islice(sessions, STORED_BATCH)):
+                self.add_many(batch)
+            return
+        if column is not None:
+            rows = start + np.flatnonzero(column.present[start:len(history)])
+            sums = []
+            for field in SUMMED_FIELDS:
+                field_column = history.columns.get(field)
+                if field_column is None:
+                    sums.append(np.zeros(len(rows), dtype=np.int64))
+                elif type(field_column) is NumericColumn:  # Absent rows hold zero
+                    sums.append(np.asarray(field_column.values[rows]))
+                else:
+                    sums.append(numbers([field_column.get(row) if field_column.present[row] else 0 for row in rows]))
+            self.insert(np.asarray(column.values[rows]), rows, sums)
+        self.rows_seen = len(history)
+
+    def insert(self, times, rows, sums):
+        if not len(times):
+            return
+        order = np.argsort(times, kind='stable')
+        times, rows, sums = times[order], rows[order], [values[order] for values in sums]
+        length = self.length + len(times)
+        for i, values in enumerate(sums):
+            if values.dtype.kind == 'f' and self.sums[i].dtype.kind != 'f':
+                self.sums[i] = self.sums[i].astype(np.float64)
+        if not self.length or times[0] >= self.times[self.length - 1]:  # In order: append
+            if length > len(self.times):
+                self.reserve(length)
+            self.times[self.length:length] = times
+            self.rows[self.length:length] = rows
+            for stored, values in zip(self.sums, sums):
+                stored[self.length:length] = values
+        else:  # Older than the newest session: merge, moving everything after it along
+            positions = np.searchsorted(self.times[:self.length], times, side='right')
+            self.times = np.insert(self.times[:self.length], positions, times)
+            self.rows = np.insert(self.rows[:self.length], positions, rows)
+            self.sums = [np.insert(stored[:self.length], positions, values) for stored, values in zip(self.sums, sums)]
+        self.length = length
+        days = local_days(times)
+        for rollup in self.rollups.values():
+            rollup.add(days, sums)
+        self.load.add_many(days, sums[LOAD_SUM])
+
+    def span(self, since=None, until=None):
+        """Return the index positions [start, end) of the sessions in [since, until)."""
+        times = self.times[:self.length]
+        start = 0 if since is None else int(np.searchsorted(times, to_epoch_us(since), side='left'))
+        end = self.length if until is None else int(np.searchsorted(times, to_epoch_us(until), side='left'))
+        return start, max(start, end)
+
+    def rows_between(self, since=None, until=None):
+        """Return the rows of the sessions in [since, until), oldest first."""
+        start, end = self.span(since, until)
+        return self.rows[start:end]
+
+    def raw_totals(self, start, end):
+        return [end - start] + [values[start:end].sum().item() for values in self.sums]
+
+    def compact(self, before):
+        """Drop the sessions before a time from the index, keeping them in the rollups; returns their rows.
+
+        Call once the store has moved those sessions to its cold tier: totals() then
+        reads partial days before the time from the store.
+        """
+        drop = int(np.searchsorted(self.times[:self.length], to_epoch_us(before), side='left'))
+        rows = self.rows[:drop].copy()
+        self.times, self.rows = self.times[drop:self.length].copy(), self.rows[drop:self.length].copy()
+        self.sums = [values[drop:self.length].copy() for values in self.sums]
+        self.length -= drop
+        self.compacted_until = max(to_epoch_us(before), self.compacted_until or 0)
+        return rows
+
+    def partial_totals(self, since, until, cold):
+        """raw_totals() of the sessions in [since, until), with those compacted out of the index from cold()."""
+        totals = self.raw_totals(*self.span(since, until))
+        if cold is not None and self.compacted_until is not None and (
+                since is None or to_epoch_us(since) < self.compacted_until):
+            count, sums = cold(SUMMED_FIELDS, since, until)
+            totals = [total + value for total, value in zip(totals, [count, *sums])]
+        return totals
+
+    def totals(self, since=None, until=None, cold=None):
+        """Return [sessions, *sums of SUMMED_FIELDS] over the sessions in [since, until).
+
+        cold(names, since, until), like a store's totals(), sums the sessions compact()
+        dropped from the index; it is only called for the partial days at the ends of
+        the range.
+        """
+        start, end = self.span(since, until)
+        days = self.rollups['day'].starts
+        if not days or (start == end and self.compacted_until is None):
+            return [0] * (len(SUMMED_FIELDS) + 1)
+        # Whole days from first_day up to last_day come from the rollups.
+        first_day, at_midnight = (days[0], True) if since is None else day_of(since)
+        first_day += 0 if at_midnight else 1
+        last_day = days[-1] + 1 if until is None else day_of(until)[0]
+        if first_day >= last_day:
+            return self.partial_totals(since, until, cold)
+        totals = [0] * (len(SUMMED_FIELDS) + 1)
+        if since is not None:
+            totals = self.partial_totals(since, midnight(first_day), cold)
+        if until is not None:
+            for i, value in enumerate(self.partial_totals(midnight(last_day), until, cold)):
+                totals[i] += value
+        whole_months = (first_day if (EPOCH_DATE + timedelta(days=first_day)).day == 1 else month_after(first_day),
+                        int(period_starts(np.array([last_day]), 'month')[0]))
+        if whole_months[0] < whole_months[1]:
+            parts = [('day', first_day, whole_months[0]), ('month', *whole_months), ('day', whole_months[1], last_day)]
+        else:
+            parts = [('day', first_day, last_day)]
+        for period, first, last in parts:
+            for _, bucket in self.rollups[period].between(first, last):
+                for i, value in enumerate(bucket):
+                    totals[i] += value
+        return totals
+
+    def daily(self, field=LOAD_FIELD):
+        """Return the first day with sessions and the sum of a field on each day from it to the last, zero if none."""
+        rollup = self.rollups['day']
+        if not rollup.starts:
+            return 0, np.zeros(0)
+        days = np.fromiter(rollup.starts, dtype=np.int64, count=len(rollup.starts))
+        buckets = map(rollup.buckets.__getitem__, rollup.starts)
+        sums = np.zeros(days[-1] - days[0] + 1)
+        sums[days - days[0]] = np.fromiter(map(operator.itemgetter(SUMMED_FIELDS.index(field) + 1), buckets),
+                                           dtype=np.float64, count=len(days))
+        return int(days[0]), sums
+
+    def periods(self, period, since=None, until=None):
+        """Yield (first day, [sessions, *sums]) of every period with sessions, in order.
+
+        With since or until only periods starting in [since's period, until) are included.
+        """
+        rollup = self.rollups.get(period)
+        if rollup is None:
+            raise ValueError(f"Unknown period '{period}'; expected one of {', '.join(PERIODS)}.")
+        first = -2 ** 62 if since is None else int(period_starts(np.array([day_of(since)[0]]), period)[0])
+        last = 2 ** 62
+        if until is not None:
+            last, at_midnight = day_of(until)
+            last += 0 if at_midnight else 1
+        for start, bucket in rollup.between(first, last):
+            yield EPOCH_DATE + timedelta(days=start), list(bucket)
+
+    def __setstate__(self, state):
+        state.setdefault('compacted_until', None)
+        self.__dict__.update(state)
+        if 'load' not in state:  # Pickled before the training load was kept: work it out from the daily sums
+            self.load = TrainingLoad()
+            first_day, loads = self.daily()
+            self.load.add_many(first_day + np.arange(len(loads)), loads)
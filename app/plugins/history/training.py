@@ -0,0 +1,114 @@
+import numpy as np
+
+# Training load, after the fitness-fatigue model: each day's load (LOAD_FIELD summed over the
+# day's sessions) feeds two exponentially weighted averages, updated every day as
+#     average += (load - average) / days
+# Acute training load (ATL, fatigue) uses ATL_DAYS and chronic training load (CTL, fitness)
+# CTL_DAYS. Training stress balance (TSB, form) on a day is CTL - ATL at the end of the day before.
+LOAD_FIELD = 'duration'  # Minutes trained, for want of a per-session training stress score
+ATL_DAYS = 7
+CTL_DAYS = 42
+BLOCK_DAYS = 256  # Days ewma() solves at a time; 1 / (1 - 1 / ATL_DAYS) ** BLOCK_DAYS stays well inside float64
+
+
+def ewma(loads, days, initial=0.0):
+    """Run average += (load - average) / days along the last axis of loads, from average = initial.
+
+    Returns the average at the end of every day. This is the recurrence that
+    scipy.signal.lfilter([1 / days], [1, 1 / days - 1], loads) computes; here it is
+    solved in closed form a block of days at a time,
+        average[i] = decay ** (i + 1) * (initial + sum(loads[j] / decay ** (j + 1) for j <= i) / days)
+    with cumsum, so a 2-D array of many histories' daily loads is done in one pass.
+    """
+    loads = np.asarray(loads, dtype=np.float64)
+    averages = np.empty_like(loads)
+    state = np.array(np.broadcast_to(initial, loads.shape[:-1]), dtype=np.float64)
+    decay = 1 - 1 / days
+    powers = decay ** np.arange(1, BLOCK_DAYS + 1)
+    for start in range(0, loads.shape[-1], BLOCK_DAYS):
+        block = loads[..., start:start + BLOCK_DAYS]
+        block_powers = powers[:block.shape[-1]]
+        averages[..., start:start + BLOCK_DAYS] = block_powers * (
+            state[..., None] + np.cumsum(block / block_powers, axis=-1) / days)
+        state = averages[..., start + block.shape[-1] - 1]
+    return averages
+
+
+def training_loads(loads):
+    """Return ATL, CTL and TSB at the end of every day from daily loads (days along the last axis), backfilled from zero."""
+    atl, ctl = ewma(loads, ATL_DAYS), ewma(loads, CTL_DAYS)
+    tsb = np.zeros_like(atl)
+    tsb[..., 1:] = ctl[..., :-1] - atl[..., :-1]
+    return atl, ctl, tsb
+
+
+def daily_matrix(dailies, first_day, last_day):
+    """Stack (first day, daily loads) of many histories, as Timeline.daily() returns them, into one array.
+
+    Row i holds history i's loads on the days [first_day, last_day), zero on days it
+    has none; days before first_day are dropped.
+    """
+    matrix = np.zeros((len(dailies), max(0, last_day - first_day)))
+    for row, (start, loads) in zip(matrix, dailies):
+        skip = max(0, first_day - start)
+        loads = loads[skip:last_day - start]
+        row[start + skip - first_day:start + skip - first_day + len(loads)] = loads
+    return matrix
+
+
+class TrainingLoad:
+    """ATL and CTL as of the last day with a session, updated in O(1) as each session is added.
+
+    Both averages are linear in the daily loads, so a session adds its load / days,
+    decayed by the days since it, to the average however old it is; days without
+    sessions only decay it.
+    """
+    def __init__(self):
+        self.day = None  # Last day with a session
+        self.day_load = 0.0  # Load on that day so far
+        self.atl = 0.0  # At the end of self.day
+        self.ctl = 0.0
+
+    def advance(self, day):
+        if self.day is None:
+            self.day = day
+        elif day > self.day:
+            self.atl *= (1 - 1 / ATL_DAYS) ** (day - self.day)
+            self.ctl *= (1 - 1 / CTL_DAYS) ** (day - self.day)
+            self.day = day
+            self.day_load = 0.0
+
+    def add(self, day, load):
+        """Add one session's load on a day; sessions may come in any order."""
+        self.advance(day)
+        age = self.day - day
+        self.atl += load / ATL_DAYS * (1 - 1 / ATL_DAYS) ** age
+        self.ctl += load / CTL_DAYS * (1 - 1 / CTL_DAYS) ** age
+        if not age:
+            self.day_load += load
+
+    def add_many(self, days, loads):
+        """Add the loads of many sessions, days and loads as arrays, in one step."""
+        if not len(days):
+            return
+        self.advance(int(days.max()))
+        ages = self.day - days
+        loads = np.asarray(loads, dtype=np.float64)
+        self.atl += float((loads * (1 - 1 / ATL_DAYS) ** ages).sum()) / ATL_DAYS
+        self.ctl += float((loads * (1 - 1 / CTL_DAYS) ** ages).sum()) / CTL_DAYS
+        self.day_load += float(loads[ages == 0].sum())
+
+    def value(self, day):
+        """Return (ATL, CTL, TSB) on a day no earlier than the last with a session; ATL and CTL as of its end."""
+        if self.day is None:
+            return 0.0, 0.0, 0.0
+        if day > self.day:  # Form comes from the end of the day before, which had no sessions if after self.day
+            before = day - 1 - self.day
+            atl = self.atl * (1 - 1 / ATL_DAYS) ** before
+            ctl = self.ctl * (1 - 1 / CTL_DAYS) ** before
+            tsb = ctl - atl
+            return atl * (1 - 1 / ATL_DAYS), ctl * (1 - 1 / CTL_DAYS), tsb
+        # The end of the day before: take the day's own load back out of the averages
+        atl = (self.atl - self.day_load / ATL_DAYS) / (1 - 1 / ATL_DAYS)
+        ctl = (self.ctl - self.day_load / CTL_DAYS) / (1 - 1 / CTL_DAYS)
+        return self.atl, self.ctl, ctl - atl
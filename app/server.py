@@ -0,0 +1,86 @@
+import io
+import os
+import socket
+import logging
+import contextlib
+import socketserver
+
+from app.sessions import acting_as
+
+# Marks the end of a response; the byte after it is the exit status ('0' on success).
+STATUS_MARKER = b'\x00'
+# Starts an optional first request line naming the user the command runs for.
+USER_MARKER = b'\x01'
+
+
+def default_socket_path(settings):
+    """Return the socket path from APP_SOCKET, falling back to the cache directory."""
+    return settings.get('APP_SOCKET') or os.path.join(settings.get('CACHE_DIR', 'cache'), 'app.sock')
+
+
+class CommandRequestHandler(socketserver.StreamRequestHandler):
+    """Runs one command line per connection and streams the command's output back.
+
+    The command line may be preceded by a USER_MARKER line naming the user it runs
+    for; without one, per-user commands act for the server's USER_ID.
+    """
+
+    def handle(self):
+        raw_input = self.rfile.readline()
+        user_id = None
+        if raw_input.startswith(USER_MARKER):
+            user_id = raw_input[1:].decode('utf-8').strip()
+            raw_input = self.rfile.readline()
+        if not raw_input:  # Connected and closed without a command, e.g. a liveness probe
+            return
+        cmd_input = raw_input.decode('utf-8').strip()
+        stream = io.TextIOWrapper(self.wfile, encoding='utf-8', line_buffering=True, write_through=True)
+        log_handler = logging.StreamHandler(stream)
+        log_handler.setLevel(logging.WARNING)
+        log_handler.setFormatter(logging.Formatter('%(levelname)s - %(message)s'))
+        root_logger = logging.getLogger()
+        root_logger.addHandler(log_handler)
+        disconnected = False
+        try:
+            with contextlib.redirect_stdout(stream), acting_as(user_id or None):
+                succeeded = self.server.app.dispatch(cmd_input)
+            stream.flush()
+            self.wfile.write(STATUS_MARKER + (b'0' if succeeded else b'1'))
+        except BrokenPipeError:
+            disconnected = True
+        finally:
+            root_logger.removeHandler(log_handler)
+            stream.detach()
+        if disconnected:
+            logging.warning(f"Client disconnected before '{cmd_input}' finished.")
+
+
+class CommandServer(socketserver.UnixStreamServer):
+    """Unix socket server that keeps a loaded App warm between client invocations.
+
+    Requests are handled one at a time so commands see the same sequential
+    behaviour they have in the REPL.
+    """
+
+    def __init__(self, socket_path, app):
+        self.app = app
+        self.remove_stale_socket(socket_path)
+        super().__init__(socket_path, CommandRequestHandler)
+
+    @staticmethod
+    def remove_stale_socket(socket_path):
+        """Delete a socket file left behind by a server that is no longer running."""
+        if not os.path.exists(socket_path):
+            return
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(socket_path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                os.unlink(socket_path)
+                return
+        raise OSError(f"Another server is already listening on '{socket_path}'.")
+
+    def server_close(self):
+        super().server_close()
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.server_address)
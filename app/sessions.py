@@ -0,0 +1,302 @@
+import os
+import pickle
+import hashlib
+import functools
+import logging
+import threading
+import contextlib
+import contextvars
+from collections import OrderedDict
+
+from app.commands import Command
+
+# The user whose state per-user commands act on; set by the server for each request.
+current_user = contextvars.ContextVar('current_user', default=None)
+# Command attributes a per-user command's proxy takes over from the command class: every setting Command
+# declares, so new ones (process pool, persistent cache, ...) can't be missed. Methods go through __getattr__.
+PROXIED_ATTRIBUTES = tuple(name for name, value in vars(Command).items()
+                           if not name.startswith('_') and not callable(value))
+DEFAULT_SESSION_SIZE = 4096  # Bytes assumed for a session whose class has no memory_size()
+
+
+@contextlib.contextmanager
+def acting_as(user_id):
+    """Run the enclosed commands on behalf of user_id."""
+    token = current_user.set(user_id)
+    try:
+        yield
+    finally:
+        current_user.reset(token)
+
+
+class SessionManager:
+    """Holds one instance of a per-user command for every user, within a memory budget.
+
+    Recently used sessions stay in memory; when their estimated size exceeds the
+    budget the least recently used idle ones are pickled to `storage_dir` and
+    dropped, then loaded again the next time their user is seen. Sessions in use
+    are never evicted, and sessions unchanged since they were loaded are dropped
+    without being written.
+    """
+    def __init__(self, factory, storage_dir, memory_budget, prepare=None):
+        self.factory = factory  # Callable(user_id) that creates an empty session
+        self.prepare = prepare  # Optional callable(session) run on every session created or loaded
+        self.storage_dir = storage_dir
+        self.memory_budget = memory_budget  # Bytes of estimated session state to keep in memory
+        self.sessions = OrderedDict()  # user id -> session, least recently used first
+        self.sizes = {}  # user id -> estimated bytes
+        self.sized_states = {}  # user id -> cache_state() the size was estimated at
+        self.saved_states = {}  # user id -> cache_state() when last loaded or saved
+        self.users = {}  # user id -> number of callers currently using the session
+        self.writing = {}  # user id -> evicted session whose file is being written
+        self.memory_used = 0
+        self.lock = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+
+    def path_for(self, user_id):
+        """Return the spill file of a user, sharded so no directory holds too many files."""
+        digest = hashlib.sha1(str(user_id).encode('utf-8')).hexdigest()
+        return os.path.join(self.storage_dir, digest[:2], f"{digest}.pickle")
+
+    @staticmethod
+    def estimate_size(session):
+        memory_size = getattr(session, 'memory_size', None)
+        return memory_size() if memory_size is not None else DEFAULT_SESSION_SIZE
+
+    @contextlib.contextmanager
+    def session(self, user_id):
+        """Yield a user's session, loading or creating it, and keep it in memory until the block ends."""
+        session = self.acquire(user_id)
+        try:
+            yield session
+        finally:
+            self.release(user_id, session)
+
+    def acquire(self, user_id):
+        with self.lock:
+            session = self.sessions.get(user_id)
+            if session is None and user_id in self.writing:  # Evicted a moment ago; take it back
+                session = self.writing[user_id]
+                self.track(user_id, session, saved_state=None)
+            if session is not None:
+                self.sessions.move_to_end(user_id)
+                self.users[user_id] = self.users.get(user_id, 0) + 1
+                return session
+        # Loaded outside the lock so one user's disk read doesn't stall everyone else.
+        loaded = self.load(user_id)
+        with self.lock:
+            session = self.sessions.get(user_id)
+            if session is None:  # Nobody else loaded it meanwhile
+                session = loaded
+                self.track(user_id, session, saved_state=session.cache_state())
+            self.sessions.move_to_end(user_id)
+            self.users[user_id] = self.users.get(user_id, 0) + 1
+        return session
+
+    def track(self, user_id, session, saved_state):
+        """Start accounting for a session now held in memory. Call with the lock held."""
+        self.sessions[user_id] = session
+        self.saved_states[user_id] = saved_state
+        self.sizes[user_id] = self.estimate_size(session)
+        self.sized_states[user_id] = session.cache_state()
+        self.memory_used += self.sizes[user_id]
+
+    def release(self, user_id, session):
+        state = session.cache_state()
+        # Sessions only change size when their state changes, so reads skip the estimate.
+        size = self.sizes.get(user_id) if state == self.sized_states.get(user_id) else None
+        if size is None:
+            size = self.estimate_size(session)
+        with self.lock:
+            self.users[user_id] -= 1
+            if not self.users[user_id]:
+                del self.users[user_id]
+            self.memory_used += size - self.sizes.get(user_id, 0)
+            self.sizes[user_id] = size
+            self.sized_states[user_id] = state
+            evicted = self.evict() if self.memory_used > self.memory_budget else []
+        self.write_evicted(evicted)
+
+    def evict(self):
+        """Drop idle least recently used sessions until the budget is met. Call with the lock held."""
+        victims = []
+        excess = self.memory_used - self.memory_budget
+        for user_id in self.sessions:  # Oldest first; stops as soon as enough is freed
+            if excess <= 0:
+                break
+            if user_id not in self.users:
+                victims.append(user_id)
+                excess -= self.sizes[user_id]
+        evicted = []
+        for user_id in victims:
+            session = self.sessions.pop(user_id)
+            self.memory_used -= self.sizes.pop(user_id)
+            del self.sized_states[user_id]
+            self.evictions += 1
+            if session.cache_state() != self.saved_states.pop(user_id, None):
+                self.writing[user_id] = session
+                evicted.append((user_id, session))
+        return evicted
+
+    def write_evicted(self, evicted):
+        for user_id, session in evicted:
+            state = session.cache_state()
+            try:
+                self.save(user_id, session)
+            except OSError as e:
+                logging.error(f"Could not save session of user {user_id}: {e}")
+            with self.lock:
+                if self.writing.get(user_id) is session:
+                    del self.writing[user_id]
+                if user_id in self.sessions:  # Reclaimed while it was being written
+                    self.saved_states[user_id] = state
+
+    def load(self, user_id):
+        """Read a user's session from disk, or create an empty one."""
+        session = self.read(user_id)
+        if self.prepare is not None:
+            self.prepare(session)
+        return session
+
+    def read(self, user_id):
+        path = self.path_for(user_id)
+        try:
+            with open(path, 'rb') as f:
+                session = pickle.load(f)
+        except FileNotFoundError:
+            return self.factory(user_id)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError) as e:
+            logging.error(f"Ignoring unreadable session of user {user_id} in '{path}': {e}")
+            return self.factory(user_id)
+        self.loads += 1
+        return session
+
+    def save(self, user_id, session):
+        path = self.path_for(user_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"  # Eviction and save_all may write the same user at once
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(session, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def save_all(self):
+        """Write every in-memory session that changed since it was loaded, e.g. before shutting down."""
+        with self.lock:
+            changed = [(user_id, session) for user_id, session in self.sessions.items()
+                       if session.cache_state() != self.saved_states.get(user_id)]
+            changed.extend(self.writing.items())  # Evicted, but their files may not be complete yet
+        for user_id, session in changed:
+            state = session.cache_state()
+            self.save(user_id, session)
+            with self.lock:
+                if self.sessions.get(user_id) is session:
+                    self.saved_states[user_id] = state
+        if changed:
+            logging.info(f"Saved {len(changed)} user sessions to '{self.storage_dir}'.")
+
+    def stats(self):
+        """Return counts describing the sessions held in memory."""
+        with self.lock:
+            return {'in_memory': len(self.sessions), 'memory_used': self.memory_used,
+                    'memory_budget': self.memory_budget, 'loads': self.loads, 'evictions': self.evictions}
+
+
+class Compactor:
+    """Background thread that has a manager's in-memory sessions compact() themselves, e.g. to move old data to disk.
+
+    Every `interval` seconds each session held in memory is compacted in turn, kept
+    from eviction while it is. Sessions spilled to disk wait until they are next loaded.
+    """
+    def __init__(self, manager, interval=600.0):
+        self.manager = manager
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='session-compactor', daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.compact_all()
+
+    def compact_all(self):
+        """Compact every session in memory; returns the sum of what their compact() returned."""
+        with self.manager.lock:
+            user_ids = list(self.manager.sessions)
+        compacted = 0
+        for user_id in user_ids:
+            if self.stopped.is_set():
+                break
+            with self.manager.lock:
+                if user_id not in self.manager.sessions:  # Evicted meanwhile; not worth loading again
+                    continue
+            try:
+                with self.manager.session(user_id) as session:
+                    compacted += session.compact() or 0
+            except (OSError, ValueError) as e:
+                logging.warning(f"Could not compact session of user {user_id}: {e}")
+        return compacted
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread.is_alive():
+            self.thread.join()
+
+
+class SessionCommand(Command):
+    """Registered in place of a per-user command; runs the current user's own instance of it."""
+    def __init__(self, command_class, manager, default_user=None):
+        prototype = manager.factory(default_user)
+        super().__init__(prototype.name, prototype.description)
+        for attribute in PROXIED_ATTRIBUTES:
+            setattr(self, attribute, getattr(command_class, attribute))
+        self.command_class = command_class
+        self.manager = manager
+        self.default_user = default_user  # Acts for this user when no request set current_user
+
+    def user_id(self):
+        user_id = current_user.get()
+        return self.default_user if user_id is None else user_id
+
+    def execute(self, *args, **kwargs):
+        with self.manager.session(self.user_id()) as session:
+            return session.execute(*args, **kwargs)
+
+    def is_cacheable(self, *args):
+        with self.manager.session(self.user_id()) as session:
+            return session.is_cacheable(*args)
+
+    def cache_state(self):
+        # Includes the user so one user's cached results are never served to another.
+        user_id = self.user_id()
+        with self.manager.session(user_id) as session:
+            return user_id, session.cache_state()
+
+    def work_size(self, *args):
+        with self.manager.session(self.user_id()) as session:
+            return session.work_size(*args)
+
+    def worker_command(self):
+        with self.manager.session(self.user_id()) as session:
+            return session.worker_command()
+
+    def __getattr__(self, item):
+        # Plugin specific methods, e.g. summarize_history, act on the current user's session.
+        if item in ('manager', 'default_user', 'command_class'):
+            raise AttributeError(item)
+        user_id = self.user_id()
+        with self.manager.session(user_id) as session:
+            value = getattr(session, item)
+        if not callable(value):
+            return value
+        manager = self.manager
+
+        @functools.wraps(value)
+        def call_in_session(*args, **kwargs):
+            # Looked up again for each call: the session may have been evicted and reloaded since.
+            with manager.session(user_id) as session:
+                return getattr(session, item)(*args, **kwargs)
+        return call_in_session
@@ -0,0 +1,49 @@
+"""Measure how long it takes a fresh process to build the App and print the menu.
+
+Run from the project root: python benchmarks/cold_start.py
+"""
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+import time
+
+# A warm manifest should let the menu print without importing LangChain at all.
+TARGET_SECONDS = 0.25
+RUNS = 5
+
+STARTUP_SCRIPT = """
+import sys
+from app import App, DynamicMenuCommand
+app = App()
+app.load_plugins()
+DynamicMenuCommand("show_menu", "Show the dynamic menu of all commands.", app.command_handler).execute()
+print("langchain imported:", "langchain_openai" in sys.modules, file=sys.stderr)
+"""
+
+
+def time_startup(env):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT], env=env,
+                            capture_output=True, text=True, check=True)
+    return time.perf_counter() - start, result.stderr.strip().splitlines()[-1]
+
+
+def main():
+    cache_dir = tempfile.mkdtemp(prefix='manifest-bench-')
+    env = dict(os.environ, CACHE_DIR=cache_dir)
+    try:
+        cold, cold_note = time_startup(env)  # No manifest yet: every plugin gets imported
+        warm_runs = [time_startup(env) for _ in range(RUNS)]
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    warm = min(elapsed for elapsed, _ in warm_runs)
+    print(f"cold start (no manifest): {cold * 1000:.1f} ms  [{cold_note}]")
+    print(f"warm start (manifest):    {warm * 1000:.1f} ms  [{warm_runs[0][1]}]")
+    print(f"target: {TARGET_SECONDS * 1000:.0f} ms -> {'OK' if warm <= TARGET_SECONDS else 'MISSED'}")
+    return 0 if warm <= TARGET_SECONDS else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,45 @@
+"""Time command lookups against an index holding thousands of commands.
+
+Run from the project root: python benchmarks/command_index.py
+"""
+import os
+import sys
+import random
+import timeit
+
+sys.path.insert(0, os.getcwd())
+from app.commands.index import CommandIndex  # noqa: E402
+
+COMMANDS = 5000
+WORDS = ["track", "workout", "history", "calories", "trainer", "plan", "summary", "progress", "goal",
+         "export", "import", "stats", "weekly", "monthly", "record", "run", "lift", "swim", "rest", "sleep"]
+
+
+def main():
+    random.seed(42)
+    index = CommandIndex()
+    names = []
+    for i in range(COMMANDS):
+        name = f"{random.choice(WORDS)}_{random.choice(WORDS)}_{i}"
+        names.append(name)
+        index.add(name, " ".join(random.sample(WORDS, 6)) + f" command number {i}.")
+    descriptions = dict(index.descriptions)
+
+    def linear_scan(keyword):
+        return [name for name, description in descriptions.items() if keyword in description]
+
+    cases = {
+        "linear description scan (before)": lambda: linear_scan("swim rest"),
+        "indexed description search": lambda: index.search("swim rest"),
+        "unique abbreviation": lambda: index.resolve_prefix(names[1234][:-1]),
+        "tab completion": lambda: index.complete("track_w"),
+        "typo suggestions": lambda: index.suggest("trak_workout_12"),
+    }
+    print(f"{COMMANDS} registered commands")
+    for label, case in cases.items():
+        runs, total = timeit.Timer(case).autorange()
+        print(f"{label:<34} {total / runs * 1_000_000:9.1f} us")
+
+
+if __name__ == "__main__":
+    main()
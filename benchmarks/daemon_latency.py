@@ -0,0 +1,81 @@
+"""Compare a cold `python main.py` run against commands sent to a warm `main.py --serve` daemon.
+
+Run from the project root: python benchmarks/daemon_latency.py
+"""
+import io
+import os
+import sys
+import time
+import shutil
+import tempfile
+import statistics
+import subprocess
+
+sys.path.insert(0, os.getcwd())
+from client import send_command  # noqa: E402
+
+RUNS = 20
+COMMAND = 'fitness_history summary'
+
+
+def wait_for_socket(socket_path, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(socket_path):
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Server did not create '{socket_path}'")
+        time.sleep(0.05)
+
+
+def time_client(env, socket_path, python_flags):
+    samples = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *python_flags, 'client.py', *COMMAND.split()],
+                       env=dict(env, APP_SOCKET=socket_path), capture_output=True, check=True)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def report(label, samples):
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f"{label:<32} median {statistics.median(samples) * 1000:8.2f} ms   p95 {p95 * 1000:8.2f} ms")
+
+
+def main():
+    cache_dir = tempfile.mkdtemp(prefix='daemon-bench-')
+    env = dict(os.environ, CACHE_DIR=cache_dir)
+    socket_path = os.path.join(cache_dir, 'app.sock')
+
+    cold = []
+    for _ in range(5):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, 'main.py'], input=f"{COMMAND}\nexit\n", env=env,
+                       capture_output=True, text=True, check=True)
+        cold.append(time.perf_counter() - start)
+
+    server = subprocess.Popen([sys.executable, 'main.py', '--serve', '--socket', socket_path], env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_socket(socket_path)
+        in_process = []
+        for _ in range(RUNS):
+            start = time.perf_counter()
+            send_command(COMMAND, io.BytesIO(), socket_path)
+            in_process.append(time.perf_counter() - start)
+        client_process = time_client(env, socket_path, [])
+        # client.py only needs the standard library, so site-packages start-up can be skipped.
+        client_no_site = time_client(env, socket_path, ['-S'])
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    report("cold: python main.py", cold)
+    report("warm: python client.py", client_process)
+    report("warm: python -S client.py", client_no_site)
+    report("warm: socket round-trip only", in_process)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Cold load time of a history from the binary session file, a pickle and JSONL.
+
+"open" is the time until the history can answer queries; "stats" then computes every
+running aggregate from the loaded columns (for the mapped file, straight from the pages
+of the file). JSONL is only timed up to 1M sessions.
+
+Run from the project root: python benchmarks/history_binary.py [sizes...]
+"""
+import os
+import sys
+import time
+import pickle
+import logging
+import tempfile
+from datetime import datetime
+
+import numpy as np
+import orjson
+
+sys.path.insert(0, os.getcwd())
+from app.plugins.history import FitnessHistory  # noqa: E402
+from app.plugins.history.binary import write_sessions  # noqa: E402
+from app.plugins.history.columns import SessionColumns, to_epoch_us  # noqa: E402
+
+SIZES = [1_000_000, 10_000_000]
+TYPES = ['run', 'swim', 'cycle', 'lift', 'yoga']
+JSONL_LIMIT = 1_000_000
+
+
+def make_columns(count):
+    """Fill the columns directly; building 10M session dicts would take minutes."""
+    rng = np.random.default_rng(42)
+    columns = SessionColumns()
+    columns.extend([{'duration': 30, 'calories_burned': 300.5, 'type': TYPES[0],
+                     'timestamp': datetime(2000, 1, 1).isoformat()}])
+    columns.reserve(count)
+    columns.columns['duration'].values[:count] = rng.integers(10, 120, count)
+    columns.columns['calories_burned'].values[:count] = rng.uniform(50, 1200, count)
+    columns.columns['type'].categories[:] = TYPES
+    columns.columns['type'].category_codes = {name: code for code, name in enumerate(TYPES)}
+    columns.columns['type'].codes[:count] = np.arange(count) % len(TYPES)
+    columns.columns['timestamp'].values[:count] = to_epoch_us(datetime(2000, 1, 1)) + np.arange(count) * 60_000_000
+    for column in columns.columns.values():
+        column.present[:count] = True
+    columns.length = count
+    return columns
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def drop_page_cache(path):
+    if hasattr(os, 'posix_fadvise'):  # Best effort: makes the first read come from disk
+        with open(path, 'rb') as f:
+            os.fsync(f.fileno())
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+def load_jsonl(path):
+    history = FitnessHistory()
+    with open(path, 'rb') as f:
+        history.history.extend(orjson.loads(line) for line in f)
+    return history
+
+
+def main():
+    logging.disable(logging.INFO)
+    sizes = [int(size) for size in sys.argv[1:]] or SIZES
+    print(f"{'sessions':>10} {'format':<7} {'file':>9} {'write':>9} {'open':>10} {'stats':>9}")
+    for count in sizes:
+        columns = make_columns(count)
+        with tempfile.TemporaryDirectory() as directory:
+            formats = {'binary': os.path.join(directory, 'history.sessions'),
+                       'pickle': os.path.join(directory, 'history.pickle')}
+            _, binary_write_ms = timed(lambda: write_sessions(columns, formats['binary']))
+
+            def write_pickle():
+                with open(formats['pickle'], 'wb') as f:
+                    pickle.dump(columns, f, protocol=pickle.HIGHEST_PROTOCOL)
+            _, pickle_write_ms = timed(write_pickle)
+            writes = {'binary': binary_write_ms, 'pickle': pickle_write_ms}
+            if count <= JSONL_LIMIT:
+                formats['jsonl'] = os.path.join(directory, 'history.jsonl')
+
+                def write_jsonl():
+                    with open(formats['jsonl'], 'wb') as f:
+                        f.writelines(orjson.dumps(session) + b'\n' for session in columns)
+                _, writes['jsonl'] = timed(write_jsonl)
+            expected = None
+            del columns
+
+            def load_pickle():
+                history = FitnessHistory()
+                with open(formats['pickle'], 'rb') as f:
+                    history.history = pickle.load(f)
+                return history
+
+            loaders = {'binary': lambda: FitnessHistory.load_sessions(formats['binary']),
+                       'pickle': load_pickle, 'jsonl': lambda: load_jsonl(formats['jsonl'])}
+            for name, path in formats.items():
+                drop_page_cache(path)
+                history, open_ms = timed(loaders[name])
+                stats, stats_ms = timed(history.statistics)
+                expected = expected or stats
+                assert stats['sessions'] == expected['sessions'] == count
+                assert stats['duration']['sum'] == expected['duration']['sum']
+                print(f"{count:>10} {name:<7} {os.path.getsize(path) / 2 ** 20:>7.1f}MB {writes[name]:>7.0f}ms "
+                      f"{open_ms:>8.2f}ms {stats_ms:>7.0f}ms")
+                del history
+
+
+if __name__ == '__main__':
+    main()
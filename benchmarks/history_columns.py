@@ -0,0 +1,91 @@
+"""Compare the old list-of-dicts history with the columnar store: memory, summaries and filters.
+
+The "running" column is FitnessHistory.summarize_history(), served from aggregates kept
+up to date by add_workout_session.
+
+Run from the project root: python benchmarks/history_columns.py
+"""
+import os
+import sys
+import time
+import random
+import logging
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.getcwd())
+from app.plugins.history import FitnessHistory  # noqa: E402
+from app.plugins.history.columns import SessionColumns  # noqa: E402
+
+SIZES = [10_000, 100_000, 500_000]
+TYPES = ['run', 'swim', 'cycle', 'lift', 'yoga']
+
+
+def make_sessions(count):
+    random.seed(42)
+    start = datetime(2020, 1, 1)
+    return [{'duration': random.randint(10, 120), 'calories_burned': random.randint(50, 1200),
+             'type': random.choice(TYPES), 'timestamp': (start + timedelta(minutes=37 * i)).isoformat()}
+            for i in range(count)]
+
+
+def measure(build):
+    tracemalloc.start()
+    store = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return store, size
+
+
+def best_of(function, repeats=5):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def main():
+    logging.disable(logging.INFO)  # add_workout_session logs every session
+    print(f"{'sessions':>9} {'layout':<8} {'memory':>10} {'summary':>10} {'filtered':>10} {'running':>10}")
+    for count in SIZES:
+        sessions = make_sessions(count)
+
+        def build_columns():
+            columns = SessionColumns()
+            for session in sessions:
+                columns.append(session)
+            return columns
+
+        listed, list_bytes = measure(lambda: [dict(session) for session in sessions])
+        columns, column_bytes = measure(build_columns)
+        cutoff = sessions[count // 2]['timestamp']
+
+        def list_summary():
+            return sum(s['duration'] for s in listed), sum(s['calories_burned'] for s in listed)
+
+        def list_filtered():
+            return sum(s['duration'] for s in listed if s['type'] == 'run' and s['timestamp'] >= cutoff)
+
+        def column_summary():
+            return columns.sum('duration'), columns.sum('calories_burned')
+
+        def column_filtered():
+            return columns.sum('duration', columns.mask(since=cutoff, type='run'))
+
+        history = FitnessHistory()
+        for session in sessions:
+            history.add_workout_session(dict(session), timestamp=session['timestamp'])
+        running = history.summarize_history()
+
+        assert list_summary() == column_summary() and list_filtered() == column_filtered()
+        assert (running['total_time_spent'], running['total_calories_burned']) == column_summary()
+        print(f"{count:>9} {'dicts':<8} {list_bytes / 2 ** 20:>8.1f}MB {best_of(list_summary):>8.2f}ms "
+              f"{best_of(list_filtered):>8.2f}ms")
+        print(f"{count:>9} {'columns':<8} {column_bytes / 2 ** 20:>8.1f}MB {best_of(column_summary):>8.2f}ms "
+              f"{best_of(column_filtered):>8.2f}ms {best_of(history.summarize_history) * 1000:>8.2f}us")
+
+
+if __name__ == '__main__':
+    main()
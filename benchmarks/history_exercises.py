@@ -0,0 +1,103 @@
+"""Per-exercise queries from the exercise index against scanning the history.
+
+"index" answers from the index FitnessHistory keeps up to date: personal records and
+the top 5 sessions come straight from it, the top 50 (more than it keeps) from the
+exercise's rows. "numpy" scans whole columns with a mask per query and "python" scans
+session dicts, as the history had to before (only up to PYTHON_LIMIT sessions).
+"build" is the time to index an existing history, and "add" the cost of one
+add_workout_session with the index against one without it.
+
+Run from the project root: python benchmarks/history_exercises.py [sizes...]
+"""
+import os
+import sys
+import time
+import random
+import logging
+
+import numpy as np
+
+sys.path.insert(0, os.getcwd())
+from app.plugins.history import FitnessHistory  # noqa: E402
+from app.plugins.history.exercises import ExerciseIndex  # noqa: E402
+from history_binary import TYPES, make_columns  # noqa: E402
+
+SIZES = [1_000_000, 10_000_000]
+PYTHON_LIMIT = 1_000_000
+ADDS = 20_000
+
+
+def best_of(function, repeats=5):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return result, min(times) * 1000
+
+
+def numpy_top(columns, exercise, field, k):
+    """The k best sessions by a field with a mask over the columns, ties going to the first."""
+    rows = np.flatnonzero(columns.mask(type=exercise))
+    values = columns.columns[field].values[rows]
+    order = np.lexsort((rows, -values))[:k]
+    return [columns.row(row) for row in rows[order].tolist()]
+
+
+def python_top(history, exercise, field, k):
+    matching = [(session[field], -row, session) for row, session in enumerate(history)
+                if session.get('type') == exercise and field in session]
+    return [session for *_, session in sorted(matching, key=lambda entry: entry[:2], reverse=True)[:k]]
+
+
+def add_cost(with_index):
+    history = FitnessHistory('bench')
+    if not with_index:
+        history.exercises = ExerciseIndex()
+        history.exercises.add = lambda session: []
+    rng = random.Random(42)
+    sessions = [{'duration': rng.randint(10, 120), 'calories_burned': rng.randint(50, 1200), 'type': rng.choice(TYPES)}
+                for _ in range(ADDS)]
+    start = time.perf_counter()
+    for i, session in enumerate(sessions):
+        history.add_workout_session(session, timestamp=1_700_000_000_000_000 + i * 60_000_000)
+    return (time.perf_counter() - start) / ADDS * 1e6
+
+
+def main():
+    logging.disable(logging.INFO)
+    sizes = [int(size) for size in sys.argv[1:]] or SIZES
+    without, with_index = (min(add_cost(indexed) for _ in range(3)) for indexed in (False, True))
+    print(f"add: {without:.1f}us without the index, {with_index:.1f}us with it")
+    print(f"{'sessions':>10} {'build':>9} {'query':<10} {'index':>10} {'numpy':>10} {'python':>10}")
+    for count in sizes:
+        history = FitnessHistory('bench')
+        history.history = make_columns(count)
+        start = time.perf_counter()
+        history.current_exercises()
+        build_ms = (time.perf_counter() - start) * 1000
+        columns = history.history
+        queries = [
+            ('records', history.personal_records,
+             lambda: {field: columns.columns[field].values[columns.mask(type='run')].max().item()
+                      for field in ('duration', 'calories_burned')},
+             lambda: max(session['duration'] for session in columns if session['type'] == 'run')),
+            ('top 5', lambda: history.top_sessions('run', 'calories_burned', 5),
+             lambda: numpy_top(columns, 'run', 'calories_burned', 5),
+             lambda: python_top(columns, 'run', 'calories_burned', 5)),
+            ('top 50', lambda: history.top_sessions('run', 'calories_burned', 50),
+             lambda: numpy_top(columns, 'run', 'calories_burned', 50),
+             lambda: python_top(columns, 'run', 'calories_burned', 50)),
+        ]
+        for name, index, numpy_scan, python_scan in queries:
+            indexed, index_ms = best_of(index)
+            scanned, numpy_ms = best_of(numpy_scan, repeats=3)
+            if name.startswith('top'):
+                assert indexed == scanned
+            python = f"{best_of(python_scan, repeats=1)[1]:>8.1f}ms" if count <= PYTHON_LIMIT else f"{'-':>10}"
+            print(f"{count:>10} {build_ms:>7.0f}ms {name:<10} {index_ms:>8.3f}ms {numpy_ms:>8.1f}ms {python}")
+        del history, columns
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Export throughput to CSV and JSONL, plain and gzipped, and the export's peak memory.
+
+"rate" is sessions per second from the store to the file. "peak" is the peak RSS growth
+(Linux only) during the export, on top of the history itself: it should stay at about
+one chunk whatever the size of the history. "ranged" exports the last tenth of the
+sessions, and "runs" only those of type 'run'. The SQLite backend is only timed up to
+SQL_LIMIT sessions.
+
+Run from the project root: python benchmarks/history_export.py [sizes...]
+"""
+import os
+import sys
+import time
+import logging
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.getcwd())
+from app.plugins.history import FitnessHistory  # noqa: E402
+from app.plugins.history.sql import SQLSessions  # noqa: E402
+from history_binary import make_columns  # noqa: E402
+
+SIZES = [1_000_000, 10_000_000]
+SQL_LIMIT = 1_000_000
+START = datetime(2000, 1, 1)  # make_columns() adds a session a minute from here
+
+
+def reset_peak():
+    """Reset VmHWM to the current RSS; returns False where that isn't supported."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_growth():
+    with open('/proc/self/status') as f:
+        status = dict(line.split(':', 1) for line in f)
+    return (int(status['VmHWM'].split()[0]) - int(status['VmRSS'].split()[0])) * 1024
+
+
+def run(history, path, **selection):
+    measured = reset_peak()
+    start = time.perf_counter()
+    report = history.export_sessions(path, **selection)
+    elapsed = time.perf_counter() - start
+    peak = f"{peak_growth() / 2 ** 20:>7.1f}MB" if measured else f"{'-':>9}"
+    return report, elapsed, peak
+
+
+def main():
+    logging.disable(logging.INFO)
+    sizes = [int(size) for size in sys.argv[1:]] or SIZES
+    print(f"{'sessions':>10} {'backend':<8} {'export':<10} {'exported':>10} {'file':>9} {'rate':>12} {'peak':>9}")
+    for count in sizes:
+        columns = make_columns(count)
+        stores = {'columns': columns}
+        with tempfile.TemporaryDirectory() as directory:
+            if count <= SQL_LIMIT:
+                store = SQLSessions(f"sqlite:///{os.path.join(directory, 'history.db')}", 'bench')
+                for chunk in columns.chunks():
+                    store.extend(chunk)
+                stores['sqlite'] = store
+            since = (START + timedelta(minutes=count * 9 // 10)).isoformat()
+            exports = [('csv', 'workouts.csv', {}), ('jsonl', 'workouts.jsonl', {}),
+                       ('csv.gz', 'workouts.csv.gz', {}), ('jsonl.gz', 'workouts.jsonl.gz', {}),
+                       ('ranged', 'ranged.jsonl', {'since': since}), ('runs', 'runs.csv', {'type': 'run'})]
+            for name, store in stores.items():
+                history = FitnessHistory('bench')
+                history.history = store
+                for label, file_name, selection in exports:
+                    path = os.path.join(directory, file_name)
+                    report, elapsed, peak = run(history, path, **selection)
+                    print(f"{count:>10} {name:<8} {label:<10} {report['sessions']:>10} "
+                          f"{report['bytes'] / 2 ** 20:>7.0f}MB {report['sessions'] / elapsed:>10,.0f}/s {peak}")
+                    os.remove(path)
+        del columns, stores
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Bulk import throughput from CSV and JSONL, and the import pipeline's peak memory.
+
+"rate" is rows per second from file to a FitnessHistory, including validation, the
+running aggregates and the timeline. "pipeline" is the peak RSS growth (Linux only) of a
+separate process that reads and validates the whole file but throws every chunk away,
+which is what the import itself holds on top of the sessions it stores: it should not
+grow with the file. One row in 1,000 is invalid.
+
+Run from the project root: python benchmarks/history_import.py [sizes...]
+"""
+import os
+import sys
+import time
+import random
+import logging
+import resource
+import tempfile
+import subprocess
+from datetime import datetime, timedelta
+
+import orjson
+
+sys.path.insert(0, os.getcwd())
+from app.plugins.history import FitnessHistory  # noqa: E402
+from app.plugins.history.importer import import_sessions  # noqa: E402
+
+SIZES = [1_000_000, 5_000_000]
+TYPES = ['run', 'swim', 'cycle', 'lift', 'yoga']
+START = datetime(2015, 1, 1, 6, 0)
+
+
+def write_files(count, directory):
+    """Write the same sessions as CSV and JSONL, one every 7 minutes."""
+    rng = random.Random(42)
+    paths = {'csv': os.path.join(directory, 'workouts.csv'), 'jsonl': os.path.join(directory, 'workouts.jsonl')}
+    with open(paths['csv'], 'w') as csv_file, open(paths['jsonl'], 'wb') as jsonl_file:
+        csv_file.write('timestamp,duration,calories_burned,type\n')
+        for i in range(count):
+            session = {'timestamp': (START + timedelta(minutes=7 * i)).isoformat(),
+                       'duration': rng.randint(10, 120) if i % 1000 else -1,
+                       'calories_burned': rng.randint(50, 1200), 'type': rng.choice(TYPES)}
+            csv_file.write(','.join(map(str, session.values())) + '\n')
+            jsonl_file.write(orjson.dumps(session) + b'\n')
+    return paths
+
+
+def rss():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * resource.getpagesize()
+
+
+def pipeline_peak(path):
+    """Run in a child process: return the peak RSS growth, in MB, of importing path into nothing."""
+    before = rss()
+    peak = [before]
+    import_sessions(path, lambda sessions: peak.append(rss()))
+    return (max(peak) - before) / 2 ** 20
+
+
+def main():
+    logging.disable(logging.INFO)
+    if sys.argv[1:2] == ['--pipeline']:
+        print(pipeline_peak(sys.argv[2]))
+        return
+    sizes = [int(size) for size in sys.argv[1:]] or SIZES
+    print(f"{'rows':>9} {'format':<6} {'file':>9} {'rate':>12} {'pipeline':>10} {'history':>9}")
+    for count in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            paths = write_files(count, directory)
+            for name, path in paths.items():
+                history = FitnessHistory()
+                start = time.perf_counter()
+                report = history.import_sessions(path)
+                rate = report['rows'] / (time.perf_counter() - start)
+                assert report['rows'] == count and report['rejected'] == count // 1000 + (count % 1000 > 0)
+                assert history.summarize_history()['total_sessions'] == report['imported']
+                peak = float(subprocess.run([sys.executable, __file__, '--pipeline', path], check=True,
+                                            capture_output=True, text=True).stdout)
+                print(f"{count:>9} {name:<6} {os.path.getsize(path) / 2 ** 20:>7.0f}MB {rate:>8,.0f}/s "
+                      f"{peak:>8.1f}MB {history.memory_size() / 2 ** 20:>7.0f}MB")
+                del history
+
+
+if __name__ == '__main__':
+    main()
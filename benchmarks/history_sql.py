@@ -0,0 +1,90 @@
+"""Compare the in-memory columnar history with the SQLite backend: bulk load, size and summaries.
+
+Every summary on the SQLite side is a single SQL aggregate over the (user_id, timestamp)
+index; no rows are pulled into Python. "running" is summarize_history(), which both
+backends serve from running aggregates (SQLite computes them in SQL once per load).
+
+Run from the project root: python benchmarks/history_sql.py [sizes...]
+e.g. python benchmarks/history_sql.py 10000 1000000
+"""
+import os
+import sys
+import time
+import random
+import logging
+import tempfile
+import itertools
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.getcwd())
+from app.plugins.history import FitnessHistory  # noqa: E402
+from app.plugins.history.columns import SessionColumns  # noqa: E402
+from app.plugins.history.sql import SQLSessions  # noqa: E402
+
+SIZES = [10_000, 1_000_000, 10_000_000]
+TYPES = ['run', 'swim', 'cycle', 'lift', 'yoga']
+CHUNK = 100_000
+START = datetime(2000, 1, 1)
+
+
+def make_sessions(count):
+    """Generate sessions lazily so 10M of them never exist as dicts at once."""
+    rng = random.Random(42)
+    for i in range(count):
+        yield {'duration': rng.randint(10, 120), 'calories_burned': rng.randint(50, 1200),
+               'type': TYPES[i % len(TYPES)], 'timestamp': (START + timedelta(minutes=i)).isoformat()}
+
+
+def best_of(function, repeats=3):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return result, min(times) * 1000
+
+
+def load(store, count):
+    start = time.perf_counter()
+    sessions = make_sessions(count)
+    while chunk := list(itertools.islice(sessions, CHUNK)):
+        store.extend(chunk)
+    return time.perf_counter() - start
+
+
+def main():
+    logging.disable(logging.INFO)
+    sizes = [int(size) for size in sys.argv[1:]] or SIZES
+    print(f"{'sessions':>10} {'backend':<8} {'load/s':>10} {'size':>9} {'summary':>10} {'range':>10} "
+          f"{'type':>10} {'last':>8} {'running':>9}")
+    for count in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'history.db')
+            stores = {'columns': SessionColumns(), 'sqlite': SQLSessions(f"sqlite:///{path}", 'bench')}
+            since = (START + timedelta(minutes=count * 9 // 10)).isoformat()  # The last tenth
+            results = {}
+            for name, store in stores.items():
+                elapsed = load(store, count)
+                size = store.memory_size() if name == 'columns' else sum(
+                    os.path.getsize(file) for file in (path, f"{path}-wal") if os.path.exists(file))
+                summary, summary_ms = best_of(lambda: store.totals(('duration', 'calories_burned')))
+                ranged, range_ms = best_of(lambda: store.totals(('duration', 'calories_burned'), since=since))
+                typed, type_ms = best_of(lambda: store.totals(('duration',), type='run'))
+                _, last_ms = best_of(lambda: store[-1])
+                history = FitnessHistory('bench')
+                history.history = store
+                start = time.perf_counter()
+                history.current_aggregates()  # Built from the store once
+                catch_up_ms = (time.perf_counter() - start) * 1000
+                _, running_ms = best_of(history.summarize_history, repeats=1000)
+                results[name] = (summary, ranged, typed)
+                print(f"{count:>10} {name:<8} {count / elapsed:>10,.0f} {size / 2 ** 20:>7.1f}MB "
+                      f"{summary_ms:>8.2f}ms {range_ms:>8.2f}ms {type_ms:>8.2f}ms {last_ms:>6.2f}ms "
+                      f"{running_ms * 1000:>7.2f}us  (aggregates built in {catch_up_ms:.0f}ms)")
+                del store, history
+                stores[name] = None  # Free the columns before the next backend loads
+            assert results['columns'] == results['sqlite']
+
+
+if __name__ == '__main__':
+    main()
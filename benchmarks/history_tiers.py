@@ -0,0 +1,70 @@
+"""Memory and summary latency of a history before and after compacting all but its last 90 days to disk.
+
+Sessions are one a minute, as in history_binary.py. "compact" moves every session
+older than the hot window into a cold segment file. The queries run on the history
+with every session in memory ("hot"), then on the tiered one ("tiered"): "range" is a
+year with partial days at both ends, so in the tiered history one end is read from
+the cold segment; "filtered" sums one exercise across both tiers.
+
+Run from the project root: python benchmarks/history_tiers.py [sizes...]
+"""
+import os
+import sys
+import math
+import time
+import logging
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.getcwd())
+from app.plugins.history import FitnessHistory  # noqa: E402
+from app.plugins.history.columns import from_epoch_us  # noqa: E402
+from history_binary import make_columns  # noqa: E402
+
+SIZES = [1_000_000, 5_000_000]
+HOT_DAYS = 90
+
+
+def best_of(function, repeats=5):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return result, min(times) * 1000
+
+
+def main():
+    logging.disable(logging.INFO)
+    sizes = [int(size) for size in sys.argv[1:]] or SIZES
+    print(f"{'sessions':>10} {'hot MB':>8} {'tiered MB':>10} {'compact':>9} {'query':<10} {'hot':>9} {'tiered':>9}")
+    for count in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            os.environ['HISTORY_COLD_DIR'] = directory
+            history = FitnessHistory('bench')
+            history.history = make_columns(count)
+            history.summarize_history(since='2000-01-01')  # Builds the timeline and aggregates
+            history.current_exercises()
+            last = datetime.fromisoformat(from_epoch_us(history.history.columns['timestamp'].values[count - 1]))
+            since = from_epoch_us(history.history.columns['timestamp'].values[count // 3] + 1)
+            until = from_epoch_us(history.history.columns['timestamp'].values[count - 1] - 1)
+            queries = [('summary', history.summarize_history),
+                       ('range', lambda: history.summarize_history(since=since, until=until)),
+                       ('filtered', lambda: history.summarize_history(type='run'))]
+            hot = {name: best_of(query) for name, query in queries}
+            hot_mb = history.memory_size() / 2 ** 20
+            start = time.perf_counter()
+            moved = history.compact(last - timedelta(days=HOT_DAYS))
+            compact_s = time.perf_counter() - start
+            tiered_mb = history.memory_size() / 2 ** 20
+            for name, query in queries:
+                result, tiered_ms = best_of(query)
+                assert all(math.isclose(value, hot[name][0][key]) for key, value in result.items()), name
+                print(f"{count:>10} {hot_mb:>8.1f} {tiered_mb:>10.1f} {compact_s:>8.2f}s {name:<10} "
+                      f"{hot[name][1]:>7.2f}ms {tiered_ms:>7.2f}ms")
+            assert moved == count - len(history.history.hot)
+            del history
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Time-range summaries from the timeline's rollups against a scan of the columns.
+
+Sessions are one every 5 minutes, so a 30-day range holds ~8,600 of them. "late add" is
+add_workout_session with a timestamp a year older than the newest session.
+
+Run from the project root: python benchmarks/history_timeline.py [sizes...]
+"""
+import os
+import sys
+import time
+import random
+import logging
+import itertools
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.getcwd())
+from app.plugins.history import FitnessHistory  # noqa: E402
+
+SIZES = [100_000, 1_000_000]
+START = datetime(2000, 1, 1, 0, 3)
+BATCH = 100_000
+
+
+def make_sessions(count):
+    rng = random.Random(42)
+    for i in range(count):
+        yield {'duration': rng.randint(10, 120), 'calories_burned': rng.randint(50, 1200),
+               'timestamp': (START + timedelta(minutes=5 * i)).isoformat()}
+
+
+def best_of(function, repeats=5):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return result, min(times) * 1000
+
+
+def main():
+    logging.disable(logging.INFO)
+    sizes = [int(size) for size in sys.argv[1:]] or SIZES
+    print(f"{'sessions':>9} {'range':<8} {'scan':>10} {'timeline':>10}")
+    for count in sizes:
+        history = FitnessHistory()
+        sessions = make_sessions(count)
+        start = time.perf_counter()
+        while batch := list(itertools.islice(sessions, BATCH)):
+            history.record_sessions(batch)
+        load_s = time.perf_counter() - start
+        newest = START + timedelta(minutes=5 * (count - 1))
+        ranges = {'30 days': newest - timedelta(days=30), '1 year': newest - timedelta(days=365),
+                  'all': START + timedelta(hours=7)}
+        for name, since in ranges.items():
+            since = since.replace(hour=14, minute=22).isoformat()  # Partial days at both ends
+
+            def scan():
+                return history.history.totals(('duration', 'calories_burned'), since, newest.isoformat())
+
+            def timeline():
+                return history.summarize_history(since=since, until=newest.isoformat())
+
+            expected, scan_ms = best_of(scan)
+            summary, timeline_ms = best_of(timeline)
+            assert [summary['total_sessions'], [summary['total_time_spent'], summary['total_calories_burned']]] == \
+                [expected[0], expected[1]]
+            print(f"{count:>9} {name:<8} {scan_ms:>8.3f}ms {timeline_ms:>8.3f}ms")
+        weeks, weeks_ms = best_of(lambda: history.summarize_periods('week'))
+        late = (newest - timedelta(days=365)).isoformat()
+        _, late_ms = best_of(lambda: history.add_workout_session({'duration': 1, 'calories_burned': 1}, timestamp=late))
+        _, add_ms = best_of(lambda: history.add_workout_session({'duration': 1, 'calories_burned': 1},
+                                                                 timestamp=newest.isoformat()))
+        print(f"{count:>9} loaded in {load_s:.1f}s; {len(weeks)} weekly rollups in {weeks_ms:.2f}ms; "
+              f"add {add_ms:.3f}ms, late add {late_ms:.3f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Training load (ATL/CTL/TSB) backfill for many users at once, and its running update per session.
+
+Every user has YEARS of history with a session on about five days in seven. "batch"
+backfills every user's daily ATL, CTL and TSB in one call, from their timelines;
+"per user" calls training_load() for each history in turn; "python" runs the
+recurrence day by day in Python over the same daily loads. "add" is the cost of
+one add_workout_session, which updates the running values, and "form" of reading
+today's values from them.
+
+Run from the project root: python benchmarks/history_training.py [users...]
+"""
+import os
+import sys
+import time
+import logging
+
+import numpy as np
+
+sys.path.insert(0, os.getcwd())
+from app.plugins.history import FitnessHistory  # noqa: E402
+from app.plugins.history.columns import SessionColumns, to_epoch_us  # noqa: E402
+from app.plugins.history.training import ATL_DAYS, CTL_DAYS  # noqa: E402
+from datetime import datetime  # noqa: E402
+
+SIZES = [1_000, 5_000]
+YEARS = 5
+ADDS = 20_000
+
+
+def make_history(rng, user_id):
+    """A history filled in one batch straight from arrays."""
+    days = np.flatnonzero(rng.random(YEARS * 365) < 5 / 7)
+    times = to_epoch_us(datetime(2020, 1, 1, 7)) + days * 86_400_000_000 + rng.integers(0, 12 * 3_600_000_000, len(days))
+    rows = np.arange(len(days))
+    sessions = SessionColumns.from_fields(len(days), {'timestamp': (rows, times),
+                                                      'duration': (rows, rng.integers(20, 120, len(days))),
+                                                      'calories_burned': (rows, rng.integers(100, 900, len(days)))})
+    history = FitnessHistory(user_id)
+    history.add_workout_sessions(sessions)
+    return history
+
+
+def python_loads(loads):
+    atl = ctl = 0.0
+    for load in loads:
+        atl += (load - atl) / ATL_DAYS
+        ctl += (load - ctl) / CTL_DAYS
+    return atl, ctl
+
+
+def main():
+    logging.disable(logging.INFO)
+    sizes = [int(size) for size in sys.argv[1:]] or SIZES
+    history = make_history(np.random.default_rng(0), 'adds')
+    start = time.perf_counter()
+    first = to_epoch_us(datetime(2025, 1, 1))
+    for i in range(ADDS):
+        history.add_workout_session({'duration': 45, 'calories_burned': 400}, timestamp=first + i * 600_000_000)
+    add_us = (time.perf_counter() - start) / ADDS * 1e6
+    start = time.perf_counter()
+    for _ in range(ADDS):
+        history.current_training_load()
+    print(f"add: {add_us:.1f}us, form: {(time.perf_counter() - start) / ADDS * 1e6:.1f}us")
+
+    print(f"{'users':>6} {'sessions':>10} {'days':>6} {'batch':>9} {'per user':>9} {'python':>9}")
+    for count in sizes:
+        rng = np.random.default_rng(42)
+        histories = [make_history(rng, f'user{i}') for i in range(count)]
+        sessions = sum(len(history.history) for history in histories)
+        start = time.perf_counter()
+        series = FitnessHistory.backfill_training_loads(histories)
+        batch = time.perf_counter() - start
+        start = time.perf_counter()
+        rows = [history.training_load() for history in histories]
+        per_user = time.perf_counter() - start
+        start = time.perf_counter()
+        expected = [python_loads(loads) for loads in series['load'].tolist()]
+        python = time.perf_counter() - start
+        assert np.allclose(series['atl'][:, -1], [atl for atl, _ in expected])
+        assert np.allclose(series['ctl'][:, -1], [ctl for _, ctl in expected])
+        dates = {date: i for i, date in enumerate(series['dates'])}
+        assert all(np.isclose(user_rows[-1]['ctl'], ctl[dates[user_rows[-1]['date']]])
+                   for user_rows, ctl in zip(rows, series['ctl']))
+        print(f"{count:>6} {sessions:>10,} {len(series['dates']):>6} {batch:>8.2f}s {per_user:>8.2f}s {python:>8.2f}s")
+        del histories, series, rows
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Load-test a `python main.py --http` server and report requests/sec and tail latency.
+
+Runs CONCURRENCY clients for DURATION seconds each, once over keep-alive connections
+and once opening a new connection per request.
+
+Run from the project root: python benchmarks/http_api.py
+"""
+import os
+import sys
+import time
+import socket
+import shutil
+import asyncio
+import tempfile
+import subprocess
+
+import aiohttp
+
+PORT = 8765
+CONCURRENCY = 32
+DURATION = 5.0
+URL = f'http://127.0.0.1:{PORT}/commands/fitness_history'
+BODY = {'args': ['summary']}
+
+
+def wait_for_port(port, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Server did not listen on port {port}")
+            time.sleep(0.05)
+
+
+async def client_loop(session, deadline, latencies, failures):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        async with session.post(URL, json=BODY) as response:
+            await response.read()
+            if response.status != 200:
+                failures.append(response.status)
+        latencies.append(time.perf_counter() - start)
+
+
+async def load(keep_alive):
+    latencies, failures = [], []
+    connector = aiohttp.TCPConnector(limit=CONCURRENCY, force_close=not keep_alive)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        deadline = time.perf_counter() + DURATION
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(session, deadline, latencies, failures) for _ in range(CONCURRENCY)))
+        elapsed = time.perf_counter() - start
+    return latencies, failures, elapsed
+
+
+def report(label, latencies, failures, elapsed):
+    latencies = sorted(latencies)
+
+    def percentile(fraction):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1000
+
+    print(f"{label:<22} {len(latencies) / elapsed:8,.0f} req/s   p50 {percentile(0.50):6.2f} ms   "
+          f"p95 {percentile(0.95):6.2f} ms   p99 {percentile(0.99):6.2f} ms   max {latencies[-1] * 1000:6.2f} ms"
+          f"   errors {len(failures)}")
+
+
+def main():
+    cache_dir = tempfile.mkdtemp(prefix='http-bench-')
+    env = dict(os.environ, CACHE_DIR=cache_dir, STATS_DUMP_INTERVAL='0')
+    server = subprocess.Popen([sys.executable, 'main.py', '--http', '--port', str(PORT)], env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(PORT)
+        print(f"{CONCURRENCY} concurrent clients, {DURATION:.0f}s each: POST {URL} {BODY}")
+        report("keep-alive", *asyncio.run(load(keep_alive=True)))
+        report("connection per request", *asyncio.run(load(keep_alive=False)))
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
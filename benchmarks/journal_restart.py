@@ -0,0 +1,119 @@
+"""Measure journal write throughput and restart time for a million logged workout sessions.
+
+Adds are timed waiting for their own fsync (group commit) and with write-behind,
+where they return once queued and the commit thread syncs batches behind them.
+Restart is timed replaying the whole journal, then after a checkpoint with a tail of
+TAIL sessions (the most SNAPSHOT_MAX_RECORDS lets build up by default), then with an
+empty tail. Snapshots are loaded lazily, per user, on first use.
+
+Run from the project root: python benchmarks/journal_restart.py
+"""
+import os
+import sys
+import time
+import shutil
+import logging
+import tempfile
+import threading
+
+sys.path.insert(0, os.getcwd())
+from app import App  # noqa: E402
+from app.commands.cache import resolved  # noqa: E402
+from app.commands.metrics import LatencyHistogram  # noqa: E402
+from app.journal import Journal  # noqa: E402
+from app.plugins.history import FitnessHistory  # noqa: E402
+
+SESSIONS = 1_000_000
+USERS = 1_000
+WRITERS = 16
+WRITES_PER_WRITER = 200
+TAIL = 100_000
+
+
+def measure_adds(directory, write_behind=False):
+    journal = Journal(directory, commit_delay=0.01 if write_behind else 0.0, write_behind=write_behind)
+    latency = LatencyHistogram()
+    histories = [FitnessHistory(user_id=n) for n in range(WRITERS)]
+    for history in histories:
+        history.journal = journal
+
+    def writer(history):
+        for _ in range(WRITES_PER_WRITER):
+            start = time.perf_counter()
+            history.add_workout_session({'duration': 30, 'calories_burned': 300})
+            latency.record(time.perf_counter() - start)  # Unlocked; close enough for a benchmark
+
+    threads = [threading.Thread(target=writer, args=(history,)) for history in histories]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    journal.close()
+    stats = journal.stats()
+    print(f"{'write-behind' if write_behind else 'durable'} adds from {WRITERS} threads: "
+          f"{stats['records'] / elapsed:,.0f}/s, add p50 {latency.percentile(50) * 1000:.3f} ms, "
+          f"p99 {latency.percentile(99) * 1000:.3f} ms, {stats['records'] / stats['batches']:.1f} records per fsync, "
+          f"flush p99 {stats['flush_p99_ms']:.2f} ms, max queue depth {stats['max_queue_depth']}")
+
+
+def log_sessions(count):
+    """Append sessions to the app's journal as if they had been added before a crash; returns its size."""
+    journal = Journal(os.path.join(os.environ['CACHE_DIR'], 'journal'))
+    for i in range(count):
+        journal.append({'command': 'FitnessHistory', 'user': i % USERS,
+                        'session': {'duration': 30 + i % 60, 'calories_burned': 300,
+                                    'timestamp': '2024-01-01T08:00:00'}})
+    journal.close()
+    return sum(os.path.getsize(os.path.join(journal.directory, name)) for name in journal.segments())
+
+
+def start_app():
+    start = time.perf_counter()
+    app = App()
+    app.load_plugins()
+    resolved(app.command_handler.get_command('fitness_history'))  # Imports the plugin and replays the journal
+    return app, time.perf_counter() - start
+
+
+def main():
+    logging.disable(logging.INFO)
+    cache_dir = tempfile.mkdtemp(prefix='journal-bench-')
+    os.environ.update(CACHE_DIR=cache_dir, STATS_DUMP_INTERVAL='0', SNAPSHOT_INTERVAL='0')
+    try:
+        measure_adds(os.path.join(cache_dir, 'group-commit'))
+        measure_adds(os.path.join(cache_dir, 'write-behind'), write_behind=True)
+
+        start = time.perf_counter()
+        size = log_sessions(SESSIONS - TAIL)
+        print(f"logged {SESSIONS - TAIL:,} sessions for {USERS} users in {time.perf_counter() - start:.1f}s "
+              f"({size / 2 ** 20:.0f} MB)")
+        app, elapsed = start_app()
+        print(f"restart replaying the whole journal: {elapsed:.2f}s")
+        start = time.perf_counter()
+        app.shutdown()
+        print(f"checkpoint on shutdown: {time.perf_counter() - start:.2f}s")
+
+        log_sessions(TAIL)
+        app, elapsed = start_app()
+        print(f"restart from the snapshot plus {TAIL:,} tail records: {elapsed:.2f}s")
+        app.shutdown()
+
+        app, elapsed = start_app()
+        print(f"restart from the snapshot with an empty tail: {elapsed:.2f}s")
+        manager = app.session_managers['FitnessHistory']
+        start = time.perf_counter()
+        total = 0
+        for user_id in range(USERS):
+            with manager.session(user_id) as history:
+                total += history.summarize_history()['total_sessions']
+        assert total == SESSIONS
+        print(f"loading every user's snapshot on first use: {time.perf_counter() - start:.2f}s in total")
+        app.shutdown()
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Compare running a CPU-bound command in-process with sending it to the warm process pool.
+
+Each round runs CONCURRENCY calls at once from a thread pool, like the async REPL or
+daemon would; in-process calls then share one GIL while pooled calls run in parallel.
+
+Run from the project root: python benchmarks/process_pool.py
+"""
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.getcwd())
+from app.commands import Command, CommandHandler  # noqa: E402
+
+SIZES = [100, 1_000, 10_000, 100_000, 1_000_000]
+REPEATS = 5
+CONCURRENCY = 4
+
+
+class SumOfSquaresCommand(Command):
+    """Pure-Python loop standing in for a CPU-heavy plugin command."""
+    cpu_bound = True
+
+    def __init__(self, name, threshold):
+        super().__init__(name, "Sum the squares of a range.")
+        self.process_pool_threshold = threshold
+
+    def work_size(self, *args):
+        return int(args[0])
+
+    def execute(self, *args, **kwargs):
+        return sum(i * i for i in range(int(args[0])))
+
+
+def best_time(handler, name, size):
+    times = []
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as threads:
+        for _ in range(REPEATS):
+            start = time.perf_counter()
+            list(threads.map(lambda _: handler.invoke(name, str(size)), range(CONCURRENCY)))
+            times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    handler = CommandHandler(process_workers=CONCURRENCY)
+    handler.register_command(SumOfSquaresCommand('local', threshold=float('inf')))
+    handler.register_command(SumOfSquaresCommand('pooled', threshold=0))
+    handler.warm_process_pool()
+    crossover = None
+    try:
+        print(f"{CONCURRENCY} concurrent calls per round, best of {REPEATS}")
+        print(f"{'size':>10} {'in-process':>12} {'pool':>12}")
+        for size in SIZES:
+            local = best_time(handler, 'local', size)
+            pooled = best_time(handler, 'pooled', size)
+            if crossover is None and pooled < local:
+                crossover = size
+            print(f"{size:>10} {local * 1000:>10.3f}ms {pooled * 1000:>10.3f}ms")
+    finally:
+        handler.shutdown()
+    if crossover is None:
+        print("The pool never beat in-process execution at these sizes.")
+    else:
+        print(f"The pool wins from about {crossover} items; set process_pool_threshold near there.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Bytes per in-memory workout session: session dicts against WorkoutSession records.
+
+"dict" is what add_workout_session used to build, stamped with datetime.now().isoformat();
+"record" is a WorkoutSession from the same data. "columns" is the same sessions stored in
+a history for reference. Measured with tracemalloc, so it counts every object the
+sessions own, including their timestamp strings.
+
+Run from the project root: python benchmarks/session_records.py [count]
+"""
+import os
+import sys
+import time
+import random
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.getcwd())
+from app.plugins.history.columns import SessionColumns  # noqa: E402
+from app.plugins.history.records import WorkoutSession  # noqa: E402
+
+COUNT = 1_000_000
+TYPES = ['run', 'swim', 'cycle', 'lift', 'yoga']
+
+
+def make_data(count):
+    """Session fields as they arrive, e.g. parsed from JSON: every exercise name is its own string."""
+    rng = random.Random(42)
+    start = datetime(2024, 1, 1, 6, 0, 0, 123456)
+    return [({'duration': rng.randint(10, 120), 'calories_burned': rng.randint(50, 1200),
+              'type': ''.join(rng.choice(TYPES))},
+             start + timedelta(minutes=17 * i, microseconds=i)) for i in range(count)]
+
+
+def measure(build):
+    start = time.perf_counter()
+    build()
+    elapsed = time.perf_counter() - start  # Timed apart from tracemalloc, which slows allocation down
+    tracemalloc.start()
+    sessions = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return sessions, size, elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else COUNT
+    data = make_data(count)
+
+    def build_dicts():
+        sessions = []
+        for fields, stamped in data:
+            session = dict(fields)
+            session['timestamp'] = stamped.isoformat()
+            sessions.append(session)
+        return sessions
+
+    def build_records():
+        return [WorkoutSession.from_dict(fields, stamped) for fields, stamped in data]
+
+    def build_columns():
+        columns = SessionColumns()
+        columns.extend(build_records())
+        return columns
+
+    dicts, dict_bytes, dict_s = measure(build_dicts)
+    records, record_bytes, record_s = measure(build_records)
+    assert [record.to_dict() for record in records[:1000]] == dicts[:1000]
+    del dicts, records
+    _, column_bytes, column_s = measure(build_columns)
+    print(f"{count:,} sessions")
+    for name, size, elapsed in [('dict', dict_bytes, dict_s), ('record', record_bytes, record_s),
+                                ('columns', column_bytes, column_s)]:
+        print(f"{name:<8} {size / count:>7.1f} bytes/session {size / 2 ** 20:>8.1f}MB  built in {elapsed:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
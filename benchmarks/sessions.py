@@ -0,0 +1,50 @@
+"""Serve tens of thousands of users' histories from one SessionManager under a memory budget.
+
+Run from the project root: python benchmarks/sessions.py
+"""
+import os
+import sys
+import time
+import random
+import logging
+import tempfile
+
+sys.path.insert(0, os.getcwd())
+from app.plugins.history import FitnessHistory  # noqa: E402
+from app.sessions import SessionManager  # noqa: E402
+
+USERS = 20_000
+SESSIONS_PER_USER = 20
+REQUESTS = 100_000
+BUDGET_MB = 16
+
+
+def main():
+    random.seed(42)
+    logging.disable(logging.INFO)  # add_workout_session logs every session
+    with tempfile.TemporaryDirectory() as storage_dir:
+        manager = SessionManager(lambda user_id: FitnessHistory(user_id=user_id), storage_dir, BUDGET_MB * 2 ** 20)
+        start = time.perf_counter()
+        for user in range(USERS):
+            with manager.session(user) as history:
+                for _ in range(SESSIONS_PER_USER):
+                    history.add_workout_session({'duration': 30, 'calories_burned': 300}, timestamp='2024-01-01T00:00:00')
+        print(f"created {USERS} users in {time.perf_counter() - start:.1f}s: {manager.stats()}")
+
+        # A few users are active most of the time, as in real traffic.
+        users = [min(int(random.paretovariate(1.2)) - 1, USERS - 1) * 7919 % USERS for _ in range(REQUESTS)]
+        loads_before = manager.stats()['loads']
+        start = time.perf_counter()
+        for user in users:
+            with manager.session(user) as history:
+                history.summarize_history()
+        elapsed = time.perf_counter() - start
+        stats = manager.stats()
+        misses = stats['loads'] - loads_before
+        print(f"{REQUESTS} requests in {elapsed:.2f}s ({REQUESTS / elapsed:,.0f}/s), "
+              f"{1 - misses / REQUESTS:.1%} served from memory")
+        print(f"{stats['in_memory']} users in memory using {stats['memory_used'] / 2 ** 20:.1f} of {BUDGET_MB} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+# client.py
+"""Send one command line to a running `python main.py --serve` and print its output.
+
+Deliberately imports nothing from the app package so each invocation stays cheap.
+"""
+import os
+import sys
+import socket
+
+STATUS_MARKER = b'\x00'
+USER_MARKER = b'\x01'
+
+
+def default_socket_path():
+    return os.environ.get('APP_SOCKET') or os.path.join(os.environ.get('CACHE_DIR', 'cache'), 'app.sock')
+
+
+def send_command(command_line, out, socket_path=None, user_id=None):
+    """Stream the server's output for command_line into out (a binary file). Returns the exit status.
+
+    With a user_id, per-user commands such as fitness_history act on that user's own state.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path or default_socket_path())
+        if user_id:
+            sock.sendall(USER_MARKER + user_id.encode('utf-8') + b'\n')
+        sock.sendall(command_line.encode('utf-8') + b'\n')
+        pending = b''
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            pending += chunk
+            # Hold back the last two bytes, which may be the status trailer.
+            out.write(pending[:-2])
+            pending = pending[-2:]
+    out.flush()
+    if len(pending) == 2 and pending[:1] == STATUS_MARKER:
+        return int(pending[1:])
+    out.write(pending)
+    return 1
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(send_command(' '.join(sys.argv[1:]), sys.stdout.buffer, user_id=os.environ.get('USER_ID')))
+    except (FileNotFoundError, ConnectionRefusedError):
+        sys.stderr.write("No server running. Start one with: python main.py --serve\n")
+        sys.exit(2)
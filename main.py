@@ -1,6 +1,23 @@
 # main.py
-from app import App    
+import argparse
+from app import App
 
 
 if __name__ == "__main__":
-    app = App().start()  
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--serve', action='store_true', help="Keep the app running behind a Unix socket for client.py.")
+    parser.add_argument('--socket', help="Socket path for --serve (defaults to APP_SOCKET or cache/app.sock).")
+    parser.add_argument('--http', action='store_true', help="Serve the commands as a JSON API over HTTP.")
+    parser.add_argument('--host', help="Address for --http (defaults to API_HOST or 127.0.0.1).")
+    parser.add_argument('--port', type=int, help="Port for --http (defaults to API_PORT or 8080).")
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help="Use the asyncio REPL, which keeps accepting input while commands run.")
+    options = parser.parse_args()
+    if options.serve:
+        App().serve(options.socket)
+    elif options.http:
+        App().serve_http(options.host, options.port)
+    elif options.use_async:
+        App().start_async()
+    else:
+        app = App().start()
@@ -0,0 +1,89 @@
+import asyncio
+from aiohttp.test_utils import TestClient, TestServer
+from app import App
+from app.api import CommandAPI
+from app.commands import Command
+
+
+class CountdownCommand(Command):
+    """Prints a line per step and returns the steps as a generator."""
+    def __init__(self):
+        super().__init__("countdown", "Count down from a number.")
+
+    def execute(self, *args, **kwargs):
+        steps = int(args[0]) if args else 3
+        print(f"counting down from {steps}")
+        return (step for step in range(steps, 0, -1))
+
+
+def run_with_client(monkeypatch, tmp_path, test, **limits):
+    """Run test(client, api) against a CommandAPI for a loaded App."""
+    monkeypatch.setenv('CACHE_DIR', str(tmp_path))
+    monkeypatch.setenv('STATS_DUMP_INTERVAL', '0')
+    app = App()
+    app.load_plugins()
+    app.register_builtin_commands()
+    app.command_handler.register_command(CountdownCommand())
+
+    async def main():
+        api = CommandAPI(app, **limits)
+        async with TestClient(TestServer(api.make_application())) as client:
+            await test(client, api)
+    try:
+        asyncio.run(main())
+    finally:
+        app.command_handler.shutdown()
+
+
+def test_list_and_execute_commands(monkeypatch, tmp_path):
+    """Test listing commands and running one with its printed output and result."""
+    async def test(client, api):
+        response = await client.get('/commands')
+        names = [command['name'] for command in (await response.json())['commands']]
+        assert 'fitness_history' in names and 'countdown' in names
+
+        response = await client.post('/commands/fitness_history', json={'args': ['summary']})
+        assert response.status == 200
+        assert (await response.json())['result']['total_sessions'] == 0
+
+        response = await client.post('/commands/show_menu')
+        assert "fitness_history:" in (await response.json())['output']
+
+        response = await client.post('/input', json={'input': 'countdown 2'})
+        assert (await response.json()) == {'result': [2, 1], 'output': "counting down from 2\n"}
+    run_with_client(monkeypatch, tmp_path, test)
+
+
+def test_unknown_command_and_bad_body(monkeypatch, tmp_path):
+    """Test that errors map to HTTP status codes."""
+    async def test(client, api):
+        response = await client.post('/commands/fitness_histroy')
+        assert response.status == 404
+        assert (await response.json())['suggestions'] == ['fitness_history']
+
+        response = await client.post('/commands/countdown', data=b'not json')
+        assert response.status == 400
+    run_with_client(monkeypatch, tmp_path, test)
+
+
+def test_streamed_response(monkeypatch, tmp_path):
+    """Test that a streamed response carries output, items and a final status as NDJSON."""
+    async def test(client, api):
+        response = await client.post('/commands/countdown?stream=1', json={'args': [3]})
+        assert response.headers['Content-Type'] == 'application/x-ndjson'
+        lines = (await response.text()).splitlines()
+        assert lines == ['{"output":"counting down from 3"}', '{"output":"\\n"}',
+                         '{"item":3}', '{"item":2}', '{"item":1}', '{"status":"ok"}']
+    run_with_client(monkeypatch, tmp_path, test)
+
+
+def test_requests_beyond_queue_are_rejected(monkeypatch, tmp_path):
+    """Test that requests get 503 once the concurrency limit and queue are full."""
+    async def test(client, api):
+        await api.semaphore.acquire()  # The only slot is busy
+        response = await client.post('/commands/countdown')
+        assert response.status == 503
+        api.semaphore.release()
+        response = await client.post('/commands/countdown')
+        assert response.status == 200
+    run_with_client(monkeypatch, tmp_path, test, max_concurrency=1, max_queue=0)
@@ -0,0 +1,77 @@
+import time
+import asyncio
+from app import App
+from app.commands import Command, CommandHandler
+
+
+class SleepyCommand(Command):
+    """Synchronous command that blocks for a while."""
+    def __init__(self):
+        super().__init__("sleepy", "Block for a moment.")
+        self.calls = 0
+
+    def execute(self, *args, **kwargs):
+        time.sleep(0.2)
+        self.calls += 1
+
+
+class AsyncEchoCommand(Command):
+    """Command with an async execute method."""
+    def __init__(self):
+        super().__init__("echo", "Echo the arguments asynchronously.")
+        self.received = None
+
+    async def execute(self, *args, **kwargs):
+        await asyncio.sleep(0)
+        self.received = args
+
+
+def test_async_command_awaited():
+    """Test that async commands are awaited on the async path."""
+    handler = CommandHandler()
+    echo = AsyncEchoCommand()
+    handler.register_command(echo)
+    assert asyncio.run(handler.execute_command_async("echo", "a", "b"))
+    assert echo.received == ("a", "b")
+
+
+def test_async_command_from_sync_path():
+    """Test that execute_command still runs commands defined with async def."""
+    handler = CommandHandler()
+    echo = AsyncEchoCommand()
+    handler.register_command(echo)
+    assert handler.execute_command("echo", "x")
+    assert echo.received == ("x",)
+
+
+def test_sync_commands_run_concurrently_on_thread_pool():
+    """Test that blocking commands run on the pool instead of the event loop."""
+    handler = CommandHandler(max_workers=4)
+    sleepy = SleepyCommand()
+    handler.register_command(sleepy)
+
+    async def run_four():
+        return await asyncio.gather(*(handler.execute_command_async("sleepy") for _ in range(4)))
+
+    start = time.perf_counter()
+    assert all(asyncio.run(run_four()))
+    assert time.perf_counter() - start < 0.6
+    assert sleepy.calls == 4
+    handler.shutdown()
+
+
+def test_async_unknown_command():
+    """Test that unknown commands fail on the async path too."""
+    assert not asyncio.run(CommandHandler().execute_command_async("missing"))
+
+
+def test_async_repl_waits_for_running_commands(monkeypatch, tmp_path):
+    """Test that the async REPL accepts input while a command runs and finishes it before exiting."""
+    monkeypatch.setenv('CACHE_DIR', str(tmp_path))
+    inputs = iter(['sleepy', 'sleepy', 'exit'])
+    monkeypatch.setattr('builtins.input', lambda _: next(inputs))
+    app = App()
+    sleepy = SleepyCommand()
+    app.command_handler.register_command(sleepy)
+    app.start_async()
+    assert sleepy.calls == 2
@@ -0,0 +1,83 @@
+import time
+from app.commands import Command, CommandHandler
+from app.commands.cache import ResultCache
+
+
+class CountingCommand(Command):
+    idempotent = True
+
+    def __init__(self, name="count", cache_ttl=None, cache_persistent=False):
+        super().__init__(name, "Count how often the real work runs.")
+        self.cache_ttl = cache_ttl
+        self.cache_persistent = cache_persistent
+        self.calls = 0
+
+    def execute(self, *args, **kwargs):
+        self.calls += 1
+        return (self.calls, args)
+
+
+def test_idempotent_results_are_cached_per_arguments():
+    """Test that repeated calls hit the cache and different arguments miss it."""
+    handler = CommandHandler()
+    command = CountingCommand()
+    handler.register_command(command)
+    assert handler.invoke("count", "a") == (1, ("a",))
+    assert handler.invoke("count", "a") == (1, ("a",))
+    assert handler.invoke("count", "b") == (2, ("b",))
+    assert handler.result_cache.stats()["count"] == (1, 2)
+
+
+def test_invalidation_hook_and_explicit_invalidation():
+    """Test that invalidate_cache on the command or the handler forces recomputation."""
+    handler = CommandHandler()
+    command = CountingCommand()
+    handler.register_command(command)
+    handler.invoke("count")
+    command.invalidate_cache()
+    assert handler.invoke("count")[0] == 2
+    handler.invalidate_cache("count")
+    assert handler.invoke("count")[0] == 3
+
+
+def test_ttl_and_lru_limits():
+    """Test that entries expire after their TTL and the LRU stays within its size."""
+    handler = CommandHandler(result_cache_size=2)
+    command = CountingCommand(cache_ttl=0.05)
+    handler.register_command(command)
+    handler.invoke("count")
+    time.sleep(0.06)
+    assert handler.invoke("count")[0] == 2
+    handler.invoke("count", "x")
+    handler.invoke("count", "y")
+    assert len(handler.result_cache.entries) == 2
+
+
+def test_persistent_entries_survive_restart(tmp_path):
+    """Test that only commands opting into persistence are saved and reloaded."""
+    path = str(tmp_path / "results.pickle")
+    handler = CommandHandler()
+    handler.register_command(CountingCommand("durable", cache_persistent=True))
+    handler.register_command(CountingCommand("volatile"))
+    handler.invoke("durable")
+    handler.invoke("volatile")
+    handler.result_cache.save(path)
+
+    restarted = CommandHandler()
+    restarted.result_cache.load(path)
+    durable = CountingCommand("durable", cache_persistent=True)
+    volatile = CountingCommand("volatile")
+    restarted.register_command(durable)
+    restarted.register_command(volatile)
+    assert restarted.invoke("durable") == (1, ())
+    assert durable.calls == 0
+    restarted.invoke("volatile")
+    assert volatile.calls == 1
+
+
+def test_non_idempotent_commands_are_not_cached():
+    """Test that commands have to opt in to caching."""
+    cache = ResultCache()
+    command = CountingCommand()
+    command.idempotent = False
+    assert cache.key_for(command, ()) is None
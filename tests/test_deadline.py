@@ -0,0 +1,94 @@
+import time
+import asyncio
+import threading
+import pytest
+from app.commands import Command, CommandHandler, CommandTimeoutError, CommandCancelledError
+from app.commands.deadline import cancellation_requested
+
+
+class SlowCommand(Command):
+    """Sleeps in small steps and stops early once cancelled."""
+    def __init__(self, timeout=None):
+        super().__init__("slow", "Take a while.")
+        self.timeout = timeout
+        self.stopped_early = threading.Event()
+
+    def execute(self, *args, **kwargs):
+        for _ in range(100):
+            if cancellation_requested():
+                self.stopped_early.set()
+                return None
+            time.sleep(0.01)
+        return "finished"
+
+
+class InterruptedCommand(Command):
+    def __init__(self):
+        super().__init__("interrupted", "Simulates Ctrl-C while running.")
+
+    def execute(self, *args, **kwargs):
+        raise KeyboardInterrupt
+
+
+class AsyncSlowCommand(Command):
+    def __init__(self, timeout=None):
+        super().__init__("async_slow", "Take a while asynchronously.")
+        self.timeout = timeout
+
+    async def execute(self, *args, **kwargs):
+        await asyncio.sleep(5)
+
+
+def test_command_timeout_abandons_worker():
+    """Test that a per-command deadline raises quickly and signals the worker."""
+    handler = CommandHandler()
+    command = SlowCommand(timeout=0.05)
+    handler.register_command(command)
+    start = time.perf_counter()
+    with pytest.raises(CommandTimeoutError):
+        handler.invoke("slow")
+    assert time.perf_counter() - start < 0.5
+    assert command.stopped_early.wait(1)
+    assert handler.metrics.snapshot()["slow"]["outcomes"]["timeout"] == 1
+    assert not handler.execute_command("slow")
+
+
+def test_global_default_timeout():
+    """Test that the handler's default deadline applies to commands without their own."""
+    handler = CommandHandler(default_timeout=0.05)
+    handler.register_command(SlowCommand())
+    with pytest.raises(CommandTimeoutError):
+        handler.invoke("slow")
+
+
+def test_keyboard_interrupt_cancels_only_the_command():
+    """Test that Ctrl-C inside a command becomes CommandCancelledError."""
+    handler = CommandHandler()
+    handler.register_command(InterruptedCommand())
+    with pytest.raises(CommandCancelledError):
+        handler.invoke("interrupted")
+    assert handler.metrics.snapshot()["interrupted"]["outcomes"]["cancelled"] == 1
+
+
+def test_async_timeout_and_cancellation():
+    """Test deadlines and task cancellation on the async path."""
+    handler = CommandHandler()
+    handler.register_command(AsyncSlowCommand(timeout=0.05))
+    with pytest.raises(CommandTimeoutError):
+        asyncio.run(handler.invoke_async("async_slow"))
+
+    handler.register_command(SlowCommand())
+
+    async def cancel_soon():
+        task = asyncio.create_task(handler.invoke_async("slow"))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_soon())
+    assert handler.commands["slow"].stopped_early.wait(1)
+    outcomes = handler.metrics.snapshot()
+    assert outcomes["async_slow"]["outcomes"]["timeout"] == 1
+    assert outcomes["slow"]["outcomes"]["cancelled"] == 1
+    handler.shutdown()
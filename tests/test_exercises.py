@@ -0,0 +1,104 @@
+import pickle
+import random
+from app.plugins.history import FitnessHistory
+from app.plugins.history import exercises
+from app.plugins.history.columns import SessionColumns
+
+TYPES = ['run', 'swim', 'squat']
+
+
+def random_sessions(count=3000, seed=3):
+    """Sessions with tied, float, missing and non-numeric values, and an extra 'weight' field on some."""
+    rng = random.Random(seed)
+    sessions = []
+    for i in range(count):
+        session = {'type': rng.choice(TYPES), 'duration': rng.randint(1, 100),
+                   'calories_burned': rng.choice([rng.randint(1, 900), rng.random() * 900]),
+                   'timestamp': f'2024-01-{1 + i % 28:02d}T{i % 24:02d}:00:00'}
+        if i % 7 == 0:
+            session['weight'] = rng.randint(20, 200)
+        if i % 11 == 0:
+            del session['duration']
+        if i % 13 == 0:
+            session['calories_burned'] = 'n/a'
+        sessions.append(session)
+    return sessions
+
+
+def scan_top(history, exercise, field, k):
+    matching = [(session[field], -row, session) for row, session in enumerate(history.history)
+                if session.get('type') == exercise and isinstance(session.get(field), (int, float))]
+    return [session for *_, session in sorted(matching, key=lambda entry: entry[:2], reverse=True)[:k]]
+
+
+def test_index_matches_a_full_scan_whichever_way_sessions_arrive():
+    """Test that records and top sessions are the same added one by one, in batches or built from the store."""
+    sessions = random_sessions()
+    one_by_one = FitnessHistory()
+    for session in sessions:
+        one_by_one.add_workout_session(dict(session), timestamp=session['timestamp'])
+    batched = FitnessHistory()
+    batched.add_workout_sessions(sessions[:1000])
+    columns = SessionColumns()
+    columns.extend(sessions[1000:])
+    batched.add_workout_sessions(columns)
+    rebuilt = FitnessHistory()
+    rebuilt.history = one_by_one.history
+
+    for history in (batched, rebuilt):
+        assert history.personal_records() == one_by_one.personal_records()
+        assert history.records_set() == one_by_one.records_set()
+    for exercise in TYPES:
+        for field in ('duration', 'calories_burned', 'weight'):
+            best = scan_top(one_by_one, exercise, field, 25)
+            assert one_by_one.personal_records(exercise)[field]['value'] == best[0][field]
+            for k in (1, 5, 25):  # 25 is more than the index keeps
+                for history in (one_by_one, batched, rebuilt):
+                    assert history.top_sessions(exercise, field, k) == best[:k]
+
+
+def test_personal_records_raise_events_as_they_are_set(monkeypatch):
+    """Test that listeners hear of each record the moment it is set, and a failing listener doesn't stop the rest."""
+    monkeypatch.setattr(exercises, 'RECORD_LISTENERS', [])
+    events = []
+    exercises.register_record_listener(lambda user_id, record: 1 / 0)
+    exercises.register_record_listener(lambda user_id, record: events.append((user_id, record)))
+    history = FitnessHistory('alice')
+    heard = []
+    for timestamp, duration, weight in [('2024-05-01T07:00:00', 30, 80), ('2024-05-02T07:00:00', 25, 100),
+                                        ('2024-05-03T07:00:00', 30, 90), ('2024-06-01T07:00:00', 45, 100)]:
+        history.add_workout_session({'type': 'squat', 'duration': duration, 'weight': weight}, timestamp=timestamp)
+        heard.append(len(events))
+    assert heard == [2, 3, 3, 4]
+
+    assert [(user_id, record['field'], record['value'], record['previous']) for user_id, record in events] == [
+        ('alice', 'duration', 30, None), ('alice', 'weight', 80, None), ('alice', 'weight', 100, 80),
+        ('alice', 'duration', 45, 30)]
+    assert history.execute('records', 'squat') == {'duration': {'value': 45, 'timestamp': '2024-06-01T07:00:00'},
+                                                   'weight': {'value': 100, 'timestamp': '2024-05-02T07:00:00'}}
+    assert history.records_set(since='2024-06-01') == [
+        {'exercise': 'squat', 'field': 'duration', 'value': 45, 'previous': 30, 'timestamp': '2024-06-01T07:00:00'}]
+    assert [session['weight'] for session in history.execute('top', 'squat', 'weight', '3')] == [100, 100, 90]
+
+    history.add_workout_sessions([{'type': 'squat', 'weight': 120, 'timestamp': '2024-06-02T07:00:00'}])
+    assert len(events) == 4 and history.personal_records('squat')['weight']['value'] == 120
+
+
+def test_index_survives_pickling_and_works_over_sqlite(tmp_path):
+    """Test that a pickled history keeps its index, and that a SQLite-backed one answers from its own."""
+    sessions = random_sessions(500)
+    history = FitnessHistory('bob', database_url=f"sqlite:///{tmp_path / 'history.db'}")
+    history.add_workout_sessions(sessions[:400])
+    for session in sessions[400:]:
+        history.add_workout_session(dict(session), timestamp=session['timestamp'])
+    expected = FitnessHistory()
+    expected.add_workout_sessions(sessions)
+    assert history.personal_records() == expected.personal_records()
+    assert history.top_sessions('run', 'calories_burned', 3) == expected.top_sessions('run', 'calories_burned', 3)
+    assert [session['duration'] for session in history.top_sessions('run', 'duration', 20)] == [
+        session['duration'] for session in expected.top_sessions('run', 'duration', 20)]
+
+    restored = pickle.loads(pickle.dumps(expected))
+    assert restored.exercises is not None
+    assert restored.records_set() == expected.records_set()
+    assert restored.top_sessions('swim', 'duration', 10) == expected.top_sessions('swim', 'duration', 10)
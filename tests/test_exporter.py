@@ -0,0 +1,65 @@
+import gzip
+import orjson
+import pytest
+from app.plugins.history import FitnessHistory
+from app.plugins.history.exporter import ExportFormatError
+
+SESSIONS = [({'duration': 30, 'calories_burned': 300, 'type': 'run'}, '2024-03-01T08:00:00'),
+            ({'duration': 60, 'calories_burned': 450.5, 'type': 'swim', 'notes': ['pool', {'laps': 40}]},
+             '2024-03-02T08:00:00.250000'),
+            ({'duration': 45, 'calories_burned': 'unknown', 'type': 'run'}, '2024-03-03T08:00:00'),
+            ({'duration': 15, 'type': 'a},{b'}, '2024-03-04T08:00:00'),
+            ({'calories_burned': 120, 'type': 'run'}, '2024-03-05T08:00:00')]
+
+
+def fill(history):
+    for session, timestamp in SESSIONS:
+        history.add_workout_session(dict(session), timestamp=timestamp)
+    return history
+
+
+@pytest.mark.parametrize('database', [False, True])
+def test_jsonl_export_round_trips(tmp_path, database):
+    """Test that a gzipped JSONL export, from the columns or SQLite, imports back to the same sessions."""
+    history = fill(FitnessHistory('alice', database_url=f"sqlite:///{tmp_path / 'history.db'}" if database else None))
+    path = tmp_path / 'export.jsonl.gz'
+    report = history.export_sessions(path)
+    assert report['sessions'] == 5 and report['bytes'] == path.stat().st_size
+    with gzip.open(path) as f:
+        assert [orjson.loads(line) for line in f] == list(history.history)
+
+    restored = FitnessHistory()
+    assert restored.import_sessions(path)['errors'] == [
+        {'line': 3, 'error': "calories_burned is not a number: 'unknown'"}]
+    assert list(restored.history) == [session for i, session in enumerate(history.history) if i != 2]
+
+
+def test_filtered_csv_export(tmp_path):
+    """Test that time-ranged and field-filtered CSV exports hold just those sessions, with a column per field."""
+    history = fill(FitnessHistory())
+    path = tmp_path / 'runs.csv'
+    assert history.execute('export', str(path), '2024-03-02', fields={'type': 'run'})['sessions'] == 2
+    assert path.read_text().splitlines() == ['timestamp,duration,calories_burned,type,notes',
+                                             '2024-03-03T08:00:00,45,unknown,run,',
+                                             '2024-03-05T08:00:00,,120,run,']
+    history.export_sessions(path, until='2024-03-03')
+    assert path.read_text().splitlines()[1:] == ['2024-03-01T08:00:00,30,300.0,run,',
+                                                 '2024-03-02T08:00:00.250000,60,450.5,swim,'
+                                                 '"[""pool"",{""laps"":40}]"']
+
+
+def test_chunks_are_bounded_and_failed_exports_leave_no_file(tmp_path):
+    """Test that stores yield chunks of at most the requested size, and that an unwritable export changes nothing."""
+    history = fill(FitnessHistory())
+    assert [len(chunk) for chunk in history.history.chunks(size=2)] == [2, 2, 1]
+    assert [len(chunk) for chunk in history.history.chunks(size=2, type='run')] == [1, 1, 1]
+    with pytest.raises(ExportFormatError):
+        history.export_sessions(tmp_path / 'export.xlsx')
+
+    path = tmp_path / 'export.jsonl'
+    path.write_bytes(b'kept\n')
+    history.history.columns['notes'].values[1] = object()  # Can't be encoded
+    with pytest.raises(TypeError):
+        history.export_sessions(path)
+    assert path.read_bytes() == b'kept\n'
+    assert [p.name for p in tmp_path.iterdir()] == ['export.jsonl']
@@ -0,0 +1,162 @@
+import pickle
+import threading
+import numpy as np
+import pytest
+from app.plugins.history import FitnessHistory, register_aggregate
+from app.plugins.history.aggregates import AGGREGATES
+from app.plugins.history.columns import SessionColumns
+
+
+def test_sessions_round_trip_through_columns():
+    """Test that sessions read back as the dicts that were added, whatever their field types."""
+    history = FitnessHistory(user_id='alice')
+    history.add_workout_session({'duration': 30, 'calories_burned': 250, 'type': 'run'})
+    history.add_workout_session({'duration': 45.5, 'calories_burned': 400, 'type': 'swim', 'notes': ['pool']})
+    history.add_workout_session({'duration': 20, 'calories_burned': 'unknown', 'type': 'run'})
+
+    sessions = list(history.history)
+    assert sessions[0]['duration'] == 30 and sessions[0]['type'] == 'run'
+    assert 'notes' not in sessions[0]
+    assert sessions[1]['notes'] == ['pool']
+    assert sessions[2]['calories_burned'] == 'unknown'  # Column fell back to Python objects
+    last = history.get_last_session()
+    assert last['duration'] == 20
+    assert last['timestamp'] == history.history.row(2)['timestamp']
+    assert isinstance(history.history.values('type'), np.ndarray)
+
+
+def test_summaries_and_filters_are_vectorized():
+    """Test totals over every session and over sessions filtered by time range and category."""
+    history = FitnessHistory()
+    for day, (duration, kind) in enumerate([(30, 'run'), (60, 'swim'), (45, 'run'), (15, 'run')], start=1):
+        history.add_workout_session({'duration': duration, 'calories_burned': duration * 10, 'type': kind},
+                                    timestamp=f'2024-03-0{day}T08:00:00')
+
+    assert history.summarize_history() == {
+        'total_sessions': 4, 'total_time_spent': 150, 'total_calories_burned': 1500}
+    assert history.summarize_history(type='run')['total_time_spent'] == 90
+    assert history.summarize_history(since='2024-03-02', until='2024-03-04') == {
+        'total_sessions': 2, 'total_time_spent': 105, 'total_calories_burned': 1050}
+    assert history.summarize_history(type='cycle')['total_sessions'] == 0
+    strings = FitnessHistory()
+    strings.add_workout_session({'duration': 'long', 'calories_burned': 'many', 'type': 'run'})
+    assert strings.summarize_history(type='run') == strings.summarize_history() == {
+        'total_sessions': 1, 'total_time_spent': 0, 'total_calories_burned': 0}
+    assert FitnessHistory().summarize_history() == {
+        'total_sessions': 0, 'total_time_spent': 0, 'total_calories_burned': 0}
+
+
+def test_columns_pickle_without_spare_capacity():
+    """Test that a pickled store keeps its sessions and can keep growing after loading."""
+    columns = SessionColumns()
+    for i in range(20):
+        columns.append({'duration': i, 'type': 'run' if i % 2 else 'lift'})
+    capacity, durations = columns.capacity, columns.columns['duration'].values
+    restored = pickle.loads(pickle.dumps(columns))
+    assert restored.capacity == 20
+    assert columns.capacity == capacity > 20 and columns.columns['duration'].values is durations  # Left as it was
+    restored.append({'duration': 20, 'type': 'swim'})
+    assert len(restored) == 21
+    assert restored[-1] == {'duration': 20, 'type': 'swim'}
+    assert restored.sum('duration') == sum(range(21))
+
+
+def test_running_aggregates_match_a_full_scan():
+    """Test that the Welford mean and variance and the min/max track every added session."""
+    history = FitnessHistory()
+    durations = [30, 45, 12.5, 60, 33]
+    for duration in durations:
+        history.add_workout_session({'duration': duration, 'calories_burned': 100})
+    stats = history.statistics()
+    assert stats['sessions'] == 5
+    assert stats['duration']['sum'] == sum(durations)
+    assert (stats['duration']['min'], stats['duration']['max']) == (12.5, 60)
+    assert stats['duration']['mean'] == pytest.approx(np.mean(durations))
+    assert stats['duration']['variance'] == pytest.approx(np.var(durations))
+    assert stats['calories_burned']['variance'] == 0
+
+
+class LongestStreak:
+    """Plugin-style aggregate: most sessions in a row of the same type."""
+    def __init__(self):
+        self.last_type, self.current, self.best = None, 0, 0
+
+    def add(self, session):
+        self.current = self.current + 1 if session.get('type') == self.last_type else 1
+        self.last_type = session.get('type')
+        self.best = max(self.best, self.current)
+
+    def value(self):
+        return self.best
+
+
+def test_registered_aggregates_catch_up_on_existing_histories(monkeypatch):
+    """Test that an aggregate registered after sessions were added is backfilled, then kept current."""
+    history = FitnessHistory()
+    for kind in ['run', 'run', 'swim']:
+        history.add_workout_session({'duration': 10, 'calories_burned': 50, 'type': kind})
+    monkeypatch.setitem(AGGREGATES, 'longest_streak', None)  # Unregistered again after the test
+    register_aggregate('longest_streak', LongestStreak)
+    assert history.statistics()['longest_streak'] == 2
+    for kind in ['swim', 'swim']:
+        history.add_workout_session({'duration': 10, 'calories_burned': 50, 'type': kind})
+    assert history.statistics()['longest_streak'] == 3
+
+
+def test_batched_sessions_match_one_at_a_time():
+    """Test that record_sessions fills columns and aggregates exactly as repeated adds do."""
+    sessions = [{'duration': d, 'calories_burned': d * 9, 'type': t, 'timestamp': f'2024-05-0{i % 9 + 1}T07:30:00'}
+                for i, (d, t) in enumerate([(30, 'run'), (42.5, 'swim'), (15, 'run'), ('n/a', 'yoga')])]
+    one_by_one, batched = FitnessHistory(), FitnessHistory()
+    for session in sessions:
+        one_by_one.record_session(dict(session))
+    batched.record_sessions([dict(session) for session in sessions])
+
+    assert list(batched.history) == list(one_by_one.history) == sessions
+    assert batched.summarize_history(type='run') == one_by_one.summarize_history(type='run')
+    expected, actual = one_by_one.statistics(), batched.statistics()
+    assert actual['sessions'] == expected['sessions'] == 4
+    for name in ('count', 'sum', 'min', 'max'):
+        assert actual['calories_burned'][name] == expected['calories_burned'][name]
+    assert actual['duration']['variance'] == pytest.approx(expected['duration']['variance'])
+
+
+def test_reads_run_safely_alongside_adds():
+    """Test that filtered, ranged and indexed reads on one thread never see a half-grown history from another."""
+    history = FitnessHistory(user_id='alice')
+    errors = []
+    done = threading.Event()
+
+    def writer():
+        for i in range(1000):
+            history.add_workout_session({'duration': 30, 'calories_burned': 300, 'type': ('run', 'swim')[i % 2]},
+                                        timestamp=f'2024-01-{i % 28 + 1:02d}T{i % 24:02d}:00:00')
+        done.set()
+
+    def reader():
+        try:
+            while not done.is_set():
+                history.summarize_history(type='run')
+                history.sessions_between('2024-01-05', '2024-01-09')
+                history.top_sessions('run', 'calories_burned', 20)
+                history.training_load()
+        except Exception as e:  # Reported below, with the thread gone
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert history.summarize_history(type='run')['total_sessions'] == 500
+
+
+def test_memory_size_counts_the_indexes():
+    """Test that the size the session manager budgets includes the timeline and exercise index, not just the store."""
+    history = FitnessHistory(user_id='alice')
+    for day in range(1, 29):
+        history.add_workout_session({'duration': day, 'calories_burned': 10, 'type': 'run'}, timestamp=f'2024-02-{day:02d}')
+    timeline, exercises = history.current_timeline().nbytes(), history.current_exercises().nbytes()
+    assert timeline > 28 * 8 and exercises > 28 * 8
+    assert history.memory_size() == history.history.memory_size() + timeline + exercises
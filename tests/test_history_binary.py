@@ -0,0 +1,58 @@
+import struct
+import numpy as np
+import pytest
+from app.plugins.history import FitnessHistory
+from app.plugins.history.binary import FORMAT_VERSION, HEADER, BinaryFormatError, map_sessions
+
+
+def make_history():
+    history = FitnessHistory(user_id='alice')
+    history.add_workout_session({'duration': 30, 'calories_burned': 250, 'type': 'run'}, timestamp='2024-03-01T08:00:00')
+    history.add_workout_session({'duration': 45.5, 'calories_burned': 'unknown', 'type': 'swim', 'notes': ['pool']},
+                                timestamp='2024-03-02T08:00:00')
+    history.add_workout_session({'duration': 20, 'type': 'run', 'heart_rate': 150}, timestamp='2024-03-03T08:00:00')
+    return history
+
+
+def test_sessions_round_trip_through_a_mapped_file(tmp_path):
+    """Test that every field type reads back the same from the file, and summaries match."""
+    history = make_history()
+    path = tmp_path / 'alice.sessions'
+    history.save_sessions(path)
+
+    loaded = FitnessHistory.load_sessions(path, user_id='alice')
+    assert list(loaded.history) == list(history.history)
+    assert loaded.summarize_history() == history.summarize_history()
+    assert loaded.summarize_history(type='run', since='2024-03-02') == {
+        'total_sessions': 1, 'total_time_spent': 20, 'total_calories_burned': 0}
+    assert loaded.statistics() == history.statistics()
+
+
+def test_mapped_columns_are_views_of_the_file_until_changed(tmp_path):
+    """Test that loading maps the records instead of copying them, and adding copies them first."""
+    path = tmp_path / 'alice.sessions'
+    make_history().save_sessions(path)
+    loaded = FitnessHistory.load_sessions(path)
+    durations = loaded.history.columns['duration'].values
+    assert isinstance(durations, np.memmap) and not durations.flags.writeable
+
+    loaded.add_workout_session({'duration': 10, 'type': 'yoga'})
+    assert len(loaded.history) == 4
+    assert loaded.history[-1]['type'] == 'yoga'
+    assert map_sessions(path)[-1]['type'] == 'run'  # The file itself is unchanged
+
+
+def test_empty_histories_and_foreign_files(tmp_path):
+    """Test that an empty history round-trips and other files are refused with a clear error."""
+    path = tmp_path / 'empty.sessions'
+    FitnessHistory().save_sessions(path)
+    assert len(map_sessions(path)) == 0
+
+    data = bytearray(path.read_bytes())
+    struct.pack_into('<H', data, 8, FORMAT_VERSION + 1)
+    path.write_bytes(bytes(data))
+    with pytest.raises(BinaryFormatError, match='version'):
+        map_sessions(path)
+    (tmp_path / 'other').write_bytes(b'x' * HEADER.size)
+    with pytest.raises(BinaryFormatError, match='not a session file'):
+        map_sessions(tmp_path / 'other')
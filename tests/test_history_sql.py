@@ -0,0 +1,88 @@
+import pickle
+import pytest
+from app.plugins.history import FitnessHistory
+from app.plugins.history.sql import SQLSessions
+
+
+SESSIONS = [({'duration': 30, 'calories_burned': 300, 'type': 'run'}, '2024-03-01T08:00:00'),
+            ({'duration': 60, 'calories_burned': 450.5, 'type': 'swim', 'notes': ['pool']}, '2024-03-02T08:00:00'),
+            ({'duration': 45, 'calories_burned': 'unknown', 'type': 'run'}, '2024-03-03T08:00:00'),
+            ({'duration': 15.5, 'calories_burned': 120, 'type': 'run'}, '2024-03-04T08:00:00')]
+
+
+@pytest.fixture
+def database_url(tmp_path):
+    return f"sqlite:///{tmp_path / 'history.db'}"
+
+
+def fill(history):
+    for session, timestamp in SESSIONS:
+        history.add_workout_session(dict(session), timestamp=timestamp)
+    return history
+
+
+def test_sql_history_matches_the_in_memory_store(database_url):
+    """Test that sessions, summaries and statistics read the same from SQLite as from the columns."""
+    in_memory, stored = fill(FitnessHistory('alice')), fill(FitnessHistory('alice', database_url=database_url))
+    fill(FitnessHistory('bob', database_url=database_url))  # Another user's rows in the same table
+
+    assert isinstance(stored.history, SQLSessions)
+    assert list(stored.history) == list(in_memory.history)
+    assert len(stored.history) == 4
+    assert stored.history[1]['notes'] == ['pool'] and stored.history[2]['calories_burned'] == 'unknown'
+    assert stored.get_last_session() == in_memory.get_last_session()
+    assert stored.history[1:3] == in_memory.history[1:3]
+    for filters in ({}, {'type': 'run'}, {'since': '2024-03-02', 'until': '2024-03-04'}, {'duration': 60}):
+        assert stored.summarize_history(**filters) == in_memory.summarize_history(**filters)
+    assert stored.summarize_history(type='cycle')['total_sessions'] == 0
+
+
+def test_aggregates_are_computed_in_sql_for_existing_rows(database_url, monkeypatch):
+    """Test that a new instance over stored sessions starts from SQL aggregates, not a row scan."""
+    expected = fill(FitnessHistory('alice')).statistics()
+    fill(FitnessHistory('alice', database_url=database_url))
+
+    restarted = FitnessHistory('alice', database_url=database_url)
+    monkeypatch.setattr(SQLSessions, '__iter__', None)  # Any fall back to iterating the rows would fail
+    stats = restarted.statistics()
+    assert stats['sessions'] == expected['sessions'] == 4
+    for name in ('count', 'sum', 'min', 'max'):
+        assert stats['calories_burned'][name] == expected['calories_burned'][name]
+    assert stats['duration']['mean'] == pytest.approx(expected['duration']['mean'])
+    assert stats['duration']['variance'] == pytest.approx(expected['duration']['variance'])
+
+
+def test_sql_history_skips_the_journal_and_pickles_as_a_reference(database_url):
+    """Test that database-backed sessions aren't journaled and a pickled history reconnects."""
+    class FailingJournal:
+        def append(self, record):
+            raise AssertionError("SQL-backed sessions must not be journaled")
+
+    history = FitnessHistory('alice', database_url=database_url)
+    history.journal = FailingJournal()
+    fill(history)
+    data = pickle.dumps(history)
+    assert len(pickle.dumps(history.history)) < 1000  # The sessions stay in the database
+    fill(FitnessHistory('alice', database_url=database_url))  # Added after the snapshot was taken
+    restored = pickle.loads(data)
+    assert restored.summarize_history()['total_sessions'] == 8
+
+
+def test_pickled_sql_history_keeps_its_aggregates(database_url, monkeypatch):
+    """Test that reloading a database-backed history reads only the sessions added since it was pickled."""
+    expected = fill(fill(FitnessHistory('alice')))
+    data = pickle.dumps(fill(FitnessHistory('alice', database_url=database_url)))
+    fill(FitnessHistory('alice', database_url=database_url))
+
+    with monkeypatch.context() as patch:  # Any rebuild from the whole table would fail
+        patch.setattr(SQLSessions, '__iter__', None)
+        patch.setattr(SQLSessions, 'field_stats', None)
+        restored = pickle.loads(data)
+        assert restored.summarize_history() == expected.summarize_history()
+        assert restored.summarize_history(since='2024-03-02', until='2024-03-04') == \
+            expected.summarize_history(since='2024-03-02', until='2024-03-04')
+        assert restored.statistics()['calories_burned'] == pytest.approx(expected.statistics()['calories_burned'])
+
+    with SQLSessions(database_url, 'alice').engine.begin() as connection:  # Sessions removed: rebuilt instead
+        connection.exec_driver_sql("DELETE FROM workout_sessions WHERE id = (SELECT max(id) FROM workout_sessions)")
+    assert pickle.loads(data).summarize_history()['total_sessions'] == 7
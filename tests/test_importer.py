@@ -0,0 +1,111 @@
+import gzip
+import orjson
+import pytest
+from app import App
+from app.plugins.history import FitnessHistory
+from app.plugins.history.importer import ImportFormatError
+from app.sessions import acting_as
+
+CSV = """timestamp,duration,calories_burned,type,note
+2024-03-01T07:30:00,30,300,run,
+2024-03-01T18:00:00,45.5,410,swim,easy
+not a time,20,100,run,
+
+2024-03-02T08:00:00,-5,100,run,
+2024-03-02T09:00:00,ten,100,run,
+2024-03-03,60,,cycle,no calories
+2024-03-04T08:00:00,20
+"""
+
+
+def test_csv_import_reports_rejected_rows(tmp_path):
+    """Test that valid CSV rows are stored with typed values and every bad row is reported by line."""
+    path = tmp_path / 'workouts.csv'
+    path.write_text(CSV)
+    errors_path = tmp_path / 'rejected.jsonl'
+    history = FitnessHistory()
+    progress = []
+    report = history.import_sessions(path, chunk_size=3, progress=lambda report: progress.append(report['rows']),
+                                     errors_path=errors_path)
+
+    assert (report['rows'], report['imported'], report['rejected']) == (7, 3, 4)
+    assert [error['line'] for error in report['errors']] == [4, 6, 7, 9]
+    assert 'not a time' in report['errors'][0]['error'] and 'duration' in report['errors'][1]['error']
+    assert progress == [3, 5, 7]  # The blank line is not a row
+    rejected = [orjson.loads(line) for line in errors_path.read_bytes().splitlines()]
+    assert rejected[2]['row'] == {'timestamp': '2024-03-02T09:00:00', 'duration': 'ten', 'calories_burned': '100',
+                                  'type': 'run'}
+    assert list(history.history) == [
+        {'timestamp': '2024-03-01T07:30:00', 'duration': 30.0, 'calories_burned': 300, 'type': 'run'},
+        {'timestamp': '2024-03-01T18:00:00', 'duration': 45.5, 'calories_burned': 410, 'type': 'swim',
+         'note': 'easy'},
+        {'timestamp': '2024-03-03T00:00:00', 'duration': 60.0, 'type': 'cycle', 'note': 'no calories'}]
+    assert history.summarize_history() == {'total_sessions': 3, 'total_time_spent': 135.5,
+                                           'total_calories_burned': 710}
+    assert history.summarize_history(since='2024-03-02') == {'total_sessions': 1, 'total_time_spent': 60,
+                                                             'total_calories_burned': 0}
+
+
+def test_jsonl_import_matches_adding_one_by_one(tmp_path):
+    """Test that a gzipped JSONL import, with epoch and zoned timestamps and bad lines, equals adding each session."""
+    sessions = [{'timestamp': f'2024-05-{day:02d}T06:15:00', 'duration': day, 'calories_burned': 10 * day,
+                 'type': 'run' if day % 2 else 'lift', 'sets': [day, day]} for day in range(1, 29)]
+    sessions[3]['timestamp'] = '2024-05-04T06:15:00+02:00'
+    sessions[4]['timestamp'] = 1_715_000_000_000_000  # Epoch microseconds
+    lines = [orjson.dumps(session) for session in sessions]
+    lines[10:10] = [b'{"timestamp": "2024-05-11T06:15:00", "duration": 5', b'[1, 2]', b'',
+                    b'{"timestamp": "2024-05-11T06:15:00", "type": 7}', b'{"duration": 5}']
+    path = tmp_path / 'workouts.ndjson.gz'
+    with gzip.open(path, 'wb') as f:
+        f.write(b'\n'.join(lines) + b'\n')
+
+    history = FitnessHistory()
+    report = history.execute('import', str(path))
+    assert (report['rows'], report['imported'], report['rejected']) == (32, 28, 4)
+    assert [error['error'] for error in report['errors']][1:] == [
+        'expected a JSON object, got list', 'type is not a string: 7', 'missing timestamp']
+
+    expected = FitnessHistory()
+    for session in sessions:
+        expected.add_workout_session(session, timestamp=session['timestamp'])
+    assert list(history.history) == list(expected.history)
+    assert history.statistics() == expected.statistics()
+    assert history.summarize_periods('week') == expected.summarize_periods('week')
+
+
+def test_unknown_formats_and_missing_columns_are_refused(tmp_path):
+    """Test that files that can't be imported at all raise instead of rejecting every row."""
+    history = FitnessHistory()
+    with pytest.raises(ImportFormatError, match='format'):
+        history.import_sessions(tmp_path / 'workouts.xlsx')
+    path = tmp_path / 'workouts.csv'
+    path.write_text('date,duration\n2024-01-01,30\n')
+    with pytest.raises(ImportFormatError, match='timestamp'):
+        history.import_sessions(path)
+    assert len(history.history) == 0
+
+
+def test_imported_chunks_are_journaled(monkeypatch, tmp_path):
+    """Test that an import into a journaled history is replayed after a crash, alongside single adds."""
+    monkeypatch.setenv('CACHE_DIR', str(tmp_path))
+    monkeypatch.setenv('STATS_DUMP_INTERVAL', '0')
+    monkeypatch.setenv('SNAPSHOT_INTERVAL', '0')
+    path = tmp_path / 'workouts.csv'
+    path.write_text('timestamp,duration,calories_burned\n' +
+                    ''.join(f'2024-01-{day:02d}T12:00:00,{day},{day * 10}\n' for day in range(1, 31)))
+    app = App()
+    app.load_plugins()
+    history = app.command_handler.get_command('fitness_history')
+    with acting_as('alice'):
+        history.add_workout_session({'duration': 1, 'calories_burned': 1}, timestamp='2023-12-31T12:00:00')
+        history.import_sessions(path, chunk_size=7)
+        expected = history.summarize_periods('month')
+    app.journal.close()  # Crash: no checkpoint
+
+    app = App()
+    app.load_plugins()
+    with acting_as('alice'):
+        assert app.command_handler.invoke('fitness_history', 'periods', 'month') == expected == [
+            {'period': '2023-12-01', 'total_sessions': 1, 'total_time_spent': 1, 'total_calories_burned': 1},
+            {'period': '2024-01-01', 'total_sessions': 30, 'total_time_spent': 465, 'total_calories_burned': 4650}]
+    app.shutdown()
@@ -0,0 +1,57 @@
+from app.commands import Command, CommandHandler
+from app.commands.index import CommandIndex
+
+
+class NamedCommand(Command):
+    def __init__(self, name, description):
+        super().__init__(name, description)
+        self.calls = 0
+
+    def execute(self, *args, **kwargs):
+        self.calls += 1
+
+
+def make_handler():
+    handler = CommandHandler()
+    for name, description in [("fitness_history", "Interact with your fitness history to track your progress."),
+                              ("fitness_trainer", "Chat with a personal trainer."),
+                              ("show_menu", "Show the dynamic menu of all commands.")]:
+        handler.register_command(NamedCommand(name, description))
+    return handler
+
+
+def test_find_command_by_description_uses_index():
+    """Test keyword and phrase search over descriptions."""
+    handler = make_handler()
+    assert [name for name, _ in handler.find_command_by_description("Fitness")] == ["fitness_history"]
+    assert [name for name, _ in handler.find_command_by_description("track your")] == ["fitness_history"]
+    assert handler.find_command_by_description("yoga") == []
+
+
+def test_unique_abbreviation_executes_command():
+    """Test that a unique prefix resolves while an ambiguous one does not."""
+    handler = make_handler()
+    assert handler.execute_command("fitness_h")
+    assert handler.commands["fitness_history"].calls == 1
+    assert not handler.execute_command("fitness")
+
+
+def test_suggestions_for_typos(caplog):
+    """Test that unknown commands log ranked suggestions."""
+    handler = make_handler()
+    assert not handler.execute_command("shwo_menu")
+    assert "Did you mean: show_menu" in caplog.text
+
+
+def test_index_remove_and_complete():
+    """Test that completion and search stay consistent after re-registration."""
+    index = CommandIndex()
+    index.add("stats", "Show stats.")
+    index.add("stat", "Short stats.")
+    assert index.complete("sta") == ["stat", "stats"]
+    assert index.resolve_prefix("stats") == "stats"
+    index.add("stats", "Latency report.")
+    assert index.search("show") == []
+    index.remove("stat")
+    assert index.complete("st") == ["stats"]
+    assert index.resolve_prefix("st") == "stats"
@@ -0,0 +1,61 @@
+from app.commands import Command, CommandHandler
+from app.commands.intent import IntentRouter
+
+
+class RecordingCommand(Command):
+    def __init__(self, name, description, examples=()):
+        super().__init__(name, description)
+        self.examples = examples
+        self.calls = 0
+
+    def execute(self, *args, **kwargs):
+        self.calls += 1
+
+
+def make_handler():
+    handler = CommandHandler()
+    handler.register_command(RecordingCommand(
+        "fitness_history", "Interact with your fitness history to track your progress.",
+        ("show my workout history", "how many calories have I burned")))
+    handler.register_command(RecordingCommand("show_menu", "Show the dynamic menu of all commands."))
+    return handler
+
+
+def test_router_executes_confident_match():
+    """Test that a natural language request runs the best matching command."""
+    handler = make_handler()
+    assert handler.parse_natural_language_command("how many calories did I burn this week")
+    assert handler.commands["fitness_history"].calls == 1
+
+
+def test_router_falls_back_below_threshold():
+    """Test that unrelated requests go to the fallback instead of a command."""
+    handler = make_handler()
+    received = []
+    handler.natural_language_fallback = lambda text: received.append(text) or True
+    assert handler.parse_natural_language_command("what is the weather today")
+    assert received == ["what is the weather today"]
+    assert handler.commands["fitness_history"].calls == 0
+
+
+def test_router_picks_up_new_commands():
+    """Test that commands registered after the first query are routed too."""
+    handler = make_handler()
+    assert handler.route_natural_language("latency percentiles") is None
+    handler.register_command(RecordingCommand("stats", "Show latency percentiles and outcomes per command."))
+    assert handler.route_natural_language("latency percentiles") == "stats"
+
+
+def test_model_cache_round_trip(tmp_path):
+    """Test that unchanged commands are reused from the saved model."""
+    path = str(tmp_path / "intent_model.npz")
+    command = RecordingCommand("stats", "Show latency percentiles.", ("how slow are commands",))
+    router = IntentRouter()
+    router.add(command)
+    router.save(path)
+
+    reloaded = IntentRouter()
+    reloaded.load(path)
+    reloaded.add(command)
+    assert not reloaded.dirty
+    assert reloaded.route("how slow are my commands") == "stats"
@@ -0,0 +1,209 @@
+import os
+import errno
+import time
+import threading
+import pytest
+from app import App
+from app.journal import Journal, JournalError
+from app.plugins.history import FitnessHistory
+from app.sessions import acting_as
+
+
+def test_concurrent_writers_share_commits(tmp_path):
+    """Test that records from many threads are all durable, in sequence order, with fewer syncs than records."""
+    journal = Journal(str(tmp_path), commit_delay=0.005)
+
+    def writer(n):
+        for i in range(20):
+            journal.wait(journal.append({'writer': n, 'i': i}))
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    journal.close()
+    stats = journal.stats()
+    assert stats['records'] == 160
+    assert stats['batches'] < 160
+    assert [record['seq'] for record in Journal(str(tmp_path)).records()] == list(range(1, 161))
+
+
+def test_write_behind_flushes_in_batches_with_backpressure(tmp_path):
+    """Test that write-behind appends don't wait for a sync, a full queue holds writers back and close() flushes."""
+    journal = Journal(str(tmp_path), commit_delay=60, write_behind=True, flush_size=50, max_pending=100)
+    for i in range(150):
+        journal.append({'i': i})
+    deadline = time.monotonic() + 5
+    while journal.stats()['records'] < 100 and time.monotonic() < deadline:  # The size trigger, not the delay
+        time.sleep(0.01)
+    stats = journal.stats()
+    assert stats['records'] >= 100 and stats['records'] / stats['batches'] >= 50  # Whole batches, never one by one
+    assert stats['max_queue_depth'] <= 100
+    assert stats['flush_p99_ms'] >= stats['flush_p50_ms'] > 0
+    journal.close()  # Syncs the last records, which are below flush_size
+    assert [record['i'] for record in Journal(str(tmp_path)).records()] == list(range(150))
+
+    journal = Journal(str(tmp_path / 'slow'), commit_delay=60, write_behind=True, flush_size=10, max_pending=5)
+    refused = []
+
+    def writer():
+        try:
+            for i in range(20):
+                journal.append({'i': i})
+        except JournalError:
+            refused.append(i)
+
+    writer = threading.Thread(target=writer)
+    writer.start()
+    writer.join(1)
+    assert writer.is_alive() and journal.stats()['blocked_appends'] == 1  # Never reaches flush_size on its own
+    journal.close()  # Lets the writer go, then refuses it
+    writer.join()
+    assert refused == [5]
+    assert len(list(Journal(str(tmp_path / 'slow')).records())) == 5
+
+
+def test_failed_write_is_retried(monkeypatch, tmp_path):
+    """Test that a batch whose sync fails is cut off the log and written again, and only its writers wait longer."""
+    fsync = os.fsync
+    failures = []
+
+    def failing_fsync(fd):
+        if not failures:
+            failures.append(fd)
+            raise OSError(errno.EIO, 'Input/output error')
+        fsync(fd)
+
+    journal = Journal(str(tmp_path))
+    journal.wait(journal.append({'n': 1}))
+    monkeypatch.setattr(os, 'fsync', failing_fsync)
+    journal.wait(journal.append({'n': 2}))  # Returns once the retry has synced it
+    journal.wait(journal.append({'n': 3}))
+    monkeypatch.setattr(os, 'fsync', fsync)
+    stats = journal.stats()
+    assert failures and stats['write_errors'] == 1 and stats['records'] == 3 and stats['last_error'] is None
+    journal.close()
+    assert [record['n'] for record in Journal(str(tmp_path)).records()] == [1, 2, 3]  # Written once each
+
+    failures.clear()
+    monkeypatch.setattr(os, 'fsync', failing_fsync)
+    journal = Journal(str(tmp_path), write_behind=True)
+    journal.append({'n': 4})
+    deadline = time.monotonic() + 5
+    while not journal.stats()['last_error'] and time.monotonic() < deadline:
+        time.sleep(0.001)
+    assert journal.stats()['write_errors'] == 1
+    for n in range(5, 104):  # Write-behind appends carry on through the failure
+        journal.append({'n': n})
+    journal.close()
+    assert [record['n'] for record in Journal(str(tmp_path)).records()] == list(range(1, 104))
+
+
+def test_torn_record_is_dropped_on_open(tmp_path):
+    """Test that a partial record left by a crash is discarded and numbering carries on after it."""
+    journal = Journal(str(tmp_path))
+    journal.wait(journal.append({'n': 1}))
+    journal.close()
+    segment = os.path.join(str(tmp_path), journal.segments()[-1])
+    with open(segment, 'ab') as f:
+        f.write(b'{"n": 2, "se')
+
+    journal = Journal(str(tmp_path))
+    journal.wait(journal.append({'n': 3}))
+    journal.close()
+    assert [(record['seq'], record['n']) for record in journal.records()] == [(1, 1), (2, 3)]
+
+
+def test_unreadable_records_are_skipped(tmp_path):
+    """Test that a partial batch inside a segment, followed by its retry, replays each record once."""
+    journal = Journal(str(tmp_path))
+    journal.wait(journal.append({'n': 1}))
+    journal.close()
+    segment = os.path.join(str(tmp_path), journal.segments()[-1])
+    with open(segment, 'ab') as f:  # Record 2 written whole, record 3 torn, then both retried
+        f.write(b'{"n":2,"seq":2}\n{"n":3,"se\n{"n":2,"seq":2}\n{"n":3,"seq":3}\n')
+
+    journal = Journal(str(tmp_path))
+    journal.wait(journal.append({'n': 4}))
+    journal.close()
+    assert [record['n'] for record in Journal(str(tmp_path)).records()] == [1, 2, 3, 4]
+
+
+def test_checkpoint_keeps_only_the_tail(tmp_path):
+    """Test that a checkpoint deletes covered segments and later reads start after it."""
+    journal = Journal(str(tmp_path))
+    for n in range(5):
+        journal.append({'n': n})
+    snapshots = []
+    assert journal.checkpoint(lambda: snapshots.append(True)) == 5
+    journal.wait(journal.append({'n': 5}))
+    journal.close()
+    assert snapshots == [True]
+    assert len(journal.segments()) == 1
+    assert [record['n'] for record in Journal(str(tmp_path)).records()] == [5]
+
+
+@pytest.mark.parametrize('memory_mb, write_behind', [('256', '0'), ('0', '0'), ('256', '1')])  # '0' MB evicts idle users
+def test_sessions_survive_a_crash(monkeypatch, tmp_path, memory_mb, write_behind):
+    """Test that a restart without a clean shutdown replays each added session exactly once."""
+    monkeypatch.setenv('CACHE_DIR', str(tmp_path))
+    monkeypatch.setenv('STATS_DUMP_INTERVAL', '0')
+    monkeypatch.setenv('SNAPSHOT_INTERVAL', '0')
+    monkeypatch.setenv('SESSION_MEMORY_MB', memory_mb)
+    monkeypatch.setenv('JOURNAL_WRITE_BEHIND', write_behind)  # close() flushes what is queued, as shutdown does
+    app = App()
+    app.load_plugins()
+    history = app.command_handler.get_command('fitness_history')
+    for user_id in ['alice', 'bob', 'alice']:
+        with acting_as(user_id):
+            history.add_workout_session({'duration': 30, 'calories_burned': 300})
+    app.journal.close()  # Crash: no checkpoint
+
+    app = App()
+    app.load_plugins()
+    with acting_as('alice'):
+        assert app.command_handler.invoke('fitness_history', 'summary')['total_sessions'] == 2
+    with acting_as('bob'):
+        assert app.command_handler.invoke('fitness_history', 'summary')['total_time_spent'] == 30
+    app.shutdown()
+    assert list(Journal(os.path.join(str(tmp_path), 'journal')).records()) == []
+
+
+def test_no_checkpoint_during_replay(monkeypatch, tmp_path):
+    """Test that a checkpoint due while the journal is replayed waits, so it can't drop records not yet applied."""
+    monkeypatch.setenv('CACHE_DIR', str(tmp_path))
+    monkeypatch.setenv('STATS_DUMP_INTERVAL', '0')
+    monkeypatch.setenv('SNAPSHOT_INTERVAL', '0')
+    app = App()
+    app.load_plugins()
+    with acting_as('alice'):
+        for _ in range(50):
+            app.command_handler.get_command('fitness_history').add_workout_session({'duration': 30, 'calories_burned': 1})
+    app.journal.close()  # Crash: no checkpoint
+
+    replay = FitnessHistory.replay
+
+    def slow_replay(self, records):
+        time.sleep(0.5)
+        replay(self, records)
+
+    monkeypatch.setattr(FitnessHistory, 'replay', slow_replay)
+    monkeypatch.setenv('SNAPSHOT_INTERVAL', '0.05')
+    monkeypatch.setenv('SNAPSHOT_MAX_RECORDS', '10')
+    app = App()
+    app.load_plugins()
+    with acting_as('alice'):
+        assert app.command_handler.invoke('fitness_history', 'summary')['total_sessions'] == 50
+    deadline = time.monotonic() + 5
+    while app.journal.checkpoint_seq < 50 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert app.journal.checkpoint_seq == 50
+    app.checkpointer.stop()
+    app.journal.close()  # Crash again, with nothing logged since the checkpoint
+
+    app = App()
+    app.load_plugins()
+    with acting_as('alice'):
+        assert app.command_handler.invoke('fitness_history', 'summary')['total_sessions'] == 50
+    app.shutdown()
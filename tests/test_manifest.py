@@ -0,0 +1,41 @@
+import sys
+from app import App
+from app.commands.manifest import LazyCommand
+
+
+def test_manifest_defers_plugin_import(monkeypatch, tmp_path):
+    """Test that a warm manifest registers commands without importing the plugin."""
+    monkeypatch.setenv('CACHE_DIR', str(tmp_path))
+    App().load_plugins()  # First run imports the plugin and writes the manifest
+    assert (tmp_path / 'plugin_manifest.json').exists()
+
+    monkeypatch.delitem(sys.modules, 'app.plugins.history', raising=False)
+    app = App()
+    app.load_plugins()
+    command = app.command_handler.commands['fitness_history']
+    assert isinstance(command, LazyCommand)
+    assert 'app.plugins.history' not in sys.modules
+    assert ('fitness_history', command.description) in app.command_handler.get_commands()
+
+
+def test_lazy_command_imports_on_first_execute(monkeypatch, tmp_path):
+    """Test that executing a lazily registered command imports its plugin."""
+    monkeypatch.setenv('CACHE_DIR', str(tmp_path))
+    App().load_plugins()
+    monkeypatch.delitem(sys.modules, 'app.plugins.history', raising=False)
+    app = App()
+    app.load_plugins()
+
+    assert app.command_handler.execute_command('fitness_history')
+    assert 'app.plugins.history' in sys.modules
+    assert app.command_handler.commands['fitness_history'].summarize_history()['total_sessions'] == 0
+
+
+def test_manifest_invalidated_when_plugin_changes(monkeypatch, tmp_path):
+    """Test that a changed plugin source mtime forces a real import."""
+    monkeypatch.setenv('CACHE_DIR', str(tmp_path))
+    App().load_plugins()
+    monkeypatch.setattr('app.commands.manifest.PluginManifest.source_mtime', lambda self, name: -1.0)
+    app = App()
+    app.load_plugins()
+    assert not isinstance(app.command_handler.commands['fitness_history'], LazyCommand)
@@ -0,0 +1,52 @@
+import json
+import pytest
+from app import App
+from app.commands import Command, CommandHandler
+from app.commands.metrics import LatencyHistogram, MetricsDumper
+
+
+class FailingCommand(Command):
+    def __init__(self):
+        super().__init__("fail", "Always raises.")
+
+    def execute(self, *args, **kwargs):
+        raise ValueError("boom")
+
+
+def test_histogram_percentiles_within_precision():
+    """Test that percentiles land within the histogram's relative precision."""
+    histogram = LatencyHistogram()
+    for millis in range(1, 1001):
+        histogram.record(millis / 1000)
+    assert histogram.percentile(50) == pytest.approx(0.5, rel=0.02)
+    assert histogram.percentile(99) == pytest.approx(0.99, rel=0.02)
+    assert histogram.percentile(100) == pytest.approx(1.0)
+
+
+def test_handler_records_outcomes(tmp_path):
+    """Test that execute_command records successes and errors per command."""
+    handler = CommandHandler()
+    handler.register_command(FailingCommand())
+    handler.execute_command("fail")
+    handler.execute_command("fail")
+    stats = handler.metrics.snapshot()["fail"]
+    assert stats["calls"] == 2
+    assert stats["outcomes"] == {"success": 0, "error": 2}
+
+    path = tmp_path / "stats.json"
+    MetricsDumper(handler.metrics, str(path)).dump()
+    assert json.loads(path.read_text())["commands"]["fail"]["calls"] == 2
+
+
+def test_stats_command_prints_percentiles(capfd, monkeypatch, tmp_path):
+    """Test that the built-in stats command reports p50/p95/p99."""
+    monkeypatch.setenv('CACHE_DIR', str(tmp_path))
+    monkeypatch.setenv('STATS_DUMP_INTERVAL', '0')
+    app = App()
+    app.register_builtin_commands()
+    app.command_handler.execute_command("show_menu")
+    capfd.readouterr()
+    app.command_handler.execute_command("stats")
+    out, _ = capfd.readouterr()
+    assert "show_menu: 1 calls (1 success, 0 error) p50" in out
+    assert "p99" in out
@@ -0,0 +1,69 @@
+import os
+from app.commands import Command, CommandHandler
+from app.sessions import SessionCommand, SessionManager, acting_as
+
+
+class ProcessReportingCommand(Command):
+    """CPU-bound command that reports which process ran it."""
+    cpu_bound = True
+    process_pool_threshold = 100
+
+    def __init__(self):
+        super().__init__("crunch", "Sum squares of a range.")
+
+    def work_size(self, *args):
+        return int(args[0])
+
+    def execute(self, *args, **kwargs):
+        return os.getpid(), sum(i * i for i in range(int(args[0])))
+
+
+class PerUserCommand(Command):
+    """Per-user CPU-bound command that reports which process and user ran it."""
+    per_user = True
+    cpu_bound = True
+    process_pool_threshold = 100
+    cache_persistent = True
+
+    def __init__(self, user_id=None):
+        super().__init__("per_user_crunch", "Sum squares of a range for a user.")
+        self.user_id = user_id
+
+    def work_size(self, *args):
+        return int(args[0])
+
+    def execute(self, *args, **kwargs):
+        return os.getpid(), self.user_id, sum(i * i for i in range(int(args[0])))
+
+
+def test_cpu_bound_commands_run_in_warm_pool_and_small_inputs_stay_local():
+    """Test dispatch to the process pool above the threshold and in-process below it."""
+    handler = CommandHandler(process_workers=1)
+    handler.register_command(ProcessReportingCommand())
+    try:
+        pid, total = handler.invoke("crunch", "1000")
+        assert pid != os.getpid()
+        assert total == sum(i * i for i in range(1000))
+        assert handler.invoke("crunch", "1000")[0] == pid  # same persistent worker
+
+        pid, total = handler.invoke("crunch", "10")
+        assert pid == os.getpid()
+        assert total == 285
+    finally:
+        handler.shutdown()
+
+
+def test_per_user_commands_keep_their_settings(tmp_path):
+    """Test that a per-user command's proxy honours its process pool and cache settings."""
+    manager = SessionManager(lambda user_id: PerUserCommand(user_id), str(tmp_path), 2 ** 20)
+    command = SessionCommand(PerUserCommand, manager)
+    assert command.cpu_bound and command.cache_persistent and command.process_pool_threshold == 100
+    handler = CommandHandler(process_workers=1)
+    handler.register_command(command)
+    try:
+        with acting_as('alice'):
+            pid, user_id, total = handler.invoke("per_user_crunch", "1000")
+            assert pid != os.getpid() and user_id == 'alice'
+            assert handler.invoke("per_user_crunch", "10")[:2] == (os.getpid(), 'alice')
+    finally:
+        handler.shutdown()
@@ -0,0 +1,40 @@
+import pickle
+from datetime import datetime
+import pytest
+from app.plugins.history import FitnessHistory
+from app.plugins.history.records import WorkoutSession
+
+
+@pytest.mark.parametrize('data', [
+    {'duration': 30, 'calories_burned': 250, 'type': 'run', 'timestamp': '2024-03-01T08:15:30.250000'},
+    {'duration': 45.5, 'type': 'swim', 'notes': ['pool'], 'timestamp': '2024-03-01T08:15'},  # Not canonical ISO
+    {'calories_burned': 'unknown', 'timestamp': 1709280930000000, 'heart_rate': {'max': 171}},
+    {'type': 'yoga', 'timestamp': datetime(2024, 3, 1, 8, 15)},
+    {'duration': 20, 'timestamp': 'yesterday'},
+    {},
+])
+def test_dicts_round_trip_losslessly(data):
+    """Test that a session dict survives conversion to a record and back, and reads the same meanwhile."""
+    session = WorkoutSession.from_dict(data)
+    assert session.to_dict() == data
+    for name, value in data.items():
+        if name != 'timestamp':
+            assert session[name] == value and name in session
+    assert 'missing' not in session and session.get('missing', 0) == 0
+    assert pickle.loads(pickle.dumps(session)) == session
+
+
+def test_records_share_exercise_names_and_store_int_timestamps():
+    """Test interning and epoch timestamps, and that a history stores records like dicts."""
+    first = WorkoutSession.from_dict({'type': ''.join(['ro', 'wing']), 'duration': 30}, timestamp='2024-03-01T08:00:00')
+    second = WorkoutSession.from_dict({'type': ''.join(['row', 'ing']), 'duration': 40}, timestamp='2024-03-02T08:00:00')
+    assert first.exercise is second.exercise
+    assert isinstance(first.timestamp, int)
+    assert not hasattr(first, '__dict__')
+
+    history = FitnessHistory()
+    history.add_workout_session(first, timestamp='2024-03-01T08:00:00')
+    history.add_workout_session({'type': 'rowing', 'duration': 40}, timestamp='2024-03-02T08:00:00')
+    assert list(history.history) == [first.to_dict(), second.to_dict()]
+    assert history.get_last_session()['timestamp'] == '2024-03-02T08:00:00'
+    assert history.summarize_history(type='rowing', since='2024-03-02')['total_time_spent'] == 40
@@ -0,0 +1,46 @@
+from app import DynamicMenuCommand
+from app.commands import Command, CommandHandler
+from app.commands.router import KeywordAutomaton, KeywordRouter
+
+
+class TriggeredCommand(Command):
+    def __init__(self, name, triggers, trigger_priority=0):
+        super().__init__(name, f"{name} command.")
+        self.triggers = triggers
+        self.trigger_priority = trigger_priority
+        self.calls = 0
+
+    def execute(self, *args, **kwargs):
+        self.calls += 1
+
+
+def test_automaton_finds_overlapping_phrases():
+    """Test that one pass reports every phrase, including ones inside others."""
+    automaton = KeywordAutomaton([("he", 1), ("she", 2), ("hers", 3), ("his", 4)])
+    assert sorted(automaton.find_all("ushers")) == [(1, 4, 2), (2, 4, 1), (2, 6, 3)]
+
+
+def test_router_resolves_priority_and_length():
+    """Test that priority beats length and length beats position."""
+    router = KeywordRouter([
+        TriggeredCommand("fitness_history", ("history", "past workouts")),
+        TriggeredCommand("workout_plan", ("workouts",)),
+        TriggeredCommand("help", ("help",), trigger_priority=10),
+    ])
+    assert router.route("Show my past workouts") == "fitness_history"
+    assert router.route("help me read my history") == "help"
+    assert router.route("prehistory") is None  # triggers only match whole words
+
+
+def test_handle_input_uses_declared_triggers(capfd):
+    """Test that DynamicMenuCommand routes through triggers and rebuilds on registration."""
+    handler = CommandHandler()
+    menu = DynamicMenuCommand("show_menu", "Show the dynamic menu of all commands.", handler)
+    handler.register_command(menu)
+    menu.handle_input("zzz qqq")
+    assert "Sorry, I didn't understand that." in capfd.readouterr().out
+
+    history = TriggeredCommand("fitness_history", ("history",))
+    handler.register_command(history)
+    menu.handle_input("What does my HISTORY look like?")
+    assert history.calls == 1
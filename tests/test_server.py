@@ -0,0 +1,42 @@
+import io
+import threading
+import pytest
+from app import App
+from app.server import CommandServer
+from client import send_command
+
+
+@pytest.fixture
+def server(monkeypatch, tmp_path):
+    """Run a CommandServer for a loaded App on a background thread."""
+    monkeypatch.setenv('CACHE_DIR', str(tmp_path))
+    app = App()
+    app.load_plugins()
+    app.register_builtin_commands()
+    socket_path = str(tmp_path / 'app.sock')
+    command_server = CommandServer(socket_path, app)
+    thread = threading.Thread(target=command_server.serve_forever, daemon=True)
+    thread.start()
+    yield socket_path
+    command_server.shutdown()
+    command_server.server_close()
+
+
+def test_client_streams_command_output(server):
+    """Test that the client receives the command's printed output and a success status."""
+    out = io.BytesIO()
+    assert send_command('show_menu', out, server) == 0
+    assert b"fitness_history: Interact with your fitness history" in out.getvalue()
+
+
+def test_client_reports_unknown_command(server):
+    """Test that failures are reported back to the client with a non-zero status."""
+    out = io.BytesIO()
+    assert send_command('unknown_command', out, server) == 1
+    assert b"Command 'unknown_command' not found." in out.getvalue()
+
+
+def test_server_refuses_socket_in_use(server):
+    """Test that a second server does not steal a live socket."""
+    with pytest.raises(OSError):
+        CommandServer(server, App())
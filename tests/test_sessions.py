@@ -0,0 +1,97 @@
+import io
+import threading
+from app import App
+from app.plugins.history import FitnessHistory
+from app.sessions import SessionCommand, SessionManager, acting_as
+from app.server import CommandServer
+from client import send_command
+
+
+def make_manager(tmp_path, budget):
+    return SessionManager(lambda user_id: FitnessHistory(user_id=user_id), str(tmp_path), budget)
+
+
+def add_session(manager, user_id, duration):
+    with manager.session(user_id) as history:
+        history.add_workout_session({'duration': duration, 'calories_burned': duration * 10})
+
+
+def test_cold_sessions_are_evicted_to_disk_and_reloaded(tmp_path):
+    """Test that least recently used users are spilled under the budget and come back intact."""
+    manager = make_manager(tmp_path, budget=1)  # Room for nothing beyond the session in use
+    add_session(manager, 'alice', 30)
+    add_session(manager, 'bob', 45)
+    assert manager.stats()['in_memory'] == 0
+    assert manager.stats()['evictions'] == 2
+
+    with manager.session('alice') as history:
+        assert history.summarize_history()['total_time_spent'] == 30
+    with manager.session('bob') as history:
+        assert history.summarize_history()['total_sessions'] == 1
+    assert manager.stats()['loads'] == 2
+
+
+def test_sessions_in_use_are_not_evicted(tmp_path):
+    """Test that a session another caller holds stays in memory however tight the budget."""
+    manager = make_manager(tmp_path, budget=1)
+    with manager.session('alice') as alice:
+        add_session(manager, 'bob', 10)
+        assert list(manager.sessions) == ['alice']
+        alice.add_workout_session({'duration': 5, 'calories_burned': 50})
+    with manager.session('alice') as history:
+        assert history is not alice  # Evicted after release, then reloaded
+        assert history.summarize_history()['total_sessions'] == 1
+
+
+def test_per_user_command_acts_for_current_user(monkeypatch, tmp_path):
+    """Test that the registered command runs each user's own history and saves it on shutdown."""
+    monkeypatch.setenv('CACHE_DIR', str(tmp_path))
+    monkeypatch.setenv('STATS_DUMP_INTERVAL', '0')
+    app = App()
+    app.load_plugins()
+    handler = app.command_handler
+    with acting_as('alice'):
+        handler.get_command('fitness_history').add_workout_session({'duration': 20, 'calories_burned': 200})
+        assert handler.invoke('fitness_history', 'summary')['total_sessions'] == 1
+    with acting_as('bob'):
+        assert handler.invoke('fitness_history', 'summary')['total_sessions'] == 0
+    app.shutdown()
+
+    app = App()
+    app.load_plugins()
+    with acting_as('alice'):
+        assert app.command_handler.invoke('fitness_history', 'summary')['total_time_spent'] == 20
+
+
+def test_proxied_methods_run_on_the_session_in_memory(tmp_path):
+    """Test that each call through the proxy pins the user's session, so adds aren't lost to an eviction."""
+    manager = make_manager(tmp_path, budget=0)  # Every session is evicted as soon as it is released
+    command = SessionCommand(FitnessHistory, manager, default_user='alice')
+    add = command.add_workout_session  # Held across evictions, as callers do
+    add({'duration': 10, 'calories_burned': 100})
+    command.add_workout_session({'duration': 20, 'calories_burned': 200})
+    add({'duration': 30, 'calories_burned': 300})
+    assert command.summarize_history()['total_sessions'] == 3
+    assert manager.stats()['evictions'] >= 3
+
+
+def test_client_user_selects_session(monkeypatch, tmp_path):
+    """Test that the server runs a client's command for the user the client names."""
+    monkeypatch.setenv('CACHE_DIR', str(tmp_path))
+    monkeypatch.setenv('STATS_DUMP_INTERVAL', '0')
+    app = App()
+    app.load_plugins()
+    with acting_as('alice'):
+        app.command_handler.get_command('fitness_history').add_workout_session({'duration': 20, 'calories_burned': 200})
+    socket_path = str(tmp_path / 'app.sock')
+    server = CommandServer(socket_path, app)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        alice, anonymous = io.BytesIO(), io.BytesIO()
+        assert send_command('fitness_history summary', alice, socket_path, user_id='alice') == 0
+        assert send_command('fitness_history summary', anonymous, socket_path) == 0
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert b"'total_sessions': 1" in alice.getvalue()
+    assert b"'total_sessions': 0" in anonymous.getvalue()
@@ -0,0 +1,77 @@
+import pickle
+import random
+from datetime import datetime, timedelta
+import pytest
+from app.plugins.history import FitnessHistory
+from app.plugins.history.tiers import TieredSessions
+from app.sessions import Compactor, SessionManager
+
+
+def random_history(count=1500, seed=3):
+    """Sessions over two years, in random order, some with float durations and two exercises."""
+    rng = random.Random(seed)
+    history = FitnessHistory(user_id='alice')
+    for _ in range(count):
+        timestamp = datetime(2023, 1, 1) + timedelta(minutes=rng.randrange(2 * 365 * 24 * 60))
+        duration = rng.choice([rng.randint(10, 90), rng.randint(10, 90) + 0.5])
+        history.add_workout_session({'duration': duration, 'calories_burned': rng.randint(50, 900),
+                                     'type': rng.choice(['run', 'swim'])}, timestamp=timestamp.isoformat())
+    return history, rng
+
+
+def test_summaries_stay_exact_across_tiers(monkeypatch, tmp_path):
+    """Test that compacting a year of sessions to disk changes no summary, range, filter or raw read."""
+    monkeypatch.setenv('HISTORY_COLD_DIR', str(tmp_path))
+    history, rng = random_history()
+    ranges = [(None, None), ('2023-03-01', '2023-06-01'), ('2023-02-14T13:45:00', '2024-11-03T07:10:00'),
+              ('2023-12-31T22:00:00', '2024-01-01T02:00:00'), (None, '2023-07-19T12:00:00'), ('2024-12-30', None)]
+    for _ in range(30):
+        since = datetime(2023, 1, 1) + timedelta(minutes=rng.randrange(2 * 365 * 24 * 60))
+        ranges.append((since.isoformat(), (since + timedelta(minutes=rng.randrange(400 * 24 * 60))).isoformat()))
+    expected = [history.summarize_history(since=since, until=until) for since, until in ranges]
+    runs = history.summarize_history(type='run')
+    between = history.sessions_between('2023-12-20', '2024-01-10')
+    top = [session['calories_burned'] for session in history.top_sessions('swim', 'calories_burned', 20)]
+    size, store_size = history.memory_size(), history.history.memory_size()
+
+    assert history.compact('2024-01-01T15:00:00') > 600  # Rounded back to midnight
+    assert isinstance(history.history, TieredSessions) and history.history.segments
+    assert history.history.memory_size() < store_size * 0.6  # The rollups stay whole, so only the store shrinks this much
+    assert history.memory_size() < size
+    history.add_workout_session({'duration': 40, 'calories_burned': 400, 'type': 'run'}, timestamp='2023-06-01T12:00:00')
+    history.add_workout_session({'duration': 40, 'calories_burned': 400, 'type': 'run'}, timestamp='2025-01-01T12:00:00')
+    history.compact('2024-01-01')
+    assert history.storage_tiers()['segments'] == 2  # The late session went to a second segment
+
+    history = pickle.loads(pickle.dumps(history))
+    late = {'total_sessions': 1, 'total_time_spent': 40, 'total_calories_burned': 400}
+    for (since, until), summary in zip(ranges, expected):
+        got = history.summarize_history(since=since, until=until)
+        for added in ('2023-06-01T12:00:00', '2025-01-01T12:00:00'):
+            if (since is None or since <= added) and (until is None or added < until):
+                summary = {key: value + late[key] for key, value in summary.items()}
+        assert got == pytest.approx(summary), (since, until)
+        assert history.history.totals(('duration', 'calories_burned'), since, until)[0] == got['total_sessions']
+    assert history.summarize_history(type='run')['total_sessions'] == runs['total_sessions'] + 2
+    assert history.sessions_between('2023-12-20', '2024-01-10') == between
+    assert [session['calories_burned'] for session in history.top_sessions('swim', 'calories_burned', 20)] == top
+    assert history.get_last_session()['timestamp'] == '2025-01-01T12:00:00'
+    assert len(history.history) == len(list(history.history)) == 1502
+
+
+def test_compact_follows_the_hot_window(monkeypatch, tmp_path):
+    """Test the HISTORY_HOT_DAYS policy, and that the compactor runs it for sessions in memory."""
+    monkeypatch.setenv('HISTORY_COLD_DIR', str(tmp_path / 'cold'))
+    manager = SessionManager(lambda user_id: FitnessHistory(user_id=user_id), str(tmp_path / 'sessions'), 2 ** 30)
+    now = datetime.now()
+    with manager.session('bob') as history:
+        for days in (400, 200, 150, 20, 1):
+            history.add_workout_session({'duration': days, 'calories_burned': 1},
+                                        timestamp=(now - timedelta(days=days)).isoformat())
+        assert history.compact() == 0  # No hot window configured
+    monkeypatch.setenv('HISTORY_HOT_DAYS', '90')
+    assert Compactor(manager).compact_all() == 3  # From the start of the month 90 days back
+    with manager.session('bob') as history:
+        assert history.storage_tiers() == {'hot_sessions': 2, 'cold_sessions': 3, 'segments': 1}
+        assert history.execute('summary')['total_time_spent'] == 771
+        assert history.execute('recent', 160)['total_sessions'] == 3
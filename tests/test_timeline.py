@@ -0,0 +1,73 @@
+import pickle
+import random
+from datetime import datetime, timedelta
+import pytest
+from app.plugins.history import FitnessHistory
+
+
+def random_history(count=2000, seed=7):
+    """Sessions over two years, a third of them added out of order, some with float durations."""
+    rng = random.Random(seed)
+    start = datetime(2023, 1, 1)
+    history = FitnessHistory()
+    for _ in range(count):
+        timestamp = start + timedelta(minutes=rng.randrange(2 * 365 * 24 * 60))
+        duration = rng.choice([rng.randint(10, 90), rng.randint(10, 90) + 0.5])
+        history.add_workout_session({'duration': duration, 'calories_burned': rng.randint(50, 900)},
+                                    timestamp=timestamp.isoformat())
+    return history, rng
+
+
+def test_range_totals_match_a_full_scan():
+    """Test that rollup-based totals equal the column scan for ranges with partial days and whole months."""
+    history, rng = random_history()
+    ranges = [(None, None), ('2023-03-01', '2023-06-01'), ('2023-02-14T13:45:00', '2024-11-03T07:10:00'),
+              ('2023-05-05T10:00:00', '2023-05-05T18:00:00'), (None, '2023-07-19T12:00:00'), ('2024-12-30', None)]
+    for _ in range(50):
+        since = datetime(2023, 1, 1) + timedelta(minutes=rng.randrange(2 * 365 * 24 * 60))
+        ranges.append((since.isoformat(), (since + timedelta(minutes=rng.randrange(400 * 24 * 60))).isoformat()))
+    for since, until in ranges:
+        expected_count, (expected_time, expected_calories) = history.history.totals(
+            ('duration', 'calories_burned'), since, until)
+        summary = history.summarize_history(since=since, until=until)
+        assert summary['total_sessions'] == expected_count
+        assert summary['total_time_spent'] == pytest.approx(expected_time)
+        assert summary['total_calories_burned'] == expected_calories
+
+
+def test_periods_include_sessions_added_out_of_order():
+    """Test that daily, weekly and monthly rollups pick up a session older than every other."""
+    history = FitnessHistory()
+    for timestamp in ['2024-03-04T09:00:00', '2024-03-06T18:30:00', '2024-03-11T07:00:00', '2024-04-02T12:00:00']:
+        history.add_workout_session({'duration': 30, 'calories_burned': 300}, timestamp=timestamp)
+    history.add_workout_session({'duration': 15, 'calories_burned': 100}, timestamp='2024-02-29T23:59:00')
+
+    weeks = history.summarize_periods('week')
+    assert [week['period'] for week in weeks] == ['2024-02-26', '2024-03-04', '2024-03-11', '2024-04-01']
+    assert weeks[1] == {'period': '2024-03-04', 'total_sessions': 2, 'total_time_spent': 60,
+                        'total_calories_burned': 600}
+    months = history.summarize_periods('month')
+    assert [(month['period'], month['total_sessions']) for month in months] == [
+        ('2024-02-01', 1), ('2024-03-01', 3), ('2024-04-01', 1)]
+    assert len(history.summarize_periods('day', since='2024-03-05', until='2024-04-02')) == 2
+    assert history.execute('periods', 'month') == months
+    with pytest.raises(ValueError, match='fortnight'):
+        history.summarize_periods('fortnight')
+
+
+def test_sessions_between_and_the_timeline_survive_pickling(tmp_path):
+    """Test time-ordered range reads, and that a pickled or mapped history's timeline stays correct."""
+    history = FitnessHistory()
+    for day in [5, 1, 3, 2]:
+        history.add_workout_session({'duration': day, 'calories_burned': 10}, timestamp=f'2024-06-0{day}T08:00:00')
+    assert [session['duration'] for session in history.sessions_between('2024-06-02', '2024-06-05')] == [2, 3]
+
+    restored = pickle.loads(pickle.dumps(history))
+    restored.add_workout_session({'duration': 4, 'calories_burned': 10}, timestamp='2024-06-04T08:00:00')
+    assert [session['duration'] for session in restored.sessions_between('2024-06-02')] == [2, 3, 4, 5]
+
+    path = tmp_path / 'history.sessions'
+    restored.save_sessions(path)
+    mapped = FitnessHistory.load_sessions(path)  # The timeline is built from the mapped columns
+    assert mapped.summarize_history(since='2024-06-03') == restored.summarize_history(since='2024-06-03') == {
+        'total_sessions': 3, 'total_time_spent': 12, 'total_calories_burned': 30}
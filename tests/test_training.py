@@ -0,0 +1,84 @@
+import pickle
+import random
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from app.plugins.history import FitnessHistory
+from app.plugins.history.training import ATL_DAYS, CTL_DAYS, ewma
+
+
+def recurrence(loads, days):
+    average, averages = 0.0, []
+    for load in loads:
+        average += (load - average) / days
+        averages.append(average)
+    return averages
+
+
+def test_ewma_matches_the_day_by_day_recurrence():
+    """Test the blockwise closed form against the plain recurrence, over many blocks and many rows at once."""
+    rng = np.random.default_rng(1)
+    loads = rng.integers(0, 120, (3, 2000)) * (rng.random((3, 2000)) < 0.7)
+    for days in (ATL_DAYS, CTL_DAYS):
+        expected = [recurrence(row, days) for row in loads.tolist()]
+        assert ewma(loads, days) == pytest.approx(np.array(expected), rel=1e-12, abs=1e-12)
+        assert ewma(loads[0], days) == pytest.approx(np.array(expected[0]), rel=1e-12, abs=1e-12)
+
+
+def test_daily_training_load():
+    """Test ATL, CTL and TSB per day, with days without sessions and two sessions on one day."""
+    history = FitnessHistory()
+    for timestamp, duration in [('2024-01-01T07:00:00', 70), ('2024-01-03T07:00:00', 42),
+                                ('2024-01-03T18:00:00', 28), ('2024-01-04T07:00:00', 0)]:
+        history.add_workout_session({'duration': duration, 'calories_burned': 1}, timestamp=timestamp)
+    days = history.training_load()
+    assert [(day['date'], day['load']) for day in days] == [('2024-01-01', 70), ('2024-01-02', 0),
+                                                           ('2024-01-03', 70), ('2024-01-04', 0)]
+    assert [day['atl'] for day in days] == pytest.approx(recurrence([70, 0, 70, 0], ATL_DAYS))
+    assert [day['ctl'] for day in days] == pytest.approx(recurrence([70, 0, 70, 0], CTL_DAYS))
+    assert days[0]['tsb'] == 0 and days[2]['tsb'] == pytest.approx(days[1]['ctl'] - days[1]['atl'])
+    assert history.training_load(since='2024-01-03', until='2024-01-07')[-1]['atl'] == pytest.approx(
+        recurrence([70, 0, 70, 0, 0, 0], ATL_DAYS)[-1])
+    assert history.current_training_load('2024-01-06T12:00:00') == pytest.approx(
+        {'date': '2024-01-06', 'atl': days[-1]['atl'] * (1 - 1 / ATL_DAYS) ** 2,
+         'ctl': days[-1]['ctl'] * (1 - 1 / CTL_DAYS) ** 2,
+         'tsb': (days[-1]['ctl'] * (1 - 1 / CTL_DAYS) - days[-1]['atl'] * (1 - 1 / ATL_DAYS))})
+    assert FitnessHistory().training_load() == []
+
+
+def test_running_load_matches_the_backfill():
+    """Test the O(1) running values after out-of-order adds, batches and pickling against a full backfill."""
+    rng = random.Random(9)
+    start = datetime(2022, 1, 1, 6)
+    sessions = [{'duration': rng.randint(10, 90), 'calories_burned': 1,
+                 'timestamp': (start + timedelta(hours=rng.randrange(2 * 365 * 24))).isoformat()} for _ in range(800)]
+    history = FitnessHistory()
+    history.add_workout_sessions(sessions[:300])
+    for session in sessions[300:]:
+        history.add_workout_session(dict(session), timestamp=session['timestamp'])
+    history = pickle.loads(pickle.dumps(history))
+    days = history.training_load()
+    for day in (days[-1], days[-40], days[len(days) // 2]):
+        running = history.current_training_load(day['date'] + 'T20:00:00')
+        assert running == pytest.approx({'date': day['date'], 'atl': day['atl'], 'ctl': day['ctl'], 'tsb': day['tsb']})
+
+
+def test_backfill_many_histories_at_once():
+    """Test that the batch backfill lines up histories with different spans, equal to each history's own series."""
+    histories = []
+    for first, count in [('2023-01-01', 30), ('2023-02-10', 10), (None, 0)]:
+        history = FitnessHistory()
+        if first:
+            history.add_workout_sessions([{'duration': 10 + i, 'timestamp': f'{first}T08:00:00'} for i in range(count)])
+            history.add_workout_session({'duration': 60}, timestamp=(datetime.fromisoformat(first) +
+                                                                     timedelta(days=count)).isoformat())
+        histories.append(history)
+    series = FitnessHistory.backfill_training_loads(histories, since='2023-01-15', until='2023-03-01')
+    assert series['dates'][0] == '2023-01-15' and series['dates'][-1] == '2023-02-28'
+    assert series['atl'].shape == (3, 45) and not series['atl'][2].any()
+    for row, history in enumerate(histories[:2]):
+        own = {day['date']: day for day in history.training_load(until='2023-03-01')}
+        for column, date in enumerate(series['dates']):
+            if date in own:
+                assert series['ctl'][row, column] == pytest.approx(own[date]['ctl'])
+                assert series['load'][row, column] == own[date]['load']